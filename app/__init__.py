@@ -52,6 +52,22 @@ def create_app(config_name=None):
     cache.init_app(app)
     limiter.init_app(app)
     
+    # Batched, asynchronous audit logging (thread starts on first Log.create)
+    from app.models import Log, log_sink
+    Log.configure_retention(
+        mode=app.config.get('LOG_RETENTION_MODE', 'none'),
+        days=app.config.get('LOG_RETENTION_DAYS'),
+        capped_size_mb=app.config.get('LOG_CAPPED_SIZE_MB', 256)
+    )
+    log_sink.configure(
+        enabled=app.config.get('LOG_SINK_ENABLED', False),
+        max_size=app.config.get('LOG_SINK_QUEUE_SIZE', 10000),
+        batch_size=app.config.get('LOG_SINK_BATCH_SIZE', 200),
+        flush_interval=app.config.get('LOG_SINK_FLUSH_INTERVAL', 1.0),
+        policy=app.config.get('LOG_SINK_POLICY', 'block'),
+        block_timeout=app.config.get('LOG_SINK_BLOCK_TIMEOUT', 5.0)
+    )
+    
     # Register blueprints
     from app.routes.main import main_bp
     from app.routes.api import api_bp
@@ -143,10 +159,16 @@ def init_db_indexes():
             
         # Transactions indexes
         mongo.db.transactions.create_index('date')
-        mongo.db.transactions.create_index('category_id')
+        mongo.db.transactions.create_index([('category_id', 1), ('date', -1)])  # category listings, budget windows
         mongo.db.transactions.create_index([('from_account_id', 1), ('date', -1)])
         mongo.db.transactions.create_index([('to_account_id', 1), ('date', -1)])
         mongo.db.transactions.create_index('type')
+        mongo.db.transactions.create_index([('date', -1), ('_id', -1)])  # keyset pagination
+        mongo.db.transactions.create_index(
+            'import_hash', unique=True,
+            partialFilterExpression={'import_hash': {'$exists': True}}
+        )  # statement import dedup
+        mongo.db.transactions.create_index('search_prefixes')  # prefix search
         
         # Accounts indexes
         mongo.db.accounts.create_index('name', unique=True)
@@ -164,16 +186,34 @@ def init_db_indexes():
         mongo.db.budgets.create_index('period')
         mongo.db.budgets.create_index('is_active')
         mongo.db.budgets.create_index([('start_date', 1), ('end_date', 1)])
+        mongo.db.budgets.create_index([('category_id', 1), ('start_date', 1), ('end_date', 1)])  # spent maintenance
+        
+        # Logs indexes and retention (TTL index, capped collection or partition pruning)
+        from app.models import Log, LogStats
+        Log.apply_retention()
+        LogStats.create_indexes()  # expires per-day counters
+        LogStats.start_rebuild()  # first startup after an upgrade: count the logs already stored
         
-        # Logs indexes
-        mongo.db.logs.create_index('timestamp')
-        mongo.db.logs.create_index('level')
-        mongo.db.logs.create_index('category')
-        mongo.db.logs.create_index([('timestamp', -1)])
+        # Daily rollups indexes
+        mongo.db.daily_rollups.create_index(
+            [('day', 1), ('type', 1), ('category_id', 1), ('account_id', 1)],
+            unique=True
+        )
         
         # Settings indexes
         mongo.db.settings.create_index('key', unique=True)
         
+        # Export jobs indexes
+        mongo.db.export_jobs.create_index([('status', 1), ('expires_at', 1)])
+        
+        # Tombstones indexes (expire after TOMBSTONE_TTL_DAYS)
+        from app.models import Tombstone
+        Tombstone.create_indexes()
+        
+        # Index documents written before search_prefixes existed (searches use $regex until done)
+        from app.models import SearchIndex
+        SearchIndex.start_backfill()
+        
         print("✅ Database indexes created successfully")
     except Exception as e:
         print(f"⚠️ Could not create indexes: {e}")
\ No newline at end of file
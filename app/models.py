@@ -2,12 +2,250 @@
 Database models for Expense Tracker System
 Version: 1.0.0
 """
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import OrderedDict
 from bson import ObjectId
 from flask import current_app
-from app import mongo
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from app import mongo, cache
+import atexit
+import base64
+import copy
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
 import pytz
 
+class ReferenceCache:
+    """Bounded in-process id -> document cache with TTL.
+
+    Every gunicorn worker holds its own copy. invalidate() bumps a shared
+    generation counter in the cache_generations collection; other workers
+    compare against it at most every REFERENCE_CACHE_CHECK_INTERVAL seconds
+    and drop their entries when it has moved.
+    """
+
+    def __init__(self, name, ttl_setting='REFERENCE_CACHE_TTL'):
+        self.name = name
+        self.ttl_setting = ttl_setting
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def _config(key, default):
+        """Read a cache setting from the app config, if there is an app"""
+        try:
+            return current_app.config.get(key, default)
+        except RuntimeError:
+            return default
+
+    def get(self, key):
+        """Get a cached copy of a document, or None"""
+        self._sync_generation()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        """Store a copy of a document"""
+        ttl = self._config(self.ttl_setting, 300)
+        max_size = self._config('REFERENCE_CACHE_MAX_SIZE', 1000)
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(value), time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all local entries without touching the shared generation"""
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self):
+        """Drop local entries and tell the other workers to do the same"""
+        self.clear()
+        try:
+            state = mongo.db.cache_generations.find_one_and_update(
+                {'_id': self.name},
+                {'$inc': {'generation': 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            self._generation = state['generation']
+        except Exception as e:
+            print(f"Error invalidating {self.name} cache: {e}")
+
+    def _sync_generation(self):
+        """Clear local entries if another worker invalidated the cache"""
+        now = time.monotonic()
+        if now - self._checked_at < self._config('REFERENCE_CACHE_CHECK_INTERVAL', 2):
+            return
+        self._checked_at = now
+
+        try:
+            state = mongo.db.cache_generations.find_one({'_id': self.name})
+        except Exception as e:
+            print(f"Error reading {self.name} cache generation: {e}")
+            return
+
+        generation = state['generation'] if state else 0
+        if self._generation is not None and generation != self._generation:
+            self.clear()
+        self._generation = generation
+
+class SearchIndex:
+    """Prefix inverted index stored on each searchable document.
+
+    `search_prefixes` (a multikey index) holds every 2-15 character prefix of
+    each word in the indexed fields, plus each whole word with a trailing '$'.
+    A search for "cof sho" matches {'search_prefixes': {'$all': ['cof', 'sho']}}
+    through the index; documents containing the whole words rank first.
+
+    Prefix mode matches the start of words only ('cof' finds "Coffee", 'fee'
+    does not); searches containing regex syntax, ?search_mode=regex and
+    collections whose documents are not all indexed yet (see backfill(),
+    started by init_db_indexes) use the $regex path over the same fields.
+    """
+
+    FIELD = 'search_prefixes'
+    HIDDEN = {FIELD: 0}
+    MODES = ('prefix', 'regex')
+    MIN_PREFIX = 2
+    MAX_PREFIX = 15
+    MAX_WORDS = 64
+    WORD = re.compile(r'\w+')
+    PATTERN = re.compile(r'[\\^$.*+?()\[\]{}|]')
+    READY_CHECK_INTERVAL = 30
+    
+    # collection name -> True once every document carries the field,
+    # or the time.monotonic() of the last negative check
+    _ready = {}
+
+    @classmethod
+    def words(cls, *values):
+        """Lowercase words of strings, lists and dict values, first MAX_WORDS distinct"""
+        found = []
+        stack = list(reversed(values))
+        while stack and len(found) < cls.MAX_WORDS:
+            value = stack.pop()
+            if isinstance(value, dict):
+                stack.extend(reversed(list(value.values())))
+            elif isinstance(value, (list, tuple)):
+                stack.extend(reversed(value))
+            elif isinstance(value, str):
+                for word in cls.WORD.findall(value.lower()):
+                    if word not in found:
+                        found.append(word)
+        return found[:cls.MAX_WORDS]
+
+    @classmethod
+    def terms(cls, *values):
+        """Index terms (prefixes and whole-word markers) for a document's fields"""
+        terms = set()
+        for word in cls.words(*values):
+            word = word[:cls.MAX_PREFIX]
+            terms.update(word[:size] for size in range(cls.MIN_PREFIX, len(word) + 1))
+            terms.add(word + '$')
+        return sorted(terms)
+
+    @classmethod
+    def parse(cls, search, mode='prefix'):
+        """Query words for a search string, or None when it should run as a regex"""
+        if mode == 'regex' or cls.PATTERN.search(search):
+            return None
+        words = [word[:cls.MAX_PREFIX] for word in cls.words(search) if len(word) >= cls.MIN_PREFIX]
+        return words or None
+
+    @classmethod
+    def is_ready(cls, names):
+        """Whether every document in these collections is indexed (negatives rechecked every 30s)"""
+        for name in names:
+            state = cls._ready.get(name)
+            if state is True:
+                continue
+            if state is not None and time.monotonic() - state < cls.READY_CHECK_INTERVAL:
+                return False
+            if BaseModel.get_db()[name].find_one({cls.FIELD: {'$exists': False}}, {'_id': 1}):
+                cls._ready[name] = time.monotonic()
+                return False
+            cls._ready[name] = True
+        return True
+    
+    @classmethod
+    def sources(cls):
+        """(collection name, indexed fields) for every searchable collection"""
+        return [('transactions', Transaction.SEARCH_FIELDS)] + [
+            (name, Log.SEARCH_FIELDS) for name in Log.storage_names()
+        ]
+    
+    @classmethod
+    def backfill(cls, batch_size=1000, missing_only=True):
+        """Index documents written before the search index existed; returns {name: count}"""
+        updated = {}
+        for name, fields in cls.sources():
+            collection = BaseModel.get_db()[name]
+            query = {cls.FIELD: {'$exists': False}} if missing_only else {}
+            updated[name] = 0
+            batch = []
+            for doc in collection.find(query, dict.fromkeys(fields, 1)):
+                terms = cls.terms(*(doc.get(field) for field in fields))
+                batch.append(UpdateOne({'_id': doc['_id']}, {'$set': {cls.FIELD: terms}}))
+                if len(batch) >= batch_size:
+                    updated[name] += collection.bulk_write(batch, ordered=False).modified_count
+                    batch = []
+            if batch:
+                updated[name] += collection.bulk_write(batch, ordered=False).modified_count
+            cls._ready.pop(name, None)
+        return updated
+    
+    @classmethod
+    def start_backfill(cls):
+        """Run backfill() in a daemon thread (searches use $regex until it completes)"""
+        def run():
+            try:
+                updated = cls.backfill()
+                if any(updated.values()):
+                    print(f"✅ Search index backfilled: {updated}")
+            except Exception as e:
+                print(f"⚠️ Search index backfill failed: {e}")
+        
+        thread = threading.Thread(target=run, name='search-backfill', daemon=True)
+        thread.start()
+        return thread
+    
+    @classmethod
+    def apply(cls, filters, search, model, mode='prefix'):
+        """Add a search on model.SEARCH_FIELDS to filters; returns the words to rank by (None for regex)"""
+        words = cls.parse(search, mode)
+        if words and not cls.is_ready(model.storage_names()):
+            words = None
+        fields = model.SEARCH_FIELDS
+        if words:
+            condition = {cls.FIELD: {'$all': words}}
+        else:
+            regex = [{field: {'$regex': search, '$options': 'i'}} for field in fields]
+            condition = regex[0] if len(regex) == 1 else {'$or': regex}
+        
+        if any(key in filters for key in condition):
+            filters.setdefault('$and', []).append(condition)
+        else:
+            filters.update(condition)
+        return words
+
 class BaseModel:
     """Base model with common methods"""
     
@@ -24,6 +262,8 @@ class BaseModel:
         if obj and '_id' in obj:
             obj['id'] = str(obj['_id'])
             del obj['_id']
+        if obj:
+            obj.pop(SearchIndex.FIELD, None)
         return obj
     
     @staticmethod
@@ -31,16 +271,161 @@ class BaseModel:
         """Convert cursor to list of dicts"""
         return [BaseModel.to_dict(doc) for doc in cursor]
 
+    # Subclasses holding small, rarely changing reference data set this
+    reference_cache = None
+    # Projection for cached documents (leave out fields that change often)
+    cache_projection = None
+
+    @classmethod
+    def get_many(cls, ids):
+        """Get documents for a set of IDs with one $in query, keyed by string ID"""
+        found = {}
+        missing = set()
+        for doc_id in set(str(i) for i in ids if i):
+            cached = cls.reference_cache.get(doc_id) if cls.reference_cache else None
+            if cached:
+                found[doc_id] = cached
+            elif ObjectId.is_valid(doc_id):
+                missing.add(doc_id)
+
+        if missing:
+            cursor = cls.collection.find(
+                {'_id': {'$in': [ObjectId(i) for i in missing]}},
+                cls.cache_projection if cls.reference_cache else None
+            )
+            for doc in cursor:
+                found[str(doc['_id'])] = doc
+                if cls.reference_cache:
+                    cls.reference_cache.set(str(doc['_id']), doc)
+
+        return found
+
+    @classmethod
+    def invalidate_cache(cls):
+        """Invalidate cached reference documents in every worker"""
+        if cls.reference_cache:
+            cls.reference_cache.invalidate()
+
+    @staticmethod
+    def encode_cursor(sort_value, doc_id):
+        """Encode a (sort value, _id) position as an opaque cursor string (sort value may be None)"""
+        raw = json.dumps([sort_value.isoformat() if sort_value is not None else None, str(doc_id)])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Decode a cursor string back into (sort value, _id)"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            sort_value, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+            return (datetime.fromisoformat(sort_value) if sort_value is not None else None), ObjectId(doc_id)
+        except Exception:
+            raise ValueError('Invalid pagination cursor')
+
+    @classmethod
+    def count(cls, query):
+        """Count documents, using the collection estimate or a short-lived cache"""
+        if not query:
+            return cls.collection.estimated_document_count()
+
+        key = hashlib.md5(json.dumps(query, default=str, sort_keys=True).encode()).hexdigest()
+        key = f'count:{cls.collection.name}:{key}'
+        total = cache.get(key)
+        if total is None:
+            total = cls.collection.count_documents(query)
+            cache.set(key, total, timeout=current_app.config.get('COUNT_CACHE_TTL', 60))
+        return total
+
+    @classmethod
+    def storage_names(cls):
+        """Collections holding this model's documents (overridden by partitioned models)"""
+        return [cls.collection.name]
+    
+    @classmethod
+    def aggregate(cls, pipeline):
+        """Run an aggregation (overridden by partitioned models)"""
+        return cls.collection.aggregate(pipeline)
+    
+    @classmethod
+    def find_sorted(cls, query, sort, skip=0, limit=0):
+        """find() with sort/skip/limit as a list (overridden by partitioned models)"""
+        return list(cls.collection.find(query, SearchIndex.HIDDEN).sort(sort).skip(skip).limit(limit))
+    
+    @classmethod
+    def get_ranked(cls, query, words, sort_field, page, per_page):
+        """Page of search results: whole-word matches first, then newest"""
+        # One point per query word present as a whole word
+        score = {'$add': [
+            {'$cond': [{'$in': [word + '$', '$' + SearchIndex.FIELD]}, 1, 0]} for word in words
+        ]}
+        docs = cls.aggregate([
+            {'$match': query},
+            {'$addFields': {'_score': score}},
+            {'$sort': {'_score': -1, sort_field: -1, '_id': -1}},
+            {'$skip': (page - 1) * per_page},
+            {'$limit': per_page},
+            {'$project': {'_score': 0, SearchIndex.FIELD: 0}}
+        ])
+        total = cls.count(query)
+        return {
+            'items': cls.to_list(docs),
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'pages': (total + per_page - 1) // per_page
+        }
+    
+    @classmethod
+    def get_page_after(cls, query, sort_field, after, per_page):
+        """Keyset pagination on (sort_field, _id), newest first.
+
+        `after` is the cursor returned with the previous page ('' for the
+        first page). Uses the compound (sort_field, _id) index instead of
+        skip(), so deep pages cost the same as the first one. Documents with
+        a null or missing sort field come last, ordered by _id alone.
+        """
+        filters = query
+        if after:
+            sort_value, doc_id = cls.decode_cursor(after)
+            if sort_value is None:
+                position = {sort_field: None, '_id': {'$lt': doc_id}}
+            else:
+                position = {'$or': [
+                    {sort_field: {'$lt': sort_value}},
+                    {sort_field: sort_value, '_id': {'$lt': doc_id}},
+                    {sort_field: None}
+                ]}
+            filters = {'$and': [query, position]} if query else position
+
+        docs = cls.find_sorted(filters, [(sort_field, -1), ('_id', -1)], limit=per_page + 1)
+
+        next_cursor = None
+        if len(docs) > per_page:
+            docs = docs[:per_page]
+            next_cursor = cls.encode_cursor(docs[-1].get(sort_field), docs[-1]['_id'])
+
+        total = cls.count(query)
+        return {
+            'items': cls.to_list(docs),
+            'total': total,
+            'page': None,
+            'per_page': per_page,
+            'pages': (total + per_page - 1) // per_page,
+            'next_cursor': next_cursor
+        }
+
 class Transaction(BaseModel):
     """Transaction model"""
     
+    SEARCH_FIELDS = ('description', 'tags')
+    
     @classmethod
     @property
     def collection(cls):
         return BaseModel.get_db().transactions
     
     @classmethod
-    def create(cls, data):
+    def create(cls, data, session=None):
         """Create new transaction"""
         # Ensure date is timezone-aware UTC
         if 'date' in data and isinstance(data['date'], datetime):
@@ -51,13 +436,47 @@ class Transaction(BaseModel):
         data['created_at'] = datetime.now(pytz.UTC)
         data['updated_at'] = datetime.now(pytz.UTC)
         data['is_reconciled'] = data.get('is_reconciled', False)
+        data[SearchIndex.FIELD] = SearchIndex.terms(*(data.get(f) for f in cls.SEARCH_FIELDS))
         
-        result = cls.collection.insert_one(data)
+        result = cls.collection.insert_one(data, session=session)
+        DailyRollup.apply([data], session=session)
+        Budget.apply_transactions([data], session=session)
+        Category.invalidate_usage_stats()
         return str(result.inserted_id)
     
     @classmethod
-    def update(cls, transaction_id, data):
-        """Update transaction"""
+    def create_many(cls, documents, session=None):
+        """Insert a batch with insert_many(ordered=False).
+
+        Returns (inserted documents, [(position, error message)]) so one bad
+        row doesn't fail the rest of the batch.
+        """
+        now = datetime.now(pytz.UTC)
+        for data in documents:
+            if isinstance(data.get('date'), datetime) and data['date'].tzinfo is None:
+                data['date'] = pytz.UTC.localize(data['date'])
+            data['created_at'] = now
+            data['updated_at'] = now
+            data['is_reconciled'] = data.get('is_reconciled', False)
+            data[SearchIndex.FIELD] = SearchIndex.terms(*(data.get(f) for f in cls.SEARCH_FIELDS))
+        
+        errors = []
+        try:
+            cls.collection.insert_many(documents, ordered=False, session=session)
+        except BulkWriteError as e:
+            errors = [(err['index'], err.get('errmsg', 'Write failed')) for err in e.details.get('writeErrors', [])]
+        
+        failed = {position for position, _ in errors}
+        inserted = [data for position, data in enumerate(documents) if position not in failed]
+        DailyRollup.apply(inserted, session=session)
+        Budget.apply_transactions(inserted, session=session)
+        if inserted:
+            Category.invalidate_usage_stats()
+        return inserted, errors
+    
+    @classmethod
+    def update(cls, transaction_id, data, session=None):
+        """Update transaction; returns the document as it was before, or None"""
         # Ensure date is timezone-aware UTC if being updated
         if 'date' in data and isinstance(data['date'], datetime):
             if data['date'].tzinfo is None:
@@ -65,30 +484,81 @@ class Transaction(BaseModel):
                 data['date'] = pytz.UTC.localize(data['date'])
         
         data['updated_at'] = datetime.now(pytz.UTC)
-        result = cls.collection.update_one(
+        if any(field in data for field in cls.SEARCH_FIELDS):
+            # Re-index from the stored fields this update leaves untouched
+            current = cls.collection.find_one(
+                {'_id': ObjectId(transaction_id)},
+                dict.fromkeys(cls.SEARCH_FIELDS, 1),
+                session=session
+            ) or {}
+            merged = {**current, **data}
+            data[SearchIndex.FIELD] = SearchIndex.terms(*(merged.get(f) for f in cls.SEARCH_FIELDS))
+        old = cls.collection.find_one_and_update(
             {'_id': ObjectId(transaction_id)},
-            {'$set': data}
+            {'$set': data},
+            return_document=ReturnDocument.BEFORE,
+            session=session
         )
-        return result.modified_count > 0
+        if not old:
+            return None
+        
+        # Move the amount between rollup buckets if anything they key on changed
+        if any(field in data for field in DailyRollup.SOURCE_FIELDS):
+            DailyRollup.apply([old], sign=-1, session=session)
+            DailyRollup.apply([{**old, **data}], session=session)
+        if any(field in data for field in Budget.SOURCE_FIELDS):
+            Budget.apply_transactions([old], sign=-1, session=session)
+            Budget.apply_transactions([{**old, **data}], session=session)
+        if 'category_id' in data or 'amount' in data:
+            Category.invalidate_usage_stats()
+        return old
     
     @classmethod
-    def delete(cls, transaction_id):
-        """Delete transaction"""
-        result = cls.collection.delete_one({'_id': ObjectId(transaction_id)})
-        return result.deleted_count > 0
+    def delete(cls, transaction_id, session=None):
+        """Delete transaction; returns the deleted document, or None"""
+        deleted = cls.collection.find_one_and_delete({'_id': ObjectId(transaction_id)}, session=session)
+        if not deleted:
+            return None
+        
+        DailyRollup.apply([deleted], sign=-1, session=session)
+        Budget.apply_transactions([deleted], sign=-1, session=session)
+        Category.invalidate_usage_stats()
+        Tombstone.record('transactions', [deleted['_id']], session=session)
+        return deleted
+    
+    @classmethod
+    def bulk_delete(cls, object_ids, session=None):
+        """Delete several transactions; returns the deleted documents"""
+        deleted = list(cls.collection.find({'_id': {'$in': object_ids}}, session=session))
+        if not deleted:
+            return []
+        
+        deleted_ids = [t['_id'] for t in deleted]
+        cls.collection.delete_many({'_id': {'$in': deleted_ids}}, session=session)
+        DailyRollup.apply(deleted, sign=-1, session=session)
+        Budget.apply_transactions(deleted, sign=-1, session=session)
+        Category.invalidate_usage_stats()
+        Tombstone.record('transactions', deleted_ids, session=session)
+        return deleted
     
     @classmethod
     def get_by_id(cls, transaction_id):
         """Get transaction by ID"""
-        return cls.collection.find_one({'_id': ObjectId(transaction_id)})
+        return cls.collection.find_one({'_id': ObjectId(transaction_id)}, SearchIndex.HIDDEN)
     
     @classmethod
-    def get_all(cls, filters=None, page=1, per_page=20):
-        """Get all transactions with filters"""
+    def get_all(cls, filters=None, page=1, per_page=20, after=None, rank=None):
+        """Get all transactions with filters (keyset pagination when `after` is given,
+        relevance order when `rank` holds search words)"""
         query = filters or {}
+        if after is not None:
+            return cls.get_page_after(query, 'date', after, per_page)
+        if rank:
+            return cls.get_ranked(query, rank, 'date', page, per_page)
+        
         skip = (page - 1) * per_page
         
-        cursor = cls.collection.find(query).sort('date', -1).skip(skip).limit(per_page)
+        cursor = cls.collection.find(query, SearchIndex.HIDDEN).sort('date', -1).skip(skip).limit(per_page)
         total = cls.collection.count_documents(query)
         
         return {
@@ -99,9 +569,253 @@ class Transaction(BaseModel):
             'pages': (total + per_page - 1) // per_page
         }
 
+class DailyRollup(BaseModel):
+    """Per-day transaction totals keyed by (day, type, category_id, account_id).
+
+    Maintained incrementally by Transaction writes so reports can read a few
+    hundred rollup documents instead of rescanning transactions. Days are
+    UTC midnights. min/max tighten with $min/$max on insert and are
+    recomputed from the bucket's transactions on removal. A failed update
+    marks the rollups as not built, so reads fall back to transactions
+    until `manage.py rebuild-rollups`.
+    """
+    
+    # Transaction fields that decide the bucket or the amount
+    SOURCE_FIELDS = ('date', 'type', 'amount', 'category_id', 'from_account_id', 'to_account_id')
+    
+    @classmethod
+    @property
+    def collection(cls):
+        return BaseModel.get_db().daily_rollups
+    
+    @staticmethod
+    def day_of(date):
+        """UTC midnight (naive) of a datetime"""
+        if date.tzinfo is not None:
+            date = date.astimezone(pytz.UTC)
+        return datetime(date.year, date.month, date.day)
+    
+    @staticmethod
+    def account_of(transaction):
+        """Account a transaction is attributed to: the destination for income, else the source"""
+        if transaction.get('type') == 'income':
+            return transaction.get('to_account_id')
+        return transaction.get('from_account_id') or transaction.get('to_account_id')
+    
+    @classmethod
+    def key_of(cls, transaction):
+        """Rollup key for a transaction"""
+        return {
+            'day': cls.day_of(transaction['date']),
+            'type': transaction.get('type'),
+            'category_id': transaction.get('category_id'),
+            'account_id': cls.account_of(transaction)
+        }
+    
+    @classmethod
+    def apply(cls, transactions, sign=1, session=None):
+        """Add (sign=1) or remove (sign=-1) transactions from the rollups"""
+        buckets = {}
+        for t in transactions:
+            if not isinstance(t.get('date'), datetime):
+                continue
+            try:
+                amount = float(t.get('amount', 0))
+            except (TypeError, ValueError):
+                continue
+            
+            key = cls.key_of(t)
+            bucket_id = tuple(key.values())
+            if bucket_id not in buckets:
+                buckets[bucket_id] = {'key': key, 'sum': 0.0, 'count': 0, 'min': amount, 'max': amount}
+            bucket = buckets[bucket_id]
+            bucket['sum'] += amount
+            bucket['count'] += 1
+            bucket['min'] = min(bucket['min'], amount)
+            bucket['max'] = max(bucket['max'], amount)
+        
+        operations = []
+        for bucket in buckets.values():
+            update = {'$inc': {'sum': sign * bucket['sum'], 'count': sign * bucket['count']}}
+            if sign > 0:
+                update['$min'] = {'min': bucket['min']}
+                update['$max'] = {'max': bucket['max']}
+            operations.append(UpdateOne(bucket['key'], update, upsert=True))
+        
+        if operations:
+            try:
+                cls.collection.bulk_write(operations, ordered=False, session=session)
+                if sign < 0:
+                    cls.refresh_bounds([bucket['key'] for bucket in buckets.values()], session=session)
+            except Exception as e:
+                if session is not None:
+                    raise
+                # Drifted rollups must not be served: reads fall back until the next rebuild
+                Settings.set('rollups_built_at', None)
+                print(f"Error updating daily rollups (marked for rebuild): {e}")
+    
+    @classmethod
+    def bucket_query(cls, key):
+        """Transactions that belong to a rollup bucket"""
+        query = {
+            'date': {'$gte': key['day'], '$lt': key['day'] + timedelta(days=1)},
+            'type': key['type'],
+            'category_id': key['category_id']
+        }
+        if key['type'] == 'income':
+            query['to_account_id'] = key['account_id']
+        elif key['account_id'] is None:
+            query['from_account_id'] = None
+            query['to_account_id'] = None
+        else:
+            query['$or'] = [
+                {'from_account_id': key['account_id']},
+                {'from_account_id': None, 'to_account_id': key['account_id']}
+            ]
+        return query
+    
+    @classmethod
+    def refresh_bounds(cls, keys, session=None):
+        """Recompute min/max of buckets that lost transactions ($min/$max cannot loosen)"""
+        transactions = cls.get_db().transactions
+        for key in keys:
+            bounds = list(transactions.aggregate([
+                {'$match': cls.bucket_query(key)},
+                {'$group': {'_id': None, 'count': {'$sum': 1}, 'min': {'$min': '$amount'}, 'max': {'$max': '$amount'}}}
+            ], session=session))
+            if bounds and bounds[0]['count']:
+                update = {'$set': {'min': bounds[0]['min'], 'max': bounds[0]['max']}}
+            else:
+                # Emptied bucket: the next $min/$max must start from the new amount
+                update = {'$unset': {'min': '', 'max': ''}}
+            cls.collection.update_one(key, update, session=session)
+    
+    @classmethod
+    def reassign_category(cls, old_category_id, new_category_id):
+        """Fold one category's rollups into another (category delete path)"""
+        docs = list(cls.collection.find({'category_id': old_category_id}))
+        operations = [
+            UpdateOne(
+                {'day': d['day'], 'type': d['type'], 'category_id': new_category_id, 'account_id': d['account_id']},
+                {
+                    '$inc': {'sum': d['sum'], 'count': d['count']},
+                    '$min': {'min': d['min']},
+                    '$max': {'max': d['max']}
+                },
+                upsert=True
+            )
+            for d in docs
+        ]
+        if operations:
+            cls.collection.bulk_write(operations, ordered=False)
+            cls.collection.delete_many({'category_id': old_category_id})
+    
+    @classmethod
+    def rebuild(cls):
+        """Recompute all rollups from the transactions collection"""
+        cls.get_db().transactions.aggregate([
+            {'$match': {'date': {'$type': 'date'}}},
+            {
+                '$group': {
+                    '_id': {
+                        'day': {
+                            '$dateFromParts': {
+                                'year': {'$year': '$date'},
+                                'month': {'$month': '$date'},
+                                'day': {'$dayOfMonth': '$date'}
+                            }
+                        },
+                        'type': {'$ifNull': ['$type', None]},
+                        'category_id': {'$ifNull': ['$category_id', None]},
+                        'account_id': {
+                            '$cond': [
+                                {'$eq': ['$type', 'income']},
+                                {'$ifNull': ['$to_account_id', None]},
+                                {'$ifNull': ['$from_account_id', {'$ifNull': ['$to_account_id', None]}]}
+                            ]
+                        }
+                    },
+                    'sum': {'$sum': '$amount'},
+                    'count': {'$sum': 1},
+                    'min': {'$min': '$amount'},
+                    'max': {'$max': '$amount'}
+                }
+            },
+            {
+                '$project': {
+                    '_id': 0,
+                    'day': '$_id.day',
+                    'type': '$_id.type',
+                    'category_id': '$_id.category_id',
+                    'account_id': '$_id.account_id',
+                    'sum': 1,
+                    'count': 1,
+                    'min': 1,
+                    'max': 1
+                }
+            },
+            {'$out': 'daily_rollups'}
+        ])
+        cls.create_indexes()
+        Settings.set('rollups_built_at', datetime.now(pytz.UTC).isoformat())
+        return cls.collection.count_documents({})
+    
+    @classmethod
+    def create_indexes(cls):
+        """Unique bucket key; keeps concurrent upserts from duplicating and serves day ranges"""
+        cls.collection.create_index(
+            [('day', 1), ('type', 1), ('category_id', 1), ('account_id', 1)],
+            unique=True
+        )
+    
+    @classmethod
+    def is_ready(cls):
+        """Rollups are only trusted once they have been built from history"""
+        return bool(Settings.get('rollups_built_at'))
+    
+    @classmethod
+    def covers(cls, start_date, end_date):
+        """True if [start_date, end_date] falls on whole UTC days"""
+        if not start_date or not end_date or not cls.is_ready():
+            return False
+        if start_date.tzinfo is not None:
+            start_date = start_date.astimezone(pytz.UTC)
+        if end_date.tzinfo is not None:
+            end_date = end_date.astimezone(pytz.UTC)
+        starts_at_midnight = (start_date.hour, start_date.minute, start_date.second, start_date.microsecond) == (0, 0, 0, 0)
+        ends_at_midnight = (end_date.hour, end_date.minute, end_date.second) == (23, 59, 59)
+        return starts_at_midnight and ends_at_midnight
+    
+    @classmethod
+    def summarize(cls, start_date, end_date, group_by, match=None):
+        """Sum rollups for the days in [start_date, end_date], grouped by expressions"""
+        query = {
+            'day': {'$gte': cls.day_of(start_date), '$lte': cls.day_of(end_date)},
+            'count': {'$gt': 0}
+        }
+        query.update(match or {})
+        
+        return list(cls.collection.aggregate([
+            {'$match': query},
+            {
+                '$group': {
+                    '_id': group_by,
+                    'total': {'$sum': '$sum'},
+                    'count': {'$sum': '$count'},
+                    'min': {'$min': '$min'},
+                    'max': {'$max': '$max'}
+                }
+            },
+            {'$sort': {'_id': 1}}
+        ]))
+
 class Account(BaseModel):
     """Account model"""
     
+    reference_cache = ReferenceCache('accounts')
+    # Names and metadata only; balances move with every transaction
+    cache_projection = {'balance': 0}
+    
     @classmethod
     @property
     def collection(cls):
@@ -115,6 +829,7 @@ class Account(BaseModel):
         data['is_active'] = data.get('is_active', True)
         
         result = cls.collection.insert_one(data)
+        cls.invalidate_cache()
         return str(result.inserted_id)
     
     @classmethod
@@ -125,6 +840,7 @@ class Account(BaseModel):
             {'_id': ObjectId(account_id)},
             {'$set': data}
         )
+        cls.invalidate_cache()
         return result.modified_count > 0
     
     @classmethod
@@ -134,13 +850,105 @@ class Account(BaseModel):
             {'_id': ObjectId(account_id)},
             {'$set': {'is_active': False, 'updated_at': datetime.now()}}
         )
+        cls.invalidate_cache()
         return result.modified_count > 0
     
     @classmethod
     def get_by_id(cls, account_id):
-        """Get account by ID"""
+        """Get account by ID (always read from MongoDB, balances change often)"""
         return cls.collection.find_one({'_id': ObjectId(account_id)})
     
+    @classmethod
+    def get_active(cls):
+        """Get all active accounts: metadata from the reference cache, balances read live"""
+        accounts = cls.reference_cache.get('__active__')
+        if accounts is None:
+            accounts = list(cls.collection.find({'is_active': True}, cls.cache_projection))
+            cls.reference_cache.set('__active__', accounts)
+        
+        balances = {
+            doc['_id']: doc.get('balance', 0)
+            for doc in cls.collection.find({'is_active': True}, {'balance': 1})
+        }
+        return [{**account, 'balance': balances.get(account['_id'], 0)} for account in accounts]
+    
+    @classmethod
+    def apply_balance_deltas(cls, deltas, session=None):
+        """Atomically add {account_id: delta} to balances with one bulk $inc"""
+        now = datetime.now()
+        operations = [
+            UpdateOne(
+                {'_id': ObjectId(account_id)},
+                {'$inc': {'balance': delta}, '$set': {'updated_at': now}}
+            )
+            for account_id, delta in deltas.items()
+            if delta and ObjectId.is_valid(account_id)
+        ]
+        if not operations:
+            return 0
+        
+        # Balances are never cached, so no invalidation (which would run before commit)
+        result = cls.collection.bulk_write(operations, ordered=False, session=session)
+        return result.modified_count
+    
+    @classmethod
+    def get_activity_stats(cls, account_ids):
+        """{account_id: count, inflow, outflow, average, last_date} in one aggregation.
+
+        Outgoing and incoming legs are matched separately (each served by its
+        (from/to_account_id, date) index) and combined with $unionWith; a
+        transfer to the same account is counted once, as both inflow and outflow.
+        """
+        account_ids = [str(account_id) for account_id in account_ids]
+        if not account_ids:
+            return {}
+        
+        pipeline = [
+            {'$match': {'from_account_id': {'$in': account_ids}}},
+            {
+                '$project': {
+                    'account_id': '$from_account_id',
+                    'amount': 1,
+                    'date': 1,
+                    'outflow': '$amount',
+                    'inflow': {'$cond': [{'$eq': ['$to_account_id', '$from_account_id']}, '$amount', 0]}
+                }
+            },
+            {
+                '$unionWith': {
+                    'coll': 'transactions',
+                    'pipeline': [
+                        {
+                            '$match': {
+                                'to_account_id': {'$in': account_ids},
+                                '$expr': {'$ne': ['$to_account_id', '$from_account_id']}
+                            }
+                        },
+                        {
+                            '$project': {
+                                'account_id': '$to_account_id',
+                                'amount': 1,
+                                'date': 1,
+                                'outflow': {'$literal': 0},
+                                'inflow': '$amount'
+                            }
+                        }
+                    ]
+                }
+            },
+            {
+                '$group': {
+                    '_id': '$account_id',
+                    'count': {'$sum': 1},
+                    'inflow': {'$sum': '$inflow'},
+                    'outflow': {'$sum': '$outflow'},
+                    'average': {'$avg': '$amount'},
+                    'last_date': {'$max': '$date'}
+                }
+            }
+        ]
+        return {row['_id']: row for row in cls.get_db().transactions.aggregate(pipeline)}
+    
     @classmethod
     def get_balance(cls, account_id):
         """Get current balance of account"""
@@ -150,6 +958,10 @@ class Account(BaseModel):
 class Category(BaseModel):
     """Category model"""
     
+    reference_cache = ReferenceCache('categories')
+    # Per-category transaction/budget usage, invalidated by transaction and budget writes
+    usage_cache = ReferenceCache('category_usage')
+    
     @classmethod
     @property
     def collection(cls):
@@ -164,6 +976,7 @@ class Category(BaseModel):
         data['is_deleted'] = False
         
         result = cls.collection.insert_one(data)
+        cls.invalidate_cache()
         return str(result.inserted_id)
     
     @classmethod
@@ -174,40 +987,221 @@ class Category(BaseModel):
             {'_id': ObjectId(category_id)},
             {'$set': data}
         )
+        cls.invalidate_cache()
         return result.modified_count > 0
     
+    @classmethod
+    def get_usage_stats(cls):
+        """{category_id: transaction_count, total_amount, budget_count} for every category.
+
+        One $group over transactions and one over active budgets, cached
+        until the next transaction or budget write.
+        """
+        stats = cls.usage_cache.get('__all__')
+        if stats is not None:
+            return stats
+        
+        def entry(category_id):
+            return stats.setdefault(str(category_id), {'transaction_count': 0, 'total_amount': 0, 'budget_count': 0})
+        
+        stats = {}
+        for row in cls.get_db().transactions.aggregate([
+            {'$group': {'_id': '$category_id', 'count': {'$sum': 1}, 'total': {'$sum': '$amount'}}}
+        ]):
+            entry(row['_id']).update({'transaction_count': row['count'], 'total_amount': row['total']})
+        for row in cls.get_db().budgets.aggregate([
+            {'$match': {'is_active': True}},
+            {'$group': {'_id': '$category_id', 'count': {'$sum': 1}}}
+        ]):
+            entry(row['_id'])['budget_count'] = row['count']
+        
+        cls.usage_cache.set('__all__', stats)
+        return stats
+    
+    @classmethod
+    def invalidate_usage_stats(cls):
+        """Drop cached usage stats in every worker"""
+        cls.usage_cache.invalidate()
+    
     @classmethod
     def get_by_id(cls, category_id):
         """Get category by ID"""
-        return cls.collection.find_one({'_id': ObjectId(category_id)})
+        category = cls.reference_cache.get(str(category_id))
+        if category is None:
+            category = cls.collection.find_one({'_id': ObjectId(category_id)})
+            if category:
+                cls.reference_cache.set(str(category_id), category)
+        return category
 
 class Budget(BaseModel):
-    """Budget model"""
+    """Budget model.
+
+    `spent` is kept current by Transaction writes (`apply_transactions`);
+    `compute_spent` recomputes it from transactions to repair drift.
+    """
+    
+    # Transaction types that count against a budget
+    SPENT_TYPES = ('expense', 'asset_purchase', 'credit_card_payment')
+    # Transaction fields that decide which budgets a transaction hits, or by how much
+    SOURCE_FIELDS = ('date', 'type', 'amount', 'category_id')
     
     @classmethod
     @property
     def collection(cls):
         return BaseModel.get_db().budgets
     
+    @staticmethod
+    def as_naive_utc(date):
+        """Compare dates the way MongoDB does: aware ones in UTC, naive ones as stored"""
+        if isinstance(date, str):
+            date = datetime.fromisoformat(date)
+        if date.tzinfo is not None:
+            date = date.astimezone(pytz.UTC).replace(tzinfo=None)
+        return date
+    
+    @staticmethod
+    def parse_dates(data):
+        """Store ISO-string start/end dates as datetimes so range queries match them"""
+        for field in ('start_date', 'end_date'):
+            if isinstance(data.get(field), str) and data[field]:
+                data[field] = datetime.fromisoformat(data[field])
+        return data
+    
+    @classmethod
+    def apply_transactions(cls, transactions, sign=1, session=None):
+        """$inc `spent` on the active budgets covering these transactions (sign=-1 removes them)"""
+        relevant = []
+        for t in transactions:
+            if t.get('type') not in cls.SPENT_TYPES or not t.get('category_id') or not isinstance(t.get('date'), datetime):
+                continue
+            try:
+                relevant.append((str(t['category_id']), cls.as_naive_utc(t['date']), float(t.get('amount', 0))))
+            except (TypeError, ValueError):
+                continue
+        if not relevant:
+            return
+        
+        try:
+            # Served by the (category_id, start_date, end_date) index; budgets saved
+            # with ISO-string dates predate parse_dates and are range-checked below
+            budgets = cls.collection.find({
+                'category_id': {'$in': list({category_id for category_id, _, _ in relevant})},
+                '$and': [
+                    {'$or': [{'start_date': {'$lte': max(date for _, date, _ in relevant)}},
+                             {'start_date': {'$type': 'string'}}]},
+                    {'$or': [{'end_date': {'$gte': min(date for _, date, _ in relevant)}},
+                             {'end_date': {'$type': 'string'}}]}
+                ],
+                'is_active': True
+            }, {'category_id': 1, 'start_date': 1, 'end_date': 1}, session=session)
+            
+            by_category = {}
+            for budget in budgets:
+                by_category.setdefault(budget['category_id'], []).append(budget)
+            
+            increments = {}
+            for category_id, date, amount in relevant:
+                for budget in by_category.get(category_id, []):
+                    if cls.as_naive_utc(budget['start_date']) <= date <= cls.as_naive_utc(budget['end_date']):
+                        increments[budget['_id']] = increments.get(budget['_id'], 0.0) + sign * amount
+            
+            now = datetime.now()
+            operations = [
+                UpdateOne({'_id': budget_id}, {'$inc': {'spent': delta}, '$set': {'updated_at': now}})
+                for budget_id, delta in increments.items()
+                if delta
+            ]
+            if operations:
+                cls.collection.bulk_write(operations, ordered=False, session=session)
+        except Exception as e:
+            if session is not None:
+                raise
+            # Outside a ledger session the transaction is already written; find_drift repairs spent
+            print(f"Error updating budget spent: {e}")
+    
+    @classmethod
+    def compute_spent(cls, query=None):
+        """Stored and recomputed `spent` for every matching budget in one $lookup/$group aggregation"""
+        return list(cls.collection.aggregate([
+            {'$match': query if query is not None else {'is_active': True}},
+            {
+                '$lookup': {
+                    'from': 'transactions',
+                    'let': {
+                        'category_id': '$category_id',
+                        'start': {'$toDate': '$start_date'},
+                        'end': {'$toDate': '$end_date'}
+                    },
+                    'pipeline': [
+                        {
+                            '$match': {
+                                'type': {'$in': list(cls.SPENT_TYPES)},
+                                '$expr': {
+                                    '$and': [
+                                        {'$eq': ['$category_id', '$$category_id']},
+                                        {'$gte': ['$date', '$$start']},
+                                        {'$lte': ['$date', '$$end']}
+                                    ]
+                                }
+                            }
+                        },
+                        {'$group': {'_id': None, 'total': {'$sum': '$amount'}}}
+                    ],
+                    'as': 'totals'
+                }
+            },
+            {
+                '$project': {
+                    'spent': {'$ifNull': ['$spent', 0]},
+                    'actual': {'$ifNull': [{'$arrayElemAt': ['$totals.total', 0]}, 0]}
+                }
+            }
+        ]))
+    
+    @classmethod
+    def find_drift(cls, query=None, tolerance=0.005):
+        """Budgets whose stored `spent` differs from their transactions"""
+        return [
+            row for row in cls.compute_spent(query)
+            if abs(float(row['spent']) - float(row['actual'])) > tolerance
+        ]
+    
+    @classmethod
+    def fix_spent(cls, rows):
+        """Write recomputed `spent` values back with one bulk write"""
+        now = datetime.now()
+        operations = [
+            UpdateOne({'_id': row['_id']}, {'$set': {'spent': row['actual'], 'updated_at': now}})
+            for row in rows
+        ]
+        if operations:
+            cls.collection.bulk_write(operations, ordered=False)
+        return len(operations)
+    
     @classmethod
     def create(cls, data):
         """Create new budget"""
+        cls.parse_dates(data)
         data['created_at'] = datetime.now()
         data['updated_at'] = datetime.now()
         data['spent'] = 0
         data['is_active'] = True
         
         result = cls.collection.insert_one(data)
+        Category.invalidate_usage_stats()
         return str(result.inserted_id)
     
     @classmethod
     def update(cls, budget_id, data):
         """Update budget"""
+        cls.parse_dates(data)
         data['updated_at'] = datetime.now()
         result = cls.collection.update_one(
             {'_id': ObjectId(budget_id)},
             {'$set': data}
         )
+        if 'category_id' in data or 'is_active' in data:
+            Category.invalidate_usage_stats()
         return result.modified_count > 0
     
     @classmethod
@@ -224,8 +1218,157 @@ class Budget(BaseModel):
             'is_active': True
         })
 
+class LogSink:
+    """In-process queue that batches log entries into insert_many calls.
+
+    Log.create enqueues and returns; a daemon thread writes a batch when
+    `batch_size` entries are waiting or `flush_interval` seconds have passed.
+    A full queue either blocks the caller (up to `block_timeout`) or drops
+    the entry, per `policy`. The thread starts lazily in each process, so
+    forked gunicorn workers get their own. stop() drains what is left and
+    runs at interpreter exit and from gunicorn's worker_exit hook.
+    """
+    
+    POLICIES = ('block', 'drop')
+    
+    def __init__(self, write):
+        self.write = write
+        self.enabled = False
+        self.max_size = 10000
+        self.batch_size = 200
+        self.flush_interval = 1.0
+        self.policy = 'block'
+        self.block_timeout = 5.0
+        self.written = 0
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._atexit_registered = False
+    
+    def configure(self, enabled=True, max_size=10000, batch_size=200, flush_interval=1.0,
+                  policy='block', block_timeout=5.0):
+        """Set sink options; takes effect when the thread next starts"""
+        if policy not in self.POLICIES:
+            raise ValueError(f'Invalid log sink policy: {policy}')
+        self.enabled = enabled
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+    
+    @property
+    def running(self):
+        """True if this process has a live writer thread"""
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+    
+    def ensure_started(self):
+        """Start the writer thread in this process if it isn't running; False if disabled"""
+        if not self.enabled:
+            return False
+        if self.running:
+            return True
+        with self._lock:
+            if not self.running:
+                # A fresh queue per process: one inherited through fork has no reader
+                self._queue = queue.Queue(maxsize=self.max_size)
+                self._stop.clear()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='log-sink', daemon=True)
+                self._thread.start()
+                if not self._atexit_registered:
+                    atexit.register(self.stop)
+                    self._atexit_registered = True
+        return True
+    
+    def emit(self, doc):
+        """Queue a log entry; False if it was dropped"""
+        try:
+            if self.policy == 'drop':
+                self._queue.put_nowait(doc)
+            else:
+                self._queue.put(doc, timeout=self.block_timeout)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+    
+    def _write(self, batch):
+        """Insert one batch, counting failures as dropped"""
+        try:
+            self.write(batch)
+            with self._lock:
+                self.written += len(batch)
+        except Exception as e:
+            print(f"Error writing {len(batch)} log entries: {e}")
+            with self._lock:
+                self.dropped += len(batch)
+    
+    def _run(self):
+        """Writer thread: flush by size or by interval until stopped"""
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+    
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        if self._queue is None or self._pid != os.getpid():
+            return
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+    
+    def stop(self, timeout=5):
+        """Stop the writer thread and write whatever is still queued"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush()
+        self._thread = None
+
 class Log(BaseModel):
-    """Log model"""
+    """Log model.
+
+    Storage follows LOG_RETENTION_MODE: 'none' (one unbounded collection),
+    'ttl' (TTL index on timestamp), 'capped' (capped `logs` collection) or
+    'partitioned' (monthly logs_YYYYMM collections; the count/find/aggregate
+    helpers below read across them, pruning by timestamp where the query
+    allows, and retention drops whole partitions).
+    """
+    
+    RETENTION_MODES = ('none', 'ttl', 'capped', 'partitioned')
+    SEARCH_FIELDS = ('message', 'details')
+    PARTITION_PATTERN = re.compile(r'^logs_(\d{4})(\d{2})$')
+    
+    # Set from the app config by configure_retention() in create_app
+    retention_mode = 'none'
+    retention_days = None
+    capped_size_mb = 256
+    _known_partitions = set()
     
     @classmethod
     @property
@@ -233,31 +1376,706 @@ class Log(BaseModel):
         return BaseModel.get_db().logs
     
     @classmethod
-    def create(cls, data):
-        """Create new log entry"""
+    def configure_retention(cls, mode='none', days=None, capped_size_mb=256):
+        """Select the log storage mode (module-level so the log sink thread sees it too)"""
+        if mode not in cls.RETENTION_MODES:
+            raise ValueError(f'Invalid log retention mode: {mode}')
+        cls.retention_mode = mode
+        cls.retention_days = days
+        cls.capped_size_mb = capped_size_mb
+        cls._known_partitions = set()
+    
+    @classmethod
+    def create(cls, data, session=None):
+        """Create new log entry.
+
+        Queued to the log sink when it is enabled; entries that are part of
+        a multi-document transaction (`session`) are written inline. Both
+        paths update the LogStats summary counters.
+        """
         data['timestamp'] = datetime.now()
-        result = cls.collection.insert_one(data)
+        data[SearchIndex.FIELD] = SearchIndex.terms(*(data.get(f) for f in cls.SEARCH_FIELDS))
+        if session is None and log_sink.ensure_started():
+            data['_id'] = ObjectId()
+            return str(data['_id']) if log_sink.emit(data) else None
+        
+        result = cls.target_collection(data['timestamp']).insert_one(data, session=session)
+        LogStats.record([data])
         return str(result.inserted_id)
     
     @classmethod
-    def get_all(cls, filters=None, page=1, per_page=50):
-        """Get all logs with filters"""
+    def write_batch(cls, batch):
+        """Insert queued log entries (log sink writer)"""
+        by_collection = {}
+        for doc in batch:
+            by_collection.setdefault(cls.target_collection(doc['timestamp']).name, []).append(doc)
+        for name, docs in by_collection.items():
+            cls.get_db()[name].insert_many(docs, ordered=False)
+        LogStats.record(batch)
+    
+    # ----- Storage layout -----
+    
+    @staticmethod
+    def partition_name(timestamp):
+        """Monthly partition a timestamp belongs to"""
+        return f'logs_{timestamp:%Y%m}'
+    
+    @classmethod
+    def partition_bounds(cls, name):
+        """[start, end) covered by a partition"""
+        year, month = (int(part) for part in cls.PARTITION_PATTERN.match(name).groups())
+        return datetime(year, month, 1), datetime(year + month // 12, month % 12 + 1, 1)
+    
+    @classmethod
+    def storage_names(cls):
+        """Collections holding logs, oldest partition first ('logs' also holds pre-partition data)"""
+        if cls.retention_mode != 'partitioned':
+            return ['logs']
+        names = cls.get_db().list_collection_names()
+        partitions = sorted(name for name in names if cls.PARTITION_PATTERN.match(name))
+        return (['logs'] if 'logs' in names else []) + partitions
+    
+    @classmethod
+    def names_for(cls, query=None):
+        """Collections a query can match, pruned by its timestamp bounds"""
+        names = cls.storage_names()
+        bounds = (query or {}).get('timestamp')
+        if cls.retention_mode != 'partitioned' or not isinstance(bounds, dict):
+            return names
+        
+        lower = bounds.get('$gte', bounds.get('$gt'))
+        upper = bounds.get('$lte', bounds.get('$lt'))
+        selected = []
+        for name in names:
+            if name == 'logs':
+                selected.append(name)
+                continue
+            start, end = cls.partition_bounds(name)
+            if (lower is None or end > lower) and (upper is None or start <= upper):
+                selected.append(name)
+        return selected
+    
+    @classmethod
+    def target_collection(cls, timestamp):
+        """Collection a new entry is written to"""
+        if cls.retention_mode != 'partitioned':
+            return cls.collection
+        name = cls.partition_name(timestamp)
+        if name not in cls._known_partitions:
+            # First write to this month in this process: index it and prune expired months
+            cls.create_indexes(cls.get_db()[name])
+            cls._known_partitions.add(name)
+            if cls.retention_days:
+                cls.drop_partitions_before(timestamp - timedelta(days=cls.retention_days))
+        return cls.get_db()[name]
+    
+    @classmethod
+    def create_indexes(cls, collection=None):
+        """Create the log indexes (TTL on timestamp in 'ttl' mode)"""
+        collection = collection if collection is not None else cls.collection
+        if cls.retention_mode == 'ttl' and cls.retention_days:
+            ttl = int(cls.retention_days * 86400)
+            try:
+                collection.create_index('timestamp', expireAfterSeconds=ttl)
+            except OperationFailure:
+                # An existing timestamp index: switch it to a TTL index in place
+                cls.get_db().command('collMod', collection.name, index={
+                    'keyPattern': {'timestamp': 1}, 'expireAfterSeconds': ttl
+                })
+        else:
+            collection.create_index('timestamp')
+        collection.create_index([('level', 1), ('timestamp', -1)])  # level filter, newest first
+        collection.create_index('category')
+        collection.create_index([('timestamp', -1)])
+        collection.create_index([('timestamp', -1), ('_id', -1)])  # keyset pagination
+        collection.create_index(SearchIndex.FIELD)  # prefix search
+    
+    @classmethod
+    def apply_retention(cls):
+        """Set up storage for the configured mode and enforce retention.
+
+        Returns the number of partitions dropped.
+        """
+        db = cls.get_db()
+        if cls.retention_mode == 'capped':
+            size = int(cls.capped_size_mb * 1024 * 1024)
+            if 'logs' not in db.list_collection_names():
+                db.create_collection('logs', capped=True, size=size)
+            elif not db.logs.options().get('capped'):
+                db.command('convertToCapped', 'logs', size=size)
+            cls.create_indexes()
+        elif cls.retention_mode == 'partitioned':
+            now = datetime.now()
+            dropped = cls.drop_partitions_before(now - timedelta(days=cls.retention_days)) if cls.retention_days else 0
+            cls.target_collection(now)
+            return dropped
+        else:
+            cls.create_indexes()
+        return 0
+    
+    @classmethod
+    def drop_partitions_before(cls, cutoff):
+        """Drop partitions that end before `cutoff`"""
+        dropped = 0
+        for name in cls.storage_names():
+            if name == 'logs':
+                continue
+            if cls.partition_bounds(name)[1] <= cutoff:
+                cls.get_db().drop_collection(name)
+                cls._known_partitions.discard(name)
+                Tombstone.record_range(name)
+                dropped += 1
+        return dropped
+    
+    @classmethod
+    def delete_before(cls, cutoff, record=True):
+        """Delete entries older than `cutoff`; whole partitions are dropped. Returns the count removed.
+
+        Records one range tombstone (not one per entry) so incremental
+        backups replay the clear; `record=False` is that replay.
+        """
+        query = {'timestamp': {'$lt': cutoff}}
+        if record:
+            Tombstone.record_range('logs', cutoff)
+        if cls.retention_mode != 'partitioned':
+            return cls.collection.delete_many(query).deleted_count
+        
+        deleted = 0
+        for name in cls.names_for(query):
+            collection = cls.get_db()[name]
+            if name != 'logs':
+                if cls.partition_bounds(name)[1] <= cutoff:
+                    deleted += collection.estimated_document_count()
+                    cls.get_db().drop_collection(name)
+                    cls._known_partitions.discard(name)
+                    continue
+            deleted += collection.delete_many(query).deleted_count
+        return deleted
+    
+    # ----- Reads across partitions -----
+    
+    @classmethod
+    def count(cls, query=None):
+        """Count entries across every collection the query can match"""
+        if cls.retention_mode != 'partitioned':
+            return super().count(query)
+        db = cls.get_db()
+        if not query:
+            return sum(db[name].estimated_document_count() for name in cls.storage_names())
+        return sum(db[name].count_documents(query) for name in cls.names_for(query))
+    
+    @classmethod
+    def aggregate(cls, pipeline):
+        """Run a pipeline over all partitions ($unionWith); a leading $match is applied to each"""
+        if cls.retention_mode != 'partitioned':
+            return cls.collection.aggregate(pipeline)
+        
+        match = pipeline[0]['$match'] if pipeline and '$match' in pipeline[0] else None
+        names = cls.names_for(match)
+        if not names:
+            return iter([])
+        head = [{'$match': match}] if match is not None else []
+        unions = [
+            {'$unionWith': {'coll': name, 'pipeline': list(head)}}
+            for name in names[1:]
+        ]
+        rest = pipeline[1:] if match is not None else pipeline
+        return cls.get_db()[names[0]].aggregate(head + unions + rest)
+    
+    @classmethod
+    def find_sorted(cls, query, sort, skip=0, limit=0):
+        """Sorted, paged entries across partitions"""
+        if cls.retention_mode != 'partitioned':
+            return super().find_sorted(query, sort, skip, limit)
+        pipeline = [{'$match': query or {}}, {'$sort': dict(sort)}, {'$project': SearchIndex.HIDDEN}]
+        if skip:
+            pipeline.append({'$skip': skip})
+        if limit:
+            pipeline.append({'$limit': limit})
+        return list(cls.aggregate(pipeline))
+    
+    @classmethod
+    def oldest_timestamp(cls):
+        """Timestamp of the oldest stored entry (None when there are none)"""
+        for name in cls.storage_names():
+            doc = cls.get_db()[name].find_one({}, {'timestamp': 1}, sort=[('timestamp', 1)])
+            if doc:
+                return doc['timestamp']
+        return None
+    
+    @classmethod
+    def find_one(cls, query):
+        """First matching entry in any partition"""
+        if cls.retention_mode != 'partitioned':
+            return cls.collection.find_one(query, SearchIndex.HIDDEN)
+        for name in reversed(cls.names_for(query)):
+            doc = cls.get_db()[name].find_one(query, SearchIndex.HIDDEN)
+            if doc:
+                return doc
+        return None
+    
+    @classmethod
+    def distinct(cls, field, query=None):
+        """Distinct values of a field across partitions"""
+        if cls.retention_mode != 'partitioned':
+            return cls.collection.distinct(field, query or {})
+        values = []
+        for name in cls.names_for(query):
+            for value in cls.get_db()[name].distinct(field, query or {}):
+                if value not in values:
+                    values.append(value)
+        return values
+    
+    @classmethod
+    def get_all(cls, filters=None, page=1, per_page=50, after=None, rank=None):
+        """Get all logs with filters (keyset pagination when `after` is given,
+        relevance order when `rank` holds search words)"""
         query = filters or {}
+        if after is not None:
+            return cls.get_page_after(query, 'timestamp', after, per_page)
+        if rank:
+            return cls.get_ranked(query, rank, 'timestamp', page, per_page)
+        
         skip = (page - 1) * per_page
         
-        cursor = cls.collection.find(query).sort('timestamp', -1).skip(skip).limit(per_page)
-        total = cls.collection.count_documents(query)
+        items = cls.find_sorted(query, [('timestamp', -1)], skip=skip, limit=per_page)
+        total = cls.count(query)
         
         return {
-            'items': cls.to_list(cursor),
+            'items': cls.to_list(items),
             'total': total,
             'page': page,
             'per_page': per_page,
             'pages': (total + per_page - 1) // per_page
         }
 
+class LogStats(BaseModel):
+    """Precomputed log counters maintained on the write path.
+
+    One `day:<date>` document per day holds that day's per-level/per-category
+    counts. With LOG_RETENTION_MODE 'none' a `totals` document holds lifetime
+    counts and `frequent_errors` a space-saving sketch of the most common
+    ERROR messages. In the other modes logs are removed silently (TTL
+    expiry, capped eviction, partition drops), so totals are summed from the
+    day documents from the oldest stored log onwards and the sketch is kept
+    per day (`frequent:<date>`) and merged on read. Sketch counts are upper
+    bounds, over-estimated by at most `error`.
+    
+    rebuild() writes a `built` marker last; until it exists (a fresh
+    upgrade, or a dropped collection) summary() rebuilds from the logs first,
+    and startup runs that rebuild in the background.
+    """
+    
+    TOTALS_ID = 'totals'
+    FREQUENT_ID = 'frequent_errors'
+    BUILT_ID = 'built'
+    FREQUENT_CAPACITY = 50
+    DAYS_KEPT = 40
+    CAPPED_DAYS_KEPT = 400
+    
+    @classmethod
+    @property
+    def collection(cls):
+        return BaseModel.get_db().log_stats
+    
+    @staticmethod
+    def field(value):
+        """Level/category as a safe field name"""
+        return str(value or 'UNKNOWN').replace('.', '_').lstrip('$') or 'UNKNOWN'
+    
+    @staticmethod
+    def day_id(timestamp):
+        return f'day:{timestamp:%Y-%m-%d}'
+    
+    @staticmethod
+    def frequent_id(day):
+        return f'frequent:{day:%Y-%m-%d}'
+    
+    @staticmethod
+    def lifetime():
+        """Whether logs are only ever removed explicitly (lifetime totals stay valid)"""
+        return Log.retention_mode == 'none'
+    
+    @classmethod
+    def days_kept(cls):
+        """How long day documents must outlive the logs they count"""
+        if Log.retention_mode == 'capped' or not Log.retention_days:
+            return cls.DAYS_KEPT if cls.lifetime() else cls.CAPPED_DAYS_KEPT
+        # Partitions are dropped a whole month at a time
+        return max(cls.DAYS_KEPT, int(Log.retention_days) + 32)
+    
+    @classmethod
+    def is_built(cls):
+        """True once rebuild() has counted the logs already stored"""
+        return cls.collection.find_one({'_id': cls.BUILT_ID}, {'_id': 1}) is not None
+    
+    @classmethod
+    def ensure_built(cls):
+        """Rebuild the counters if they were never built; True if a rebuild ran"""
+        if cls.is_built():
+            return False
+        cls.rebuild()
+        return True
+    
+    @classmethod
+    def start_rebuild(cls):
+        """Run ensure_built() in a daemon thread (summary() rebuilds itself if asked first)"""
+        def run():
+            try:
+                if cls.ensure_built():
+                    print("✅ Log stats built from stored logs")
+            except Exception as e:
+                print(f"⚠️ Log stats rebuild failed: {e}")
+        
+        thread = threading.Thread(target=run, name='log-stats-rebuild', daemon=True)
+        thread.start()
+        return thread
+    
+    @classmethod
+    def create_indexes(cls):
+        """TTL index expiring day documents after days_kept()"""
+        ttl = cls.days_kept() * 86400
+        try:
+            cls.collection.create_index('day', expireAfterSeconds=ttl)
+        except OperationFailure:
+            cls.get_db().command('collMod', cls.collection.name, index={
+                'keyPattern': {'day': 1}, 'expireAfterSeconds': ttl
+            })
+    
+    @classmethod
+    def record(cls, entries):
+        """Count a batch of new log entries (errors are printed, never raised)"""
+        try:
+            days = {}
+            totals = {}
+            errors = {}
+            for entry in entries:
+                timestamp = entry['timestamp']
+                day = datetime(timestamp.year, timestamp.month, timestamp.day)
+                fields = [
+                    'total',
+                    f"levels.{cls.field(entry.get('level'))}",
+                    f"categories.{cls.field(entry.get('category'))}"
+                ]
+                if entry.get('level') == 'ERROR':
+                    fields.append(f"error_categories.{cls.field(entry.get('category'))}")
+                    day_errors = errors.setdefault(day, {})
+                    count, last = day_errors.get(entry.get('message'), (0, timestamp))
+                    day_errors[entry.get('message')] = (count + 1, max(last, timestamp))
+                
+                inc = days.setdefault(day, {})
+                for name in fields:
+                    inc[name] = inc.get(name, 0) + 1
+                    totals[name] = totals.get(name, 0) + 1
+            
+            for day, inc in days.items():
+                cls.collection.update_one(
+                    {'_id': cls.day_id(day)},
+                    {'$inc': inc, '$setOnInsert': {'day': day}},
+                    upsert=True
+                )
+            if cls.lifetime():
+                if totals:
+                    cls.collection.update_one({'_id': cls.TOTALS_ID}, {'$inc': totals}, upsert=True)
+                merged = {}
+                for day_errors in errors.values():
+                    for message, (count, last) in day_errors.items():
+                        total, latest = merged.get(message, (0, last))
+                        merged[message] = (total + count, max(latest, last))
+                if merged:
+                    cls.record_frequent(cls.FREQUENT_ID, merged)
+            else:
+                for day, day_errors in errors.items():
+                    cls.record_frequent(cls.frequent_id(day), day_errors, day=day)
+        except Exception as e:
+            print(f"Error updating log stats: {e}")
+    
+    @classmethod
+    def space_saving(cls, items, counts):
+        """Apply {message: (count, last_occurrence)} to a space-saving item list"""
+        tracked = {item['message']: item for item in items}
+        for message, (count, last) in counts.items():
+            item = tracked.get(message)
+            if item is None:
+                if len(tracked) < cls.FREQUENT_CAPACITY:
+                    item = tracked[message] = {'message': message, 'count': 0, 'error': 0,
+                                               'last_occurrence': last}
+                else:
+                    # Evict the smallest counter; the newcomer inherits its count as error
+                    evicted = min(tracked.values(), key=lambda i: i['count'])
+                    del tracked[evicted['message']]
+                    item = tracked[message] = {'message': message, 'count': evicted['count'],
+                                               'error': evicted['count'], 'last_occurrence': last}
+            item['count'] += count
+            item['last_occurrence'] = max(item['last_occurrence'], last)
+        return sorted(tracked.values(), key=lambda i: i['count'], reverse=True)
+    
+    @staticmethod
+    def merge_sketches(sketches):
+        """Combine per-day sketches: counts and error bounds add up"""
+        merged = {}
+        for items in sketches:
+            for item in items:
+                total = merged.setdefault(item['message'], {**item, 'count': 0, 'error': 0})
+                total['count'] += item['count']
+                total['error'] += item['error']
+                total['last_occurrence'] = max(total['last_occurrence'], item['last_occurrence'])
+        return sorted(merged.values(), key=lambda i: i['count'], reverse=True)
+    
+    @classmethod
+    def record_frequent(cls, sketch_id, counts, day=None, attempts=5):
+        """Merge message counts into a sketch (optimistic concurrency on `version`)"""
+        for _ in range(attempts):
+            doc = cls.collection.find_one({'_id': sketch_id}) or {'items': [], 'version': 0}
+            items = cls.space_saving(doc['items'], counts)
+            update = {'items': items, 'version': doc['version'] + 1}
+            if day is not None:
+                update['day'] = day
+            try:
+                result = cls.collection.update_one(
+                    {'_id': sketch_id, 'version': doc['version']},
+                    {'$set': update},
+                    upsert=doc['version'] == 0
+                )
+            except DuplicateKeyError:
+                continue
+            if result.matched_count or result.upserted_id is not None:
+                return True
+        print("Error updating frequent errors: too many concurrent updates")
+        return False
+    
+    @classmethod
+    def summary(cls, now=None):
+        """Totals plus today/7-day/30-day counts from a bounded number of documents"""
+        # Counters written before an upgrade (or after a drop) would miss stored logs
+        cls.ensure_built()
+        
+        now = now or datetime.now()
+        today = datetime(now.year, now.month, now.day)
+        week_start, month_start = today - timedelta(days=7), today - timedelta(days=30)
+        
+        if cls.lifetime():
+            start = month_start
+            query = {'$or': [
+                {'_id': {'$in': [cls.TOTALS_ID, cls.FREQUENT_ID]}},
+                {'day': {'$gte': start}}
+            ]}
+        else:
+            # Only days that still have stored logs count towards the totals
+            oldest = Log.oldest_timestamp()
+            start = datetime(oldest.year, oldest.month, oldest.day) if oldest else today
+            query = {'day': {'$gte': min(start, month_start)}}
+        docs = list(cls.collection.find(query))
+        
+        days = {doc['day']: doc for doc in docs if doc['_id'].startswith('day:')}
+        
+        def window_count(since, level=None):
+            return sum(
+                doc.get('levels', {}).get(level, 0) if level else doc.get('total', 0)
+                for day, doc in days.items() if day >= max(since, start)
+            )
+        
+        if cls.lifetime():
+            totals = next((doc for doc in docs if doc['_id'] == cls.TOTALS_ID), {})
+            frequent = next((doc['items'] for doc in docs if doc['_id'] == cls.FREQUENT_ID), [])
+        else:
+            totals = {'total': 0}
+            for day, doc in days.items():
+                if day < start:
+                    continue
+                totals['total'] += doc.get('total', 0)
+                for group in ('levels', 'categories', 'error_categories'):
+                    for name, count in doc.get(group, {}).items():
+                        totals.setdefault(group, {})[name] = totals.get(group, {}).get(name, 0) + count
+            frequent = cls.merge_sketches(
+                doc['items'] for doc in docs
+                if doc['_id'].startswith('frequent:') and doc['day'] >= start
+            )
+        
+        return {
+            'total': totals.get('total', 0),
+            'levels': totals.get('levels', {}),
+            'categories': totals.get('categories', {}),
+            'error_categories': totals.get('error_categories', {}),
+            'today': window_count(today),
+            'this_week': window_count(week_start),
+            'this_month': window_count(month_start),
+            'errors_today': window_count(today, 'ERROR'),
+            'errors_week': window_count(week_start, 'ERROR'),
+            'errors_month': window_count(month_start, 'ERROR'),
+            'errors_by_day': [
+                (day, days[day]['levels']['ERROR'])
+                for day in sorted(days)
+                if day >= max(month_start, start) and days[day].get('levels', {}).get('ERROR')
+            ],
+            'frequent_errors': frequent
+        }
+    
+    @classmethod
+    def rebuild(cls):
+        """Recompute every counter from the stored logs (after clears, prunes and restores)"""
+        cutoff = datetime.now() - timedelta(days=cls.days_kept())
+        day_key = {
+            'year': {'$year': '$timestamp'},
+            'month': {'$month': '$timestamp'},
+            'day': {'$dayOfMonth': '$timestamp'}
+        }
+        
+        totals = {'total': 0}
+        days = {}
+        for row in Log.aggregate([
+            {'$group': {
+                '_id': {**day_key, 'level': '$level', 'category': '$category'},
+                'count': {'$sum': 1}
+            }}
+        ]):
+            key = row['_id']
+            level, category = key.get('level'), key.get('category')
+            names = ['total', f'levels.{cls.field(level)}', f'categories.{cls.field(category)}']
+            if level == 'ERROR':
+                names.append(f'error_categories.{cls.field(category)}')
+            
+            day = datetime(key['year'], key['month'], key['day'])
+            counters = [totals] + ([days.setdefault(day, {})] if day >= cutoff else [])
+            for counter in counters:
+                for name in names:
+                    counter[name] = counter.get(name, 0) + row['count']
+        
+        # Exact top messages: overall for lifetime totals, per day otherwise
+        group_id = {'message': '$message'} if cls.lifetime() else {**day_key, 'message': '$message'}
+        sketches = {}
+        for row in Log.aggregate([
+            {'$match': {'level': 'ERROR'}},
+            {'$group': {
+                '_id': group_id,
+                'count': {'$sum': 1},
+                'last_occurrence': {'$max': '$timestamp'}
+            }},
+            {'$sort': {'count': -1}}
+        ]):
+            key = row['_id']
+            day = None if cls.lifetime() else datetime(key['year'], key['month'], key['day'])
+            items = sketches.setdefault(day, [])
+            if len(items) < cls.FREQUENT_CAPACITY:
+                items.append({'message': key['message'], 'count': row['count'], 'error': 0,
+                              'last_occurrence': row['last_occurrence']})
+        
+        # Upserts, so a rebuild racing another one (startup vs. first read) can't collide
+        documents = [cls.expand({'_id': cls.TOTALS_ID}, totals)]
+        documents += [cls.expand({'_id': cls.day_id(day), 'day': day}, counts) for day, counts in days.items()]
+        for day, items in sketches.items():
+            if day is None:
+                documents.append({'_id': cls.FREQUENT_ID, 'items': items, 'version': 1})
+            elif day >= cutoff:
+                documents.append({'_id': cls.frequent_id(day), 'day': day, 'items': items, 'version': 1})
+        documents.append({'_id': cls.BUILT_ID, 'built_at': datetime.now()})
+        
+        cls.collection.delete_many({})
+        for doc in documents:
+            cls.collection.replace_one({'_id': doc['_id']}, doc, upsert=True)
+        return totals['total']
+    
+    @staticmethod
+    def expand(doc, counts):
+        """Turn dotted counter names into nested fields"""
+        for name, value in counts.items():
+            target = doc
+            *parents, leaf = name.split('.')
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[leaf] = value
+        return doc
+
+log_sink = LogSink(Log.write_batch)
+
+class ExportJob(BaseModel):
+    """Background export job (state shared by every worker process)"""
+    
+    @classmethod
+    @property
+    def collection(cls):
+        return BaseModel.get_db().export_jobs
+    
+    @classmethod
+    def create(cls, data):
+        """Create a queued export job"""
+        data['status'] = 'queued'
+        data['rows_written'] = 0
+        data['total_estimate'] = data.get('total_estimate', 0)
+        data['created_at'] = datetime.now()
+        data['updated_at'] = datetime.now()
+        
+        result = cls.collection.insert_one(data)
+        return str(result.inserted_id)
+    
+    @classmethod
+    def update(cls, job_id, data):
+        """Update job state"""
+        data['updated_at'] = datetime.now()
+        result = cls.collection.update_one(
+            {'_id': ObjectId(job_id)},
+            {'$set': data}
+        )
+        return result.modified_count > 0
+    
+    @classmethod
+    def get_by_id(cls, job_id):
+        """Get export job by ID"""
+        return cls.collection.find_one({'_id': ObjectId(job_id)})
+    
+    @classmethod
+    def get_expired(cls, now=None):
+        """Completed jobs whose artifact has passed its expiry"""
+        return list(cls.collection.find({
+            'status': 'completed',
+            'expires_at': {'$lte': now or datetime.now()}
+        }))
+
+class Tombstone(BaseModel):
+    """Record of a hard delete, so incremental backups can replay it.
+
+    Single documents are recorded by `doc_id`. Log clears and partition drops
+    are recorded as one range (`before`) each. Logs removed by a TTL index or
+    capped-collection eviction are not recorded; the server removes them
+    again after a restore.
+    """
+    
+    @classmethod
+    @property
+    def collection(cls):
+        return BaseModel.get_db().tombstones
+    
+    @classmethod
+    def record(cls, collection_name, doc_ids, session=None):
+        """Record deleted document IDs of one collection"""
+        if not doc_ids:
+            return
+        now = datetime.now(pytz.UTC)
+        cls.collection.insert_many(
+            [{'collection': collection_name, 'doc_id': doc_id, 'deleted_at': now} for doc_id in doc_ids],
+            session=session
+        )
+    
+    @classmethod
+    def record_range(cls, collection_name, before=None):
+        """Record a bulk delete: entries older than `before`, or the whole collection when None"""
+        cls.collection.insert_one({
+            'collection': collection_name,
+            'before': before,
+            'deleted_at': datetime.now(pytz.UTC)
+        })
+    
+    @classmethod
+    def create_indexes(cls):
+        """Index on deleted_at; old tombstones expire after TOMBSTONE_TTL_DAYS"""
+        ttl_days = current_app.config.get('TOMBSTONE_TTL_DAYS', 90)
+        cls.collection.create_index('deleted_at', expireAfterSeconds=ttl_days * 86400)
+
 class Settings(BaseModel):
-    """Settings model"""
+    """Settings model (reads served from a short-TTL per-worker cache)"""
+    
+    # Missing keys are cached as {} so defaults don't cost a query either
+    reference_cache = ReferenceCache('settings', ttl_setting='SETTINGS_CACHE_TTL')
     
     @classmethod
     @property
@@ -267,8 +2085,31 @@ class Settings(BaseModel):
     @classmethod
     def get(cls, key, default=None):
         """Get setting value"""
-        setting = cls.collection.find_one({'key': key})
-        return setting.get('value', default) if setting else default
+        setting = cls.reference_cache.get(key)
+        if setting is None:
+            setting = cls.collection.find_one({'key': key}) or {}
+            cls.reference_cache.set(key, setting)
+        return setting.get('value', default)
+    
+    @classmethod
+    def get_many(cls, defaults):
+        """Get several settings at once as {key: value}, given {key: default}"""
+        settings = {}
+        missing = []
+        for key in defaults:
+            setting = cls.reference_cache.get(key)
+            if setting is None:
+                missing.append(key)
+            else:
+                settings[key] = setting
+        
+        if missing:
+            found = {doc['key']: doc for doc in cls.collection.find({'key': {'$in': missing}})}
+            for key in missing:
+                settings[key] = found.get(key, {})
+                cls.reference_cache.set(key, settings[key])
+        
+        return {key: settings[key].get('value', default) for key, default in defaults.items()}
     
     @classmethod
     def set(cls, key, value):
@@ -277,4 +2118,5 @@ class Settings(BaseModel):
             {'key': key},
             {'$set': {'value': value, 'updated_at': datetime.now()}},
             upsert=True
-        )
\ No newline at end of file
+        )
+        cls.invalidate_cache()
\ No newline at end of file
@@ -4,7 +4,7 @@ Account management routes
 Version: 1.0.0
 """
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
-from app.models import Account, Transaction, Log
+from app.models import Account, Transaction, Log, Tombstone
 from datetime import datetime
 from bson import ObjectId
 from app import mongo
@@ -23,31 +23,19 @@ def get_accounts_data():
     """Get accounts data for DataTable"""
     try:
         accounts = list(mongo.db.accounts.find({'is_active': True}).sort('name', 1))
+        stats = Account.get_activity_stats([account['_id'] for account in accounts])
         
         # Enhance with additional data
         for account in accounts:
             account['id'] = str(account['_id'])
             del account['_id']
             
-            # Get transaction count
-            transaction_count = mongo.db.transactions.count_documents({
-                '$or': [
-                    {'from_account_id': account['id']},
-                    {'to_account_id': account['id']}
-                ]
-            })
-            account['transaction_count'] = transaction_count
+            activity = stats.get(account['id'], {})
+            account['transaction_count'] = activity.get('count', 0)
             
-            # Get last transaction date and format it
-            last_transaction = mongo.db.transactions.find_one(
-                {'$or': [
-                    {'from_account_id': account['id']},
-                    {'to_account_id': account['id']}
-                ]},
-                sort=[('date', -1)]
-            )
-            if last_transaction and 'date' in last_transaction:
-                account['last_transaction'] = format_datetime_for_api(last_transaction['date'])
+            # Format last transaction date
+            if activity.get('last_date'):
+                account['last_transaction'] = format_datetime_for_api(activity['last_date'])
             else:
                 account['last_transaction'] = None
         
@@ -122,18 +110,13 @@ def account_detail(account_id):
                 del account['_id']
                 
                 # Get transaction summary
-                transactions = list(mongo.db.transactions.find({
-                    '$or': [
-                        {'from_account_id': account_id},
-                        {'to_account_id': account_id}
-                    ]
-                }))
+                activity = Account.get_activity_stats([account_id]).get(account_id, {})
                 
                 account['statistics'] = {
-                    'total_transactions': len(transactions),
-                    'total_inflow': sum(t['amount'] for t in transactions if t['to_account_id'] == account_id),
-                    'total_outflow': sum(t['amount'] for t in transactions if t['from_account_id'] == account_id),
-                    'average_transaction': sum(t['amount'] for t in transactions) / len(transactions) if transactions else 0
+                    'total_transactions': activity.get('count', 0),
+                    'total_inflow': activity.get('inflow', 0),
+                    'total_outflow': activity.get('outflow', 0),
+                    'average_transaction': activity.get('average') or 0
                 }
                 
                 return jsonify({
@@ -189,7 +172,9 @@ def account_detail(account_id):
             else:
                 # Hard delete if no transactions
                 result = mongo.db.accounts.delete_one({'_id': ObjectId(account_id)})
+                Account.invalidate_cache()
                 if result.deleted_count > 0:
+                    Tombstone.record('accounts', [ObjectId(account_id)])
                     return jsonify({
                         'success': True,
                         'message': 'Account deleted permanently',
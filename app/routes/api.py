@@ -3,10 +3,16 @@
 RESTful API routes for Expense Tracker System
 Version: 1.0.0
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app import limiter
-from app.models import Transaction, Account, Category, Budget, Log
+from app.models import Transaction, Account, Category, Budget, Log, SearchIndex
+from app.utils import ledger
+from app.utils.validators import validate_transaction
+from app.utils.helpers import parse_date_from_request, get_current_utc_time
+from app.utils.importers import import_statement
 from datetime import datetime
+import io
+import json
 from bson import ObjectId
 from app import mongo
 
@@ -114,20 +120,27 @@ def get_transactions():
                 filters['amount'] = {}
             filters['amount']['$lte'] = float(request.args.get('max_amount'))
         
+        rank = None
         if request.args.get('description'):
-            filters['description'] = {'$regex': request.args.get('description'), '$options': 'i'}
+            rank = SearchIndex.apply(filters, request.args.get('description'), Transaction,
+                                     request.args.get('search_mode', current_app.config.get('SEARCH_MODE', 'prefix')))
         
-        result = Transaction.get_all(filters, page, per_page)
+        # Opt-in keyset pagination: ?after= for the first page, then next_cursor
+        result = Transaction.get_all(filters, page, per_page, after=request.args.get('after'), rank=rank)
+        
+        pagination = {
+            'page': result['page'],
+            'per_page': result['per_page'],
+            'total': result['total'],
+            'pages': result['pages']
+        }
+        if 'next_cursor' in result:
+            pagination['next_cursor'] = result['next_cursor']
         
         return jsonify({
             'success': True,
             'data': result['items'],
-            'pagination': {
-                'page': result['page'],
-                'per_page': result['per_page'],
-                'total': result['total'],
-                'pages': result['pages']
-            }
+            'pagination': pagination
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
@@ -153,39 +166,12 @@ def create_transaction():
         if 'date' not in data:
             data['date'] = datetime.now()
         
-        # Process transaction
-        transaction_id = Transaction.create(data)
-        
-        # Update account balances
-        if data['type'] == 'income' and 'to_account_id' in data:
-            account = Account.get_by_id(data['to_account_id'])
-            if account:
-                new_balance = account['balance'] + data['amount']
-                Account.update(data['to_account_id'], {'balance': new_balance})
-        
-        elif data['type'] == 'expense' and 'from_account_id' in data:
-            account = Account.get_by_id(data['from_account_id'])
-            if account:
-                new_balance = account['balance'] - data['amount']
-                Account.update(data['from_account_id'], {'balance': new_balance})
-        
-        elif data['type'] == 'transfer':
-            if 'from_account_id' in data and 'to_account_id' in data:
-                from_account = Account.get_by_id(data['from_account_id'])
-                to_account = Account.get_by_id(data['to_account_id'])
-                
-                if from_account and to_account:
-                    Account.update(data['from_account_id'], 
-                                 {'balance': from_account['balance'] - data['amount']})
-                    Account.update(data['to_account_id'], 
-                                 {'balance': to_account['balance'] + data['amount']})
-        
-        # Log the action
-        Log.create({
+        # Insert, update balances ($inc) and log in one ledger write
+        transaction_id = ledger.create_transaction(data, log={
             'level': 'SUCCESS',
             'category': 'API_TRANSACTION',
             'message': f'Transaction created: {data["description"]}',
-            'details': {'transaction_id': transaction_id, 'type': data['type']}
+            'details': {'type': data['type']}
         })
         
         return jsonify({
@@ -203,6 +189,134 @@ def create_transaction():
         })
         return jsonify({'success': False, 'error': str(e)}), 400
 
+def parse_bulk_body():
+    """Rows of a bulk request: a JSON array, or NDJSON (one object per line).
+
+    Returns (rows, errors); NDJSON lines that fail to parse are reported by
+    index instead of rejecting the whole body.
+    """
+    body = request.get_data(as_text=True).strip()
+    if body.startswith('['):
+        return json.loads(body), []
+    
+    rows, errors = [], []
+    for index, line in enumerate(l for l in body.splitlines() if l.strip()):
+        try:
+            rows.append(json.loads(line))
+        except ValueError as e:
+            rows.append(None)
+            errors.append({'index': index, 'errors': [f'Invalid JSON: {e}']})
+    return rows, errors
+
+def normalize_bulk_row(row):
+    """Coerce a validated bulk row into the stored transaction shape"""
+    data = {
+        'type': row['type'],
+        'amount': float(row['amount']),
+        'description': str(row['description']),
+        'date': parse_date_from_request(row['date']) if row.get('date') else get_current_utc_time()
+    }
+    for field in ('category_id', 'from_account_id', 'to_account_id'):
+        if row.get(field):
+            data[field] = str(row[field])
+    
+    tags = row.get('tags') or []
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
+    data['tags'] = tags
+    
+    for field in ('notes', 'is_reconciled'):
+        if field in row:
+            data[field] = row[field]
+    return data
+
+@api_bp.route('/transactions/bulk', methods=['POST'])
+@limiter.limit("10 per minute")
+def bulk_create_transactions():
+    """Create many transactions in one request"""
+    try:
+        try:
+            rows, errors = parse_bulk_body()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': f'Invalid JSON body: {e}'}), 400
+        if not isinstance(rows, list) or not rows:
+            return jsonify({'success': False, 'error': 'Expected a JSON array or NDJSON body'}), 400
+        if len(rows) > current_app.config.get('BULK_MAX_ROWS', 50000):
+            return jsonify({'success': False, 'error': 'Too many transactions in one request'}), 413
+        
+        # Validate every row up front; bad rows are reported, not fatal
+        documents, positions = [], []
+        parse_failed = {e['index'] for e in errors}
+        for index, row in enumerate(rows):
+            if index in parse_failed:
+                continue
+            if not isinstance(row, dict):
+                errors.append({'index': index, 'errors': ['Transaction must be an object']})
+                continue
+            row_errors = validate_transaction(row)
+            if row_errors:
+                errors.append({'index': index, 'errors': row_errors})
+                continue
+            try:
+                documents.append(normalize_bulk_row(row))
+            except (TypeError, ValueError) as e:
+                errors.append({'index': index, 'errors': [str(e)]})
+                continue
+            positions.append(index)
+        
+        inserted, write_errors = ledger.create_transactions(
+            documents,
+            log={
+                'level': 'SUCCESS' if not errors else 'WARNING',
+                'category': 'API_TRANSACTION',
+                'message': f'Bulk transaction import: {len(rows)} rows received',
+                'details': {'total_amount': sum(d['amount'] for d in documents)}
+            } if documents else None,
+            chunk_size=current_app.config.get('BULK_INSERT_CHUNK_SIZE', 1000)
+        )
+        errors.extend({'index': positions[p], 'errors': [message]} for p, message in write_errors)
+        errors.sort(key=lambda e: e['index'])
+        
+        status = 201 if not errors else (207 if inserted else 400)
+        return jsonify({
+            'success': bool(inserted),
+            'created': len(inserted),
+            'failed': len(errors),
+            'transaction_ids': [transaction_id for _, transaction_id in inserted],
+            'errors': errors
+        }), status
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@api_bp.route('/transactions/import', methods=['POST'])
+@limiter.limit("10 per minute")
+def import_transactions():
+    """Import a CSV or OFX bank statement into an account"""
+    try:
+        upload = request.files.get('file')
+        account_id = request.form.get('account_id')
+        if not upload or not account_id:
+            return jsonify({'success': False, 'error': 'A file and account_id are required'}), 400
+        if not ObjectId.is_valid(account_id) or not Account.get_by_id(account_id):
+            return jsonify({'success': False, 'error': 'Account not found'}), 404
+        
+        format = (request.form.get('format') or upload.filename.rsplit('.', 1)[-1]).lower()
+        if format == 'qfx':
+            format = 'ofx'
+        if format not in ('csv', 'ofx'):
+            return jsonify({'success': False, 'error': 'Unsupported statement format'}), 400
+        
+        # Optional {"transaction field": "CSV column"} overrides
+        mapping = json.loads(request.form.get('mapping') or '{}')
+        
+        # Parsed straight off the upload stream, never read into memory whole
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        stats = import_statement(stream, account_id, format=format, mapping=mapping)
+        
+        return jsonify({'success': True, 'data': stats})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
 @api_bp.route('/transactions/<transaction_id>', methods=['GET'])
 def get_transaction(transaction_id):
     """Get transaction by ID"""
@@ -222,7 +336,7 @@ def update_transaction(transaction_id):
     """Update transaction"""
     try:
         data = request.get_json()
-        if Transaction.update(transaction_id, data):
+        if ledger.update_transaction(transaction_id, data):
             return jsonify({
                 'success': True,
                 'message': 'Transaction updated successfully'
@@ -235,7 +349,7 @@ def update_transaction(transaction_id):
 def delete_transaction(transaction_id):
     """Delete transaction"""
     try:
-        if Transaction.delete(transaction_id):
+        if ledger.delete_transaction(transaction_id):
             return jsonify({
                 'success': True,
                 'message': 'Transaction deleted successfully'
@@ -4,7 +4,7 @@ Budget management routes
 Version: 1.0.0
 """
 from flask import Blueprint, render_template, request, jsonify
-from app.models import Budget, Category, Transaction, Log
+from app.models import Budget, Category, Transaction, Log, SearchIndex
 from datetime import datetime, timedelta
 from bson import ObjectId
 import calendar
@@ -42,7 +42,8 @@ def get_budgets_data():
             except Exception as e:
                 print(f"Date parsing error: {e}")
         
-        budgets = list(mongo.db.budgets.find(query))
+        # Categories and transaction counts come from the same aggregation
+        budgets = mongo.db.budgets.aggregate(budget_pipeline(query))
         
         result = []
         for budget in budgets:
@@ -50,7 +51,7 @@ def get_budgets_data():
             budget_dict['id'] = str(budget['_id'])
             
             # Get category details
-            category = Category.get_by_id(budget['category_id'])
+            category = budget['category'][0] if budget['category'] else None
             budget_dict['category_name'] = category['name'] if category else 'Unknown'
             budget_dict['category_type'] = category['type'] if category else 'unknown'
             
@@ -75,9 +76,7 @@ def get_budgets_data():
             else:
                 budget_dict['end_date'] = str(budget.get('end_date', ''))
             
-            # Get transaction count for this budget
-            transaction_count = get_budget_transaction_count(budget)
-            budget_dict['transaction_count'] = transaction_count
+            budget_dict['transaction_count'] = budget['transaction_count']
             
             result.append(budget_dict)
         
@@ -89,24 +88,65 @@ def get_budgets_data():
         print(f"Budgets data error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 400
 
-def get_budget_transaction_count(budget):
-    """Get transaction count for a budget"""
-    try:
-        start_date = budget.get('start_date')
-        end_date = budget.get('end_date')
-        
-        if isinstance(start_date, str):
-            start_date = datetime.fromisoformat(start_date)
-        if isinstance(end_date, str):
-            end_date = datetime.fromisoformat(end_date)
-        
-        count = mongo.db.transactions.count_documents({
-            'date': {'$gte': start_date, '$lte': end_date},
-            'category_id': budget['category_id']
+def budget_pipeline(query, recent=0):
+    """Budgets with their category, transaction count and (optionally) latest transactions"""
+    window = {
+        '$match': {
+            '$expr': {
+                '$and': [
+                    {'$eq': ['$category_id', '$$category_id']},
+                    {'$gte': ['$date', '$$start']},
+                    {'$lte': ['$date', '$$end']}
+                ]
+            }
+        }
+    }
+    window_vars = {
+        'category_id': '$category_id',
+        'start': {'$toDate': '$start_date'},
+        'end': {'$toDate': '$end_date'}
+    }
+    
+    pipeline = [
+        {'$match': query},
+        {
+            '$lookup': {
+                'from': 'categories',
+                'let': {'category_id': {'$convert': {'input': '$category_id', 'to': 'objectId', 'onError': None, 'onNull': None}}},
+                'pipeline': [
+                    {'$match': {'$expr': {'$eq': ['$_id', '$$category_id']}}},
+                    {'$project': {'name': 1, 'type': 1}}
+                ],
+                'as': 'category'
+            }
+        },
+        {
+            '$lookup': {
+                'from': 'transactions',
+                'let': window_vars,
+                'pipeline': [window, {'$count': 'count'}],
+                'as': 'transaction_count'
+            }
+        },
+        {'$addFields': {'transaction_count': {'$ifNull': [{'$arrayElemAt': ['$transaction_count.count', 0]}, 0]}}}
+    ]
+    
+    if recent:
+        pipeline.append({
+            '$lookup': {
+                'from': 'transactions',
+                'let': window_vars,
+                'pipeline': [
+                    window,
+                    {'$sort': {'date': -1}},
+                    {'$limit': recent},
+                    {'$addFields': {'id': {'$toString': '$_id'}}},
+                    {'$project': {'_id': 0, SearchIndex.FIELD: 0}}
+                ],
+                'as': 'transactions'
+            }
         })
-        return count
-    except:
-        return 0
+    return pipeline
 
 @budgets_bp.route('/create', methods=['POST'])
 def create_budget():
@@ -197,13 +237,15 @@ def budget_detail(budget_id):
     """Handle individual budget operations"""
     if request.method == 'GET':
         try:
-            budget = Budget.get_by_id(budget_id)
-            if budget:
+            budgets = list(mongo.db.budgets.aggregate(budget_pipeline({'_id': ObjectId(budget_id)}, recent=10)))
+            if budgets:
+                budget = budgets[0]
                 budget['id'] = str(budget['_id'])
                 del budget['_id']
                 
                 # Get category details
-                category = Category.get_by_id(budget['category_id'])
+                category = budget.pop('category')
+                category = category[0] if category else None
                 budget['category_name'] = category['name'] if category else 'Unknown'
                 budget['category_type'] = category['type'] if category else 'unknown'
                 
@@ -212,11 +254,6 @@ def budget_detail(budget_id):
                 budget['remaining'] = budget['amount'] - budget['spent']
                 budget['status'] = get_budget_status(budget)
                 
-                # Get transactions in this budget
-                transactions = get_budget_transactions(budget)
-                budget['transactions'] = transactions[:10]  # Last 10 transactions
-                budget['transaction_count'] = len(transactions)
-                
                 return jsonify({
                     'success': True,
                     'data': budget
@@ -249,6 +286,7 @@ def budget_detail(budget_id):
                 {'_id': ObjectId(budget_id)},
                 {'$set': {'is_active': False, 'updated_at': datetime.now()}}
             )
+            Category.invalidate_usage_stats()
             
             if result.modified_count > 0:
                 return jsonify({
@@ -292,26 +330,17 @@ def recalculate_all_budgets():
         
         start_date = data.get('start_date') if data else None
         
-        budgets = list(mongo.db.budgets.find({'is_active': True}))
-        updated = []
-        
-        for budget in budgets:
-            old_spent = budget.get('spent', 0)
-            new_spent = calculate_budget_spent(budget)
-            
-            if old_spent != new_spent:
-                mongo.db.budgets.update_one(
-                    {'_id': budget['_id']},
-                    {'$set': {
-                        'spent': new_spent,
-                        'updated_at': datetime.now()
-                    }}
-                )
-                updated.append({
-                    'budget_id': str(budget['_id']),
-                    'old_spent': float(old_spent),
-                    'new_spent': float(new_spent)
-                })
+        # One aggregation recomputes every active budget; only drifted ones are written
+        drifted = Budget.find_drift()
+        Budget.fix_spent(drifted)
+        updated = [
+            {
+                'budget_id': str(row['_id']),
+                'old_spent': float(row['spent']),
+                'new_spent': float(row['actual'])
+            }
+            for row in drifted
+        ]
         
         return jsonify({
             'success': True,
@@ -428,24 +457,3 @@ def update_budget_spent(budget_id):
     )
     
     return old_spent
-
-def get_budget_transactions(budget):
-    """Get transactions within budget period and category"""
-    start_date = budget['start_date']
-    end_date = budget['end_date']
-    
-    if isinstance(start_date, str):
-        start_date = datetime.fromisoformat(start_date)
-    if isinstance(end_date, str):
-        end_date = datetime.fromisoformat(end_date)
-    
-    transactions = list(mongo.db.transactions.find({
-        'date': {'$gte': start_date, '$lte': end_date},
-        'category_id': budget['category_id']
-    }).sort('date', -1))
-    
-    for t in transactions:
-        t['id'] = str(t['_id'])
-        del t['_id']
-    
-    return transactions
\ No newline at end of file
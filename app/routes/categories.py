@@ -4,7 +4,7 @@ Category management routes
 Version: 1.0.0
 """
 from flask import Blueprint, render_template, request, jsonify
-from app.models import Category, Transaction, Budget, Log
+from app.models import Category, Transaction, Budget, Log, DailyRollup
 from datetime import datetime
 from bson import ObjectId
 from app import mongo
@@ -21,32 +21,14 @@ def get_categories_data():
     """Get categories data for DataTable"""
     try:
         categories = list(mongo.db.categories.find({'is_deleted': False}).sort('name', 1))
+        usage = Category.get_usage_stats()
         
         for category in categories:
             category['id'] = str(category['_id'])
             del category['_id']
             
             # Get usage statistics
-            transaction_count = mongo.db.transactions.count_documents({
-                'category_id': category['id']
-            })
-            category['transaction_count'] = transaction_count
-            
-            budget_count = mongo.db.budgets.count_documents({
-                'category_id': category['id'],
-                'is_active': True
-            })
-            category['budget_count'] = budget_count
-            
-            # Get total spent/earned
-            if category['type'] in ['expense', 'liability']:
-                total = list(mongo.db.transactions.aggregate([
-                    {'$match': {'category_id': category['id']}},
-                    {'$group': {'_id': None, 'total': {'$sum': '$amount'}}}
-                ]))
-                category['total_amount'] = total[0]['total'] if total else 0
-            else:
-                category['total_amount'] = 0
+            category.update(category_usage(category['id'], category['type'], usage))
         
         return jsonify({
             'success': True,
@@ -193,6 +175,7 @@ def category_detail(category_id):
                             'updated_at': datetime.now()
                         }}
                     )
+                    DailyRollup.reassign_category(category_id, default_id)
                     
                     # Update all budgets
                     mongo.db.budgets.update_many(
@@ -211,6 +194,8 @@ def category_detail(category_id):
                     'updated_at': datetime.now()
                 }}
             )
+            Category.invalidate_cache()
+            Category.invalidate_usage_stats()
             
             if result.modified_count > 0:
                 return jsonify({
@@ -250,39 +235,20 @@ def get_categories_by_type(category_type):
             'is_deleted': False
         }).sort('name', 1))
         
+        usage = Category.get_usage_stats()
+        
         result = []
         for cat in categories:
-            # Get transaction count
-            transaction_count = mongo.db.transactions.count_documents({
-                'category_id': str(cat['_id'])
-            })
-            
-            # Get budget count
-            budget_count = mongo.db.budgets.count_documents({
-                'category_id': str(cat['_id']),
-                'is_active': True
-            })
-            
-            # Get total amount
-            total_amount = 0
-            if category_type in ['expense', 'liability']:
-                pipeline = [
-                    {'$match': {'category_id': str(cat['_id'])}},
-                    {'$group': {'_id': None, 'total': {'$sum': '$amount'}}}
-                ]
-                total_result = list(mongo.db.transactions.aggregate(pipeline))
-                if total_result:
-                    total_amount = float(total_result[0]['total'])
-            
+            stats = category_usage(str(cat['_id']), category_type, usage)
             result.append({
                 'id': str(cat['_id']),
                 'name': cat['name'],
                 'type': cat['type'],
                 'description': cat.get('description', ''),
                 'is_default': cat.get('is_default', False),
-                'transaction_count': transaction_count,
-                'budget_count': budget_count,
-                'total_amount': total_amount
+                'transaction_count': stats['transaction_count'],
+                'budget_count': stats['budget_count'],
+                'total_amount': float(stats['total_amount'])
             })
         
         return jsonify({
@@ -292,6 +258,16 @@ def get_categories_by_type(category_type):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+def category_usage(category_id, category_type, usage):
+    """Counts and total for one category from Category.get_usage_stats()"""
+    stats = usage.get(category_id, {})
+    return {
+        'transaction_count': stats.get('transaction_count', 0),
+        'budget_count': stats.get('budget_count', 0),
+        # Totals are only reported for spending categories
+        'total_amount': stats.get('total_amount', 0) if category_type in ['expense', 'liability'] else 0
+    }
+
 def get_category_statistics(category_id):
     """Get detailed statistics for a category"""
     try:
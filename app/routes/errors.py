@@ -3,11 +3,10 @@
 Error handling and monitoring routes
 Version: 1.0.0
 """
-from flask import Blueprint, render_template, request, jsonify
-from app.models import Log
-from datetime import datetime, timedelta
+from flask import Blueprint, render_template, request, jsonify, current_app
+from app.models import Log, LogStats, SearchIndex
+from datetime import datetime
 from bson import ObjectId
-from app import mongo
 
 errors_bp = Blueprint('errors', __name__)
 
@@ -37,33 +36,21 @@ def get_errors():
                 '$lte': datetime.fromisoformat(request.args.get('end_date'))
             }
         
+        rank = None
         if request.args.get('search'):
-            filters['$or'] = [
-                {'message': {'$regex': request.args.get('search'), '$options': 'i'}},
-                {'details': {'$regex': request.args.get('search'), '$options': 'i'}}
-            ]
+            rank = SearchIndex.apply(filters, request.args.get('search'), Log,
+                                     request.args.get('search_mode', current_app.config.get('SEARCH_MODE', 'prefix')))
         
-        skip = (page - 1) * per_page
-        
-        errors = list(mongo.db.logs.find(filters)
-                     .sort('timestamp', -1)
-                     .skip(skip)
-                     .limit(per_page))
-        
-        total = mongo.db.logs.count_documents(filters)
-        
-        for error in errors:
-            error['id'] = str(error['_id'])
-            del error['_id']
+        result = Log.get_all(filters, page, per_page, rank=rank)
         
         return jsonify({
             'success': True,
-            'data': errors,
+            'data': result['items'],
             'pagination': {
                 'page': page,
                 'per_page': per_page,
-                'total': total,
-                'pages': (total + per_page - 1) // per_page
+                'total': result['total'],
+                'pages': result['pages']
             }
         })
     except Exception as e:
@@ -73,71 +60,39 @@ def get_errors():
 def get_error_summary():
     """Get error summary statistics"""
     try:
-        now = datetime.now()
-        today_start = datetime(now.year, now.month, now.day)
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
-        
-        # Total errors
-        total_errors = mongo.db.logs.count_documents({'level': 'ERROR'})
-        
-        # Errors by category
-        by_category = list(mongo.db.logs.aggregate([
-            {'$match': {'level': 'ERROR'}},
-            {'$group': {'_id': '$category', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}},
-            {'$limit': 10}
-        ]))
-        
-        # Errors over time
-        by_day = list(mongo.db.logs.aggregate([
+        # Counters and the frequent-message sketch are maintained as logs are written
+        stats = LogStats.summary()
+        
+        by_category = [
+            {'_id': category, 'count': count}
+            for category, count in sorted(
+                stats['error_categories'].items(), key=lambda item: item[1], reverse=True
+            )[:10]
+        ]
+        
+        by_day = [
+            {'_id': {'year': day.year, 'month': day.month, 'day': day.day}, 'count': count}
+            for day, count in stats['errors_by_day']
+        ]
+        
+        # Space-saving counts are upper bounds (over by at most `error`)
+        frequent = [
             {
-                '$match': {
-                    'level': 'ERROR',
-                    'timestamp': {'$gte': month_ago}
-                }
-            },
-            {
-                '$group': {
-                    '_id': {
-                        'year': {'$year': '$timestamp'},
-                        'month': {'$month': '$timestamp'},
-                        'day': {'$dayOfMonth': '$timestamp'}
-                    },
-                    'count': {'$sum': 1}
-                }
-            },
-            {'$sort': {'_id.year': 1, '_id.month': 1, '_id.day': 1}}
-        ]))
-        
-        # Most frequent errors
-        frequent = list(mongo.db.logs.aggregate([
-            {'$match': {'level': 'ERROR'}},
-            {'$group': {
-                '_id': '$message',
-                'count': {'$sum': 1},
-                'last_occurrence': {'$max': '$timestamp'}
-            }},
-            {'$sort': {'count': -1}},
-            {'$limit': 10}
-        ]))
+                '_id': item['message'],
+                'count': item['count'],
+                'error': item['error'],
+                'last_occurrence': item['last_occurrence']
+            }
+            for item in stats['frequent_errors'][:10]
+        ]
         
         return jsonify({
             'success': True,
             'data': {
-                'total_errors': total_errors,
-                'errors_today': mongo.db.logs.count_documents({
-                    'level': 'ERROR',
-                    'timestamp': {'$gte': today_start}
-                }),
-                'errors_week': mongo.db.logs.count_documents({
-                    'level': 'ERROR',
-                    'timestamp': {'$gte': week_ago}
-                }),
-                'errors_month': mongo.db.logs.count_documents({
-                    'level': 'ERROR',
-                    'timestamp': {'$gte': month_ago}
-                }),
+                'total_errors': stats['levels'].get('ERROR', 0),
+                'errors_today': stats['errors_today'],
+                'errors_week': stats['errors_week'],
+                'errors_month': stats['errors_month'],
                 'by_category': by_category,
                 'by_day': by_day,
                 'frequent_errors': frequent
@@ -150,7 +105,7 @@ def get_error_summary():
 def get_error_detail(error_id):
     """Get detailed error information"""
     try:
-        error = mongo.db.logs.find_one({'_id': ObjectId(error_id)})
+        error = Log.find_one({'_id': ObjectId(error_id)})
         
         if not error:
             return jsonify({'success': False, 'error': 'Error not found'}), 404
@@ -159,11 +114,11 @@ def get_error_detail(error_id):
         del error['_id']
         
         # Find similar errors
-        similar = list(mongo.db.logs.find({
+        similar = Log.find_sorted({
             '_id': {'$ne': ObjectId(error_id)},
             'message': error['message'],
             'level': 'ERROR'
-        }).sort('timestamp', -1).limit(5))
+        }, [('timestamp', -1)], limit=5)
         
         for e in similar:
             e['id'] = str(e['_id'])
@@ -207,7 +162,7 @@ def resolve_error(error_id):
 def get_error_categories():
     """Get error categories"""
     try:
-        categories = list(mongo.db.logs.distinct('category', {'level': 'ERROR'}))
+        categories = list(Log.distinct('category', {'level': 'ERROR'}))
         return jsonify({
             'success': True,
             'data': categories
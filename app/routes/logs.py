@@ -3,9 +3,8 @@
 Log viewing and management routes
 Version: 1.0.0
 """
-from flask import Blueprint, render_template, request, jsonify
-from app.models import Log
-from app import mongo
+from flask import Blueprint, render_template, request, jsonify, current_app
+from app.models import Log, LogStats, SearchIndex
 from datetime import datetime, timedelta
 
 logs_bp = Blueprint('logs', __name__)
@@ -31,11 +30,10 @@ def get_logs_data():
         if request.args.get('category'):
             filters['category'] = request.args.get('category')
         
+        rank = None
         if request.args.get('search'):
-            filters['$or'] = [
-                {'message': {'$regex': request.args.get('search'), '$options': 'i'}},
-                {'details': {'$regex': request.args.get('search'), '$options': 'i'}}
-            ]
+            rank = SearchIndex.apply(filters, request.args.get('search'), Log,
+                                     request.args.get('search_mode', current_app.config.get('SEARCH_MODE', 'prefix')))
         
         if request.args.get('start_date') and request.args.get('end_date'):
             try:
@@ -46,33 +44,28 @@ def get_logs_data():
             except:
                 pass
         
-        # Get total count
-        total = mongo.db.logs.count_documents(filters)
+        # Opt-in keyset pagination: ?after= for the first page, then next_cursor
+        result = Log.get_all(filters, page, per_page, after=request.args.get('after'), rank=rank)
         
-        # Get paginated results
-        skip = (page - 1) * per_page
-        logs = list(mongo.db.logs.find(filters)
-                   .sort('timestamp', -1)
-                   .skip(skip)
-                   .limit(per_page))
-        
-        # Convert ObjectId to string and ensure timestamp is string
-        for log in logs:
-            log['id'] = str(log['_id'])
-            del log['_id']
+        # Ensure timestamp is string
+        for log in result['items']:
             # Ensure timestamp is ISO format string
-            if isinstance(log['timestamp'], datetime):
+            if isinstance(log.get('timestamp'), datetime):
                 log['timestamp'] = log['timestamp'].isoformat()
         
+        pagination = {
+            'page': result['page'],
+            'per_page': result['per_page'],
+            'total': result['total'],
+            'pages': result['pages']
+        }
+        if 'next_cursor' in result:
+            pagination['next_cursor'] = result['next_cursor']
+        
         return jsonify({
             'success': True,
-            'data': logs,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'pages': (total + per_page - 1) // per_page
-            }
+            'data': result['items'],
+            'pagination': pagination
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
@@ -92,7 +85,7 @@ def get_log_levels():
             {'$sort': {'count': -1}}
         ]
         
-        levels = list(mongo.db.logs.aggregate(pipeline))
+        levels = list(Log.aggregate(pipeline))
         
         return jsonify({
             'success': True,
@@ -115,7 +108,7 @@ def get_log_categories():
             {'$sort': {'count': -1}}
         ]
         
-        categories = list(mongo.db.logs.aggregate(pipeline))
+        categories = list(Log.aggregate(pipeline))
         
         return jsonify({
             'success': True,
@@ -128,38 +121,19 @@ def get_log_categories():
 def get_log_summary():
     """Get log summary statistics"""
     try:
-        now = datetime.now()
-        today_start = datetime(now.year, now.month, now.day)
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
+        # Counters are maintained as logs are written (LogStats)
+        stats = LogStats.summary()
+        top_categories = sorted(stats['categories'].items(), key=lambda item: item[1], reverse=True)[:10]
         
         summary = {
-            'total': mongo.db.logs.count_documents({}),
-            'today': mongo.db.logs.count_documents({'timestamp': {'$gte': today_start}}),
-            'this_week': mongo.db.logs.count_documents({'timestamp': {'$gte': week_ago}}),
-            'this_month': mongo.db.logs.count_documents({'timestamp': {'$gte': month_ago}}),
-            'by_level': {},
-            'by_category': {}
+            'total': stats['total'],
+            'today': stats['today'],
+            'this_week': stats['this_week'],
+            'this_month': stats['this_month'],
+            'by_level': stats['levels'],
+            'by_category': dict(top_categories)
         }
         
-        # Get counts by level
-        levels = mongo.db.logs.aggregate([
-            {'$group': {'_id': '$level', 'count': {'$sum': 1}}}
-        ])
-        
-        for level in levels:
-            summary['by_level'][level['_id']] = level['count']
-        
-        # Get top 10 categories
-        categories = mongo.db.logs.aggregate([
-            {'$group': {'_id': '$category', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}},
-            {'$limit': 10}
-        ])
-        
-        for category in categories:
-            summary['by_category'][category['_id']] = category['count']
-        
         return jsonify({
             'success': True,
             'data': summary
@@ -176,14 +150,15 @@ def clear_logs():
         
         cutoff_date = datetime.now() - timedelta(days=days)
         
-        result = mongo.db.logs.delete_many({
-            'timestamp': {'$lt': cutoff_date}
-        })
+        # Partitioned storage drops whole months instead of deleting documents
+        deleted_count = Log.delete_before(cutoff_date)
+        if deleted_count:
+            LogStats.rebuild()
         
         return jsonify({
             'success': True,
-            'message': f'Cleared {result.deleted_count} logs older than {days} days',
-            'deleted_count': result.deleted_count
+            'message': f'Cleared {deleted_count} logs older than {days} days',
+            'deleted_count': deleted_count
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
\ No newline at end of file
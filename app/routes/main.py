@@ -4,11 +4,10 @@ Main routes for Expense Tracker System
 Version: 1.1.0
 """
 from flask import Blueprint, render_template, jsonify, request
-from app import mongo
 from datetime import datetime, timedelta
-from app.models import Transaction, Account, Budget, Category, Log
-from bson import ObjectId
+from app.models import Account, Budget, Category, Log
 from app.utils.helpers import get_current_utc_time, utc_to_local, parse_date_from_request
+from app.utils.dashboard import DashboardEngine
 import pytz
 
 main_bp = Blueprint('main', __name__)
@@ -35,55 +34,32 @@ def dashboard_data():
             end_date = get_current_utc_time()
             start_date = end_date - timedelta(days=30)
         
-        # Transaction summary - with proper type conversion
-        transactions = list(mongo.db.transactions.find({
-            'date': {'$gte': start_date, '$lte': end_date}
-        }))
+        # One $facet aggregation for summary, trend, breakdown and recent items
+        dashboard = DashboardEngine.build(start_date, end_date)
         
-        total_income = 0.0
-        total_expense = 0.0
-        
-        for t in transactions:
-            amount = float(t.get('amount', 0))
-            if t.get('type') == 'income':
-                total_income += amount
-            elif t.get('type') == 'expense':
-                total_expense += amount
-        
-        # Account balances - ensure all are floats
-        accounts = list(mongo.db.accounts.find({'is_active': True}))
-        total_balance = 0.0
-        for a in accounts:
-            total_balance += float(a.get('balance', 0))
-        
-        # Budget summary - ensure all are floats
-        budgets = list(mongo.db.budgets.find({'is_active': True}))
-        total_budget = 0.0
-        total_spent = 0.0
-        for b in budgets:
-            total_budget += float(b.get('amount', 0))
-            total_spent += float(b.get('spent', 0))
-        
-        # Recent transactions
-        recent_transactions = Transaction.get_all(page=1, per_page=5)
+        total_income = dashboard['total_income']
+        total_expense = dashboard['total_expense']
+        total_balance = dashboard['total_balance']
+        total_budget = dashboard['total_budget']
+        total_spent = dashboard['total_spent']
         
         # Ensure recent transactions have proper data types and convert dates
-        if recent_transactions and 'items' in recent_transactions:
-            for tx in recent_transactions['items']:
-                if 'amount' in tx:
-                    tx['amount'] = float(tx['amount'])
-                # Convert date to ISO string for frontend (will be formatted by JS)
-                if 'date' in tx and isinstance(tx['date'], datetime):
-                    tx['date'] = tx['date'].isoformat()
+        recent_transactions = dashboard['recent_transactions']
+        for tx in recent_transactions:
+            if 'amount' in tx:
+                tx['amount'] = float(tx['amount'])
+            # Convert date to ISO string for frontend (will be formatted by JS)
+            if 'date' in tx and isinstance(tx['date'], datetime):
+                tx['date'] = tx['date'].isoformat()
         
         # Monthly trend
-        monthly_data = get_monthly_trend()
+        monthly_data = format_monthly_data(dashboard['monthly_trend'])
         
         # Category breakdown
-        category_breakdown = get_category_breakdown(start_date, end_date)
+        category_breakdown = dashboard['category_breakdown']
         
         # Account distribution
-        account_distribution = get_account_distribution(accounts)
+        account_distribution = get_account_distribution(dashboard['accounts'])
         
         return jsonify({
             'success': True,
@@ -96,7 +72,7 @@ def dashboard_data():
                     'total_spent': float(total_spent),
                     'remaining_budget': float(total_budget - total_spent)
                 },
-                'recent_transactions': recent_transactions['items'] if recent_transactions else [],
+                'recent_transactions': recent_transactions,
                 'monthly_trend': monthly_data,
                 'category_breakdown': category_breakdown,
                 'account_distribution': account_distribution
@@ -106,83 +82,6 @@ def dashboard_data():
         print(f"Dashboard error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def get_monthly_trend():
-    """Get monthly income/expense trend"""
-    try:
-        # Get last 12 months in UTC
-        end_date = get_current_utc_time()
-        start_date = end_date - timedelta(days=365)
-        
-        pipeline = [
-            {
-                '$match': {
-                    'date': {'$gte': start_date, '$lte': end_date}
-                }
-            },
-            {
-                '$group': {
-                    '_id': {
-                        'year': {'$year': '$date'},
-                        'month': {'$month': '$date'},
-                        'type': '$type'
-                    },
-                    'total': {'$sum': '$amount'}
-                }
-            },
-            {
-                '$sort': {'_id.year': 1, '_id.month': 1}
-            }
-        ]
-        
-        result = list(mongo.db.transactions.aggregate(pipeline))
-        return format_monthly_data(result)
-    except Exception as e:
-        print(f"Error in get_monthly_trend: {e}")
-        return []
-
-def get_category_breakdown(start_date, end_date):
-    """Get expense breakdown by category"""
-    try:
-        pipeline = [
-            {
-                '$match': {
-                    'date': {'$gte': start_date, '$lte': end_date},
-                    'type': 'expense'
-                }
-            },
-            {
-                '$group': {
-                    '_id': '$category_id',
-                    'total': {'$sum': '$amount'}
-                }
-            },
-            {
-                '$sort': {'total': -1}
-            },
-            {
-                '$limit': 10
-            }
-        ]
-        
-        result = list(mongo.db.transactions.aggregate(pipeline))
-        breakdown = []
-        
-        for item in result:
-            try:
-                category = mongo.db.categories.find_one({'_id': ObjectId(item['_id'])})
-                breakdown.append({
-                    'category': category['name'] if category else 'Unknown',
-                    'amount': float(item['total'])
-                })
-            except Exception as e:
-                print(f"Error processing category item: {e}")
-                continue
-        
-        return breakdown
-    except Exception as e:
-        print(f"Error in get_category_breakdown: {e}")
-        return []
-
 def get_account_distribution(accounts):
     """Get account balance distribution"""
     try:
@@ -20,34 +20,34 @@ def index():
 def get_settings():
     """Get all settings"""
     try:
-        settings = {}
-        
-        # Application settings
-        settings['app_name'] = Settings.get('app_name', 'Expense Tracker System')
-        settings['app_version'] = Settings.get('app_version', '1.0.0')
-        settings['company_name'] = Settings.get('company_name', 'ExpenseTracker')
-        settings['company_year'] = Settings.get('company_year', '2026')
-        
-        # User preferences
-        settings['currency'] = Settings.get('currency', 'USD')
-        settings['date_format'] = Settings.get('date_format', 'YYYY-MM-DD')
-        settings['time_format'] = Settings.get('time_format', '24h')
-        settings['theme'] = Settings.get('theme', 'light')
-        settings['items_per_page'] = Settings.get('items_per_page', 20)
-        settings['notifications_enabled'] = Settings.get('notifications_enabled', True)
-        
-        # NEW: Timezone and regional settings
-        settings['timezone'] = Settings.get('timezone', 'local')
-        settings['week_start'] = Settings.get('week_start', 'monday')
-        settings['number_format'] = Settings.get('number_format', '1,234.56')
-        settings['first_day'] = Settings.get('first_day', '1')  # 0=Sunday, 1=Monday, 6=Saturday
-        
-        # Export settings
-        settings['export_format'] = Settings.get('export_format', 'csv')
-        
-        # Default categories
-        settings['default_income_category'] = Settings.get('default_income_category', 'uncategorized_income')
-        settings['default_expense_category'] = Settings.get('default_expense_category', 'uncategorized_expense')
+        settings = Settings.get_many({
+            # Application settings
+            'app_name': 'Expense Tracker System',
+            'app_version': '1.0.0',
+            'company_name': 'ExpenseTracker',
+            'company_year': '2026',
+            
+            # User preferences
+            'currency': 'USD',
+            'date_format': 'YYYY-MM-DD',
+            'time_format': '24h',
+            'theme': 'light',
+            'items_per_page': 20,
+            'notifications_enabled': True,
+            
+            # NEW: Timezone and regional settings
+            'timezone': 'local',
+            'week_start': 'monday',
+            'number_format': '1,234.56',
+            'first_day': '1',  # 0=Sunday, 1=Monday, 6=Saturday
+            
+            # Export settings
+            'export_format': 'csv',
+            
+            # Default categories
+            'default_income_category': 'uncategorized_income',
+            'default_expense_category': 'uncategorized_expense'
+        })
         
         return jsonify({
             'success': True,
@@ -179,6 +179,6 @@ def count_todays_transactions():
 def count_todays_logs():
     """Count logs created today"""
     today_start = datetime(datetime.now().year, datetime.now().month, datetime.now().day)
-    return mongo.db.logs.count_documents({
+    return Log.count({
         'timestamp': {'$gte': today_start}
     })
\ No newline at end of file
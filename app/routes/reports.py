@@ -6,6 +6,7 @@ Version: 1.1.0
 from flask import Blueprint, request, jsonify
 from app import mongo
 from app.utils.reports import ReportGenerator
+from app.models import DailyRollup
 from datetime import datetime, timedelta
 from bson import ObjectId
 import calendar
@@ -25,16 +26,29 @@ def get_financial_summary():
         # Income vs Expense (current month in UTC)
         now = get_current_utc_time()
         start_of_month = datetime(now.year, now.month, 1, tzinfo=now.tzinfo)
-        
-        income = sum(t['amount'] for t in mongo.db.transactions.find({
-            'date': {'$gte': start_of_month},
-            'type': 'income'
-        }))
-        
-        expense = sum(t['amount'] for t in mongo.db.transactions.find({
-            'date': {'$gte': start_of_month},
-            'type': 'expense'
-        }))
+        end_of_month = start_of_month.replace(day=calendar.monthrange(now.year, now.month)[1]) \
+            + timedelta(days=1, microseconds=-1)
+        
+        if DailyRollup.covers(start_of_month, end_of_month):
+            totals = {
+                row['_id']: row['total']
+                for row in DailyRollup.summarize(
+                    start_of_month, end_of_month, '$type',
+                    match={'type': {'$in': ['income', 'expense']}}
+                )
+            }
+            income = totals.get('income', 0)
+            expense = totals.get('expense', 0)
+        else:
+            income = sum(t['amount'] for t in mongo.db.transactions.find({
+                'date': {'$gte': start_of_month, '$lte': end_of_month},
+                'type': 'income'
+            }))
+            
+            expense = sum(t['amount'] for t in mongo.db.transactions.find({
+                'date': {'$gte': start_of_month, '$lte': end_of_month},
+                'type': 'expense'
+            }))
         
         # Budget summary
         budgets = list(mongo.db.budgets.find({'is_active': True}))
@@ -72,25 +86,14 @@ def get_monthly_report():
             end_date = datetime(year, month + 1, 1, tzinfo=pytz.UTC) - timedelta(microseconds=1)
         
         # Get daily breakdown
-        pipeline = [
-            {
-                '$match': {
-                    'date': {'$gte': start_date, '$lte': end_date}
-                }
-            },
-            {
-                '$group': {
-                    '_id': {
-                        'day': {'$dayOfMonth': '$date'},
-                        'type': '$type'
-                    },
-                    'total': {'$sum': '$amount'}
-                }
-            },
-            {'$sort': {'_id.day': 1}}
-        ]
-        
-        results = list(mongo.db.transactions.aggregate(pipeline))
+        if DailyRollup.covers(start_date, end_date):
+            results = DailyRollup.summarize(
+                start_date, end_date,
+                {'day': {'$dayOfMonth': '$day'}, 'type': '$type'}
+            )
+            results.sort(key=lambda r: r['_id']['day'])
+        else:
+            results = get_monthly_breakdown(start_date, end_date)
         
         # Format for response
         daily_data = {}
@@ -125,7 +128,29 @@ def get_monthly_report():
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
-        
+
+def get_monthly_breakdown(start_date, end_date):
+    """Daily income/expense totals for a month straight from transactions"""
+    pipeline = [
+        {
+            '$match': {
+                'date': {'$gte': start_date, '$lte': end_date}
+            }
+        },
+        {
+            '$group': {
+                '_id': {
+                    'day': {'$dayOfMonth': '$date'},
+                    'type': '$type'
+                },
+                'total': {'$sum': '$amount'}
+            }
+        },
+        {'$sort': {'_id.day': 1}}
+    ]
+    
+    return list(mongo.db.transactions.aggregate(pipeline))
+
 @reports_bp.route('/categories')
 def get_category_report():
     """Get category spending analysis"""
@@ -3,12 +3,12 @@
 Transaction management routes
 Version: 1.1.0
 """
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
-from app.models import Transaction, Account, Category, Log
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, current_app
+from app.models import Transaction, SearchIndex
 from datetime import datetime
 from bson import ObjectId
-from app import mongo
-from app.utils.helpers import local_to_utc, parse_date_from_request, get_current_utc_time
+from app.utils.helpers import local_to_utc, parse_date_from_request, get_current_utc_time, enrich_references, clean_amount
+from app.utils import ledger
 import pytz
 
 transactions_bp = Blueprint('transactions', __name__)
@@ -53,30 +53,20 @@ def get_transactions_data():
                     '$lte': utc_end
                 }
         
+        # Prefix index search ranked by relevance; regex patterns keep the $regex path
+        rank = None
         if request.args.get('search'):
-            filters['description'] = {
-                '$regex': request.args.get('search'),
-                '$options': 'i'
-            }
+            rank = SearchIndex.apply(filters, request.args.get('search'), Transaction,
+                                     request.args.get('search_mode', current_app.config.get('SEARCH_MODE', 'prefix')))
         
-        result = Transaction.get_all(filters, page, per_page)
+        # Opt-in keyset pagination: ?after= for the first page, then next_cursor
+        result = Transaction.get_all(filters, page, per_page, after=request.args.get('after'), rank=rank)
         
-        # Enhance with related data and format dates
+        # Enhance with related data (one query per referenced collection)
+        enrich_references(result['items'])
+
+        # Format dates
         for transaction in result['items']:
-            # Add category name
-            if transaction.get('category_id'):
-                category = Category.get_by_id(transaction['category_id'])
-                transaction['category_name'] = category['name'] if category else 'Unknown'
-            
-            # Add account names
-            if transaction.get('from_account_id'):
-                account = Account.get_by_id(transaction['from_account_id'])
-                transaction['from_account_name'] = account['name'] if account else 'Unknown'
-            
-            if transaction.get('to_account_id'):
-                account = Account.get_by_id(transaction['to_account_id'])
-                transaction['to_account_name'] = account['name'] if account else 'Unknown'
-            
             # Convert datetime to ISO string for frontend
             if 'date' in transaction and isinstance(transaction['date'], datetime):
                 transaction['date'] = transaction['date'].isoformat()
@@ -85,15 +75,19 @@ def get_transactions_data():
             if 'updated_at' in transaction and isinstance(transaction['updated_at'], datetime):
                 transaction['updated_at'] = transaction['updated_at'].isoformat()
         
+        pagination = {
+            'page': result['page'],
+            'per_page': result['per_page'],
+            'total': result['total'],
+            'pages': result['pages']
+        }
+        if 'next_cursor' in result:
+            pagination['next_cursor'] = result['next_cursor']
+        
         return jsonify({
             'success': True,
             'data': result['items'],
-            'pagination': {
-                'page': result['page'],
-                'per_page': result['per_page'],
-                'total': result['total'],
-                'pages': result['pages']
-            }
+            'pagination': pagination
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
@@ -110,13 +104,8 @@ def create_transaction():
         
         # CRITICAL FIX: Convert amount to float (it comes as string from form)
         try:
-            # Handle if amount is string or number
-            if isinstance(data['amount'], str):
-                # Remove any commas or currency symbols
-                amount_str = data['amount'].replace(',', '').replace('$', '').replace('€', '').replace('£', '').strip()
-                data['amount'] = float(amount_str)
-            else:
-                data['amount'] = float(data['amount'])
+            # Handle if amount is string or number (commas/currency symbols stripped)
+            data['amount'] = clean_amount(data['amount'])
         except (ValueError, TypeError) as e:
             return jsonify({'success': False, 'error': f'Invalid amount format: {data["amount"]}'}), 400
         
@@ -163,40 +152,12 @@ def create_transaction():
         if data.get('to_account_id') and not isinstance(data['to_account_id'], str):
             data['to_account_id'] = str(data['to_account_id'])
         
-        # Create transaction
-        transaction_id = Transaction.create(data)
-        
-        # Update account balances
-        if data['type'] == 'income' and data.get('to_account_id'):
-            account = Account.get_by_id(data['to_account_id'])
-            if account:
-                new_balance = float(account['balance']) + float(data['amount'])
-                Account.update(data['to_account_id'], {'balance': new_balance})
-        
-        elif data['type'] == 'expense' and data.get('from_account_id'):
-            account = Account.get_by_id(data['from_account_id'])
-            if account:
-                new_balance = float(account['balance']) - float(data['amount'])
-                Account.update(data['from_account_id'], {'balance': new_balance})
-        
-        elif data['type'] == 'transfer':
-            if data.get('from_account_id') and data.get('to_account_id'):
-                from_account = Account.get_by_id(data['from_account_id'])
-                to_account = Account.get_by_id(data['to_account_id'])
-                
-                if from_account and to_account:
-                    Account.update(data['from_account_id'], 
-                                 {'balance': float(from_account['balance']) - float(data['amount'])})
-                    Account.update(data['to_account_id'], 
-                                 {'balance': float(to_account['balance']) + float(data['amount'])})
-        
-        # Log the action
-        Log.create({
+        # Create transaction, update balances ($inc) and log in one ledger write
+        transaction_id = ledger.create_transaction(data, log={
             'level': 'SUCCESS',
             'category': 'TRANSACTION',
             'message': f'Transaction created: {data["description"]}',
             'details': {
-                'transaction_id': transaction_id, 
                 'type': data['type'],
                 'amount': float(data['amount'])
             }
@@ -258,7 +219,7 @@ def transaction_detail(transaction_id):
                     # Remove date from update if parsing fails
                     del data['date']
             
-            if Transaction.update(transaction_id, data):
+            if ledger.update_transaction(transaction_id, data):
                 return jsonify({
                     'success': True,
                     'message': 'Transaction updated successfully'
@@ -269,7 +230,7 @@ def transaction_detail(transaction_id):
     
     elif request.method == 'DELETE':
         try:
-            if Transaction.delete(transaction_id):
+            if ledger.delete_transaction(transaction_id):
                 return jsonify({
                     'success': True,
                     'message': 'Transaction deleted successfully'
@@ -294,12 +255,12 @@ def bulk_delete():
         if not object_ids:
             return jsonify({'success': False, 'error': 'No valid transaction IDs'}), 400
         
-        result = mongo.db.transactions.delete_many({'_id': {'$in': object_ids}})
+        deleted_count = len(ledger.delete_transactions(object_ids))
         
         return jsonify({
             'success': True,
-            'message': f'{result.deleted_count} transactions deleted successfully',
-            'deleted_count': result.deleted_count
+            'message': f'{deleted_count} transactions deleted successfully',
+            'deleted_count': deleted_count
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
\ No newline at end of file
@@ -8,7 +8,6 @@ from app.models import Log, Settings
 from datetime import datetime
 import subprocess
 import sys
-from app import mongo
 
 # Replace pkg_resources with importlib.metadata
 try:
@@ -155,10 +154,10 @@ def perform_update():
 def get_update_history():
     """Get update history"""
     try:
-        history = list(mongo.db.logs.find({
+        history = Log.find_sorted({
             'category': 'UPDATE',
             'level': {'$in': ['SUCCESS', 'ERROR']}
-        }).sort('timestamp', -1).limit(50))
+        }, [('timestamp', -1)], limit=50)
         
         for entry in history:
             entry['id'] = str(entry['_id'])
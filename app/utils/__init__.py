@@ -9,6 +9,6 @@ __all__ = [
     'validate_email', 'validate_amount', 'validate_date',
     'validate_object_id', 'validate_account_type',
     'generate_id', 'get_date_range', 'format_timedelta',
-    'CSVExporter', 'JSONExporter', 'ExcelExporter', 'get_exporter',
+    'CSVExporter', 'JSONExporter', 'NDJSONExporter', 'ExcelExporter', 'get_exporter',
     'ReportGenerator'
 ]
\ No newline at end of file
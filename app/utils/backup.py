@@ -0,0 +1,390 @@
+# app/utils/backup.py
+"""
+Streaming database backup and restore
+Version: 1.0.0
+"""
+import gzip
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from bson import json_util
+from bson.json_util import CANONICAL_JSON_OPTIONS
+from pymongo import MongoClient, ReplaceOne
+from pymongo.errors import BulkWriteError
+from app import mongo
+from app.models import Log
+
+BACKUP_COLLECTIONS = ['transactions', 'accounts', 'categories', 'budgets', 'logs', 'settings']
+BACKUP_FORMAT_VERSION = 3
+MANIFEST_NAME = 'manifest.json'
+CHECKPOINT_NAME = '.restore_checkpoint.json'
+CHAIN_CHECKPOINT_NAME = '.restore_chain.json'
+RESTORE_BATCH_SIZE = 1000
+PROGRESS_EVERY = 10000
+SHARD_MIN_DOCUMENTS = 100000  # smaller collections are dumped as a single file
+
+# Fields that move when a document is written, and slack for clock skew between app servers
+CHANGE_FIELDS = ('updated_at', 'created_at', 'timestamp')
+INCREMENTAL_OVERLAP = timedelta(minutes=5)
+
+def write_json(path, data):
+    """Write a small JSON file atomically (write to a temp file, then rename)"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def dump_collection(db, name, path, query=None, progress=None):
+    """Stream a collection into gzip'd NDJSON (canonical Extended JSON); returns the count"""
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for doc in db[name].find(query or {}).sort('_id', 1):
+            f.write(json_util.dumps(doc, json_options=CANONICAL_JSON_OPTIONS))
+            f.write('\n')
+            count += 1
+            if progress and count % PROGRESS_EVERY == 0:
+                progress(name, count)
+    return count
+
+def file_checksum(path):
+    """sha256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def shard_queries(db, name, shards, base_query=None):
+    """Split a collection into `shards` contiguous _id ranges (one $bucketAuto pass)"""
+    if shards <= 1:
+        return [base_query]
+    buckets = list(db[name].aggregate([
+        {'$match': base_query or {}},
+        {'$bucketAuto': {'groupBy': '$_id', 'buckets': shards}}
+    ]))
+    bounds = [b['_id']['min'] for b in buckets]
+    queries = []
+    for i, lower in enumerate(bounds):
+        query = {'_id': {'$gte': lower}}
+        if i + 1 < len(bounds):
+            query['_id']['$lt'] = bounds[i + 1]
+        queries.append({'$and': [base_query, query]} if base_query else query)
+    return queries or [base_query]
+
+def dump_shard(db, name, path, query=None):
+    """Dump one shard and return its manifest entry"""
+    count = dump_collection(db, name, path, query=query)
+    return {'file': os.path.basename(path), 'count': count, 'sha256': file_checksum(path)}
+
+def run_with_client(mongo_uri, func, *args):
+    """Process-pool entry point: run func against a MongoClient owned by this worker"""
+    client = MongoClient(mongo_uri)
+    try:
+        return func(client.get_default_database(), *args)
+    finally:
+        client.close()
+
+def plan_shards(db, collections, jobs, queries=None):
+    """(collection, query, file name) for every shard of a backup"""
+    queries = queries or {}
+    plan = []
+    for name in collections:
+        if name in queries:
+            count = db[name].count_documents(queries[name])
+        else:
+            count = db[name].estimated_document_count()
+        shards = min(jobs, max(1, count // SHARD_MIN_DOCUMENTS)) if jobs > 1 else 1
+        for index, query in enumerate(shard_queries(db, name, shards, queries.get(name))):
+            suffix = f'.{index:03d}' if shards > 1 else ''
+            plan.append((name, query, f'{name}{suffix}.ndjson.gz'))
+    return plan
+
+def backup_watermark():
+    """Start time of a backup, comparable with both timestamp conventions in use.
+
+    Transactions store UTC while the other models store local time, so the
+    earlier of the two is taken: anything written after it is picked up by
+    the next incremental (at worst a few documents are exported twice).
+    """
+    return min(datetime.now(), datetime.utcnow())
+
+def changed_query(since):
+    """Documents written at or after `since`"""
+    return {'$or': [{field: {'$gte': since}} for field in CHANGE_FIELDS]}
+
+def create_backup(backup_root='backups', collections=None, progress=None, jobs=1, mongo_uri=None, since=None):
+    """Write NDJSON shard files plus a manifest with per-shard checksums.
+
+    With jobs > 1, collections of at least SHARD_MIN_DOCUMENTS are split
+    into _id ranges and dumped by a process pool, one MongoClient per worker.
+    With `since` (a previous backup directory or its manifest) only
+    documents written after that backup started are exported, plus the
+    tombstones of documents deleted since. Returns (directory, manifest).
+    """
+    # Monthly log partitions are backed up as collections of their own
+    collections = [
+        storage_name
+        for name in (collections or BACKUP_COLLECTIONS)
+        for storage_name in (Log.storage_names() if name == 'logs' else [name])
+    ]
+    started_at = backup_watermark()
+    backup_dir = os.path.join(backup_root, f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(backup_dir)
+
+    manifest = {
+        'version': BACKUP_FORMAT_VERSION,
+        'format': 'ndjson.gz',
+        'type': 'full',
+        'created_at': datetime.now().isoformat(),
+        'started_at': started_at.isoformat()
+    }
+
+    queries = {}
+    if since:
+        base_dir = since if os.path.isdir(since) else os.path.dirname(since)
+        base_manifest = load_manifest(base_dir)
+        since_time = datetime.fromisoformat(
+            base_manifest.get('started_at', base_manifest['created_at'])
+        ) - INCREMENTAL_OVERLAP
+        queries = {name: changed_query(since_time) for name in collections}
+        queries['tombstones'] = {'deleted_at': {'$gte': since_time}}
+        collections.append('tombstones')
+        manifest.update({
+            'type': 'incremental',
+            'base': os.path.basename(os.path.normpath(base_dir)),
+            'since': since_time.isoformat()
+        })
+
+    manifest['collections'] = {name: {'count': 0, 'shards': []} for name in collections}
+
+    def record(name, shard):
+        entry = manifest['collections'][name]
+        entry['shards'].append(shard)
+        entry['count'] += shard['count']
+        if progress:
+            progress(f"{name} [{shard['file']}]", shard['count'], done=True)
+
+    plan = plan_shards(mongo.db, collections, jobs, queries)
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                pool.submit(run_with_client, mongo_uri, dump_shard, name, os.path.join(backup_dir, filename), query): name
+                for name, query, filename in plan
+            }
+            for future in as_completed(futures):
+                record(futures[future], future.result())
+    else:
+        for name, query, filename in plan:
+            record(name, dump_shard(mongo.db, name, os.path.join(backup_dir, filename), query))
+
+    for entry in manifest['collections'].values():
+        entry['shards'].sort(key=lambda shard: shard['file'])
+
+    # Written last: a manifest marks the backup as complete
+    write_json(os.path.join(backup_dir, MANIFEST_NAME), manifest)
+    return backup_dir, manifest
+
+def load_manifest(backup_dir):
+    """Read a backup's manifest (single-file v2 entries are read as one shard)"""
+    with open(os.path.join(backup_dir, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    for entry in manifest['collections'].values():
+        if 'shards' not in entry:
+            entry['shards'] = [{'file': entry['file'], 'count': entry['count']}]
+    return manifest
+
+def insert_batch(collection, batch):
+    """insert_many that tolerates documents already present from an interrupted run"""
+    try:
+        collection.insert_many(batch, ordered=False)
+    except BulkWriteError as e:
+        fatal = [err for err in e.details.get('writeErrors', []) if err.get('code') != 11000]
+        if fatal or e.details.get('writeConcernErrors'):
+            raise
+
+def upsert_batch(collection, batch):
+    """Replace documents by _id, inserting the ones that don't exist yet"""
+    collection.bulk_write(
+        [ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in batch],
+        ordered=False
+    )
+
+def restore_collection(db, name, path, skip=0, batch_size=RESTORE_BATCH_SIZE, on_batch=None, write=insert_batch):
+    """Stream documents from an NDJSON file into a collection, skipping `skip` lines"""
+    line_number = 0
+    batch = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line_number += 1
+            if line_number <= skip or not line.strip():
+                continue
+            batch.append(json_util.loads(line))
+            if len(batch) >= batch_size:
+                write(db[name], batch)
+                batch = []
+                if on_batch:
+                    on_batch(line_number)
+    if batch:
+        write(db[name], batch)
+    if on_batch:
+        on_batch(line_number)
+    return line_number
+
+def restore_shard(db, name, backup_dir, shard, batch_size=RESTORE_BATCH_SIZE):
+    """Verify and load one shard, keeping a per-shard progress file for resume"""
+    path = os.path.join(backup_dir, shard['file'])
+    if shard.get('sha256') and file_checksum(path) != shard['sha256']:
+        raise ValueError(f"Checksum mismatch for {shard['file']}")
+
+    progress_path = os.path.join(backup_dir, f".restore_{shard['file']}.json")
+    skip = 0
+    if os.path.exists(progress_path):
+        with open(progress_path) as f:
+            skip = json.load(f)['lines']
+
+    lines = restore_collection(
+        db, name, path, skip=skip, batch_size=batch_size,
+        on_batch=lambda lines: write_json(progress_path, {'lines': lines})
+    )
+    os.remove(progress_path)
+    return lines
+
+def restore_full(backup_dir, batch_size=RESTORE_BATCH_SIZE, progress=None, jobs=1, mongo_uri=None):
+    """Restore every collection in a full backup, resuming from the checkpoint if one exists.
+
+    Collections are dropped (with their indexes) before loading; callers
+    rebuild indexes once the data is in.
+    """
+    manifest = load_manifest(backup_dir)
+    checkpoint_path = os.path.join(backup_dir, CHECKPOINT_NAME)
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+    else:
+        checkpoint = {'started_at': datetime.now().isoformat(), 'prepared': [], 'done': []}
+
+    # First visit of a collection: replace its contents. Log partitions the
+    # backup doesn't have (months written since) are dropped too, so the
+    # restored logs aren't mixed with newer ones.
+    names = list(manifest['collections'])
+    if any(name == 'logs' or Log.PARTITION_PATTERN.match(name) for name in names):
+        names += [name for name in Log.storage_names() if name not in names]
+    for name in names:
+        if name not in checkpoint['prepared']:
+            mongo.db.drop_collection(name)
+            checkpoint['prepared'].append(name)
+            write_json(checkpoint_path, checkpoint)
+
+    pending = [
+        (name, shard)
+        for name, entry in manifest['collections'].items()
+        for shard in entry['shards']
+        if shard['file'] not in checkpoint['done']
+    ]
+
+    def record(name, shard, lines):
+        checkpoint['done'].append(shard['file'])
+        write_json(checkpoint_path, checkpoint)
+        if progress:
+            progress(f"{name} [{shard['file']}]", lines, done=True)
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                pool.submit(run_with_client, mongo_uri, restore_shard, name, backup_dir, shard, batch_size): (name, shard)
+                for name, shard in pending
+            }
+            for future in as_completed(futures):
+                record(*futures[future], future.result())
+    else:
+        for name, shard in pending:
+            record(name, shard, restore_shard(mongo.db, name, backup_dir, shard, batch_size))
+
+    os.remove(checkpoint_path)
+    return manifest
+
+def apply_incremental(backup_dir, batch_size=RESTORE_BATCH_SIZE, progress=None):
+    """Replay an incremental backup: upsert changed documents, then apply its tombstones.
+
+    Both steps are idempotent, so an interrupted replay is simply run again.
+    """
+    manifest = load_manifest(backup_dir)
+    for name, entry in manifest['collections'].items():
+        if name == 'tombstones':
+            continue
+        for shard in entry['shards']:
+            lines = restore_collection(
+                mongo.db, name, os.path.join(backup_dir, shard['file']),
+                batch_size=batch_size, write=upsert_batch
+            )
+            if progress:
+                progress(f"{name} [{shard['file']}]", lines, done=True)
+
+    deletes, ranges = {}, []
+    for shard in manifest['collections'].get('tombstones', {}).get('shards', []):
+        with gzip.open(os.path.join(backup_dir, shard['file']), 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    tombstone = json_util.loads(line)
+                    if 'doc_id' in tombstone:
+                        deletes.setdefault(tombstone['collection'], []).append(tombstone['doc_id'])
+                    else:
+                        ranges.append(tombstone)
+    # Log clears and partition drops
+    for tombstone in sorted(ranges, key=lambda t: t['deleted_at']):
+        if tombstone['before'] is None:
+            mongo.db.drop_collection(tombstone['collection'])
+        else:
+            Log.delete_before(tombstone['before'], record=False)
+        if progress:
+            progress(f"{tombstone['collection']} (cleared)", 0, done=True)
+    for name, doc_ids in deletes.items():
+        for start in range(0, len(doc_ids), batch_size):
+            mongo.db[name].delete_many({'_id': {'$in': doc_ids[start:start + batch_size]}})
+        if progress:
+            progress(f'{name} (deleted)', len(doc_ids), done=True)
+    return manifest
+
+def resolve_chain(backup_dir):
+    """Backup directories to replay for `backup_dir`: its full base first, then each incremental"""
+    chain = [backup_dir]
+    manifest = load_manifest(backup_dir)
+    while manifest.get('type') == 'incremental':
+        base_dir = os.path.join(os.path.dirname(os.path.normpath(chain[0])), manifest['base'])
+        if not os.path.exists(os.path.join(base_dir, MANIFEST_NAME)):
+            raise ValueError(f"Base backup {manifest['base']} of {os.path.basename(chain[0])} not found")
+        chain.insert(0, base_dir)
+        manifest = load_manifest(base_dir)
+    return chain
+
+def restore_backup(backup_dir, batch_size=RESTORE_BATCH_SIZE, progress=None, jobs=1, mongo_uri=None):
+    """Restore a full backup, or a full backup plus the chain of incrementals ending at `backup_dir`.
+
+    Returns the base manifest. Progress through the chain is checkpointed
+    in `backup_dir`, so a rerun skips backups already replayed.
+    """
+    chain = resolve_chain(backup_dir)
+    checkpoint_path = os.path.join(backup_dir, CHAIN_CHECKPOINT_NAME)
+    applied = []
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            applied = json.load(f)['applied']
+
+    base_manifest = load_manifest(chain[0])
+    for position, directory in enumerate(chain):
+        name = os.path.basename(os.path.normpath(directory))
+        if name in applied:
+            continue
+        if position == 0:
+            restore_full(directory, batch_size=batch_size, progress=progress, jobs=jobs, mongo_uri=mongo_uri)
+        else:
+            apply_incremental(directory, batch_size=batch_size, progress=progress)
+        applied.append(name)
+        if len(chain) > 1:
+            write_json(checkpoint_path, {'applied': applied})
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return base_manifest
@@ -0,0 +1,155 @@
+# app/utils/dashboard.py
+"""
+Dashboard aggregation engine
+Version: 1.0.0
+"""
+from datetime import timedelta
+from app import mongo
+from app.models import Transaction, Account, DailyRollup
+from app.utils.helpers import get_current_utc_time
+
+class DashboardEngine:
+    """Builds the dashboard payload with a constant number of queries"""
+
+    TREND_DAYS = 365
+    TOP_CATEGORIES = 10
+    RECENT_LIMIT = 5
+
+    @staticmethod
+    def build_pipeline(start_date, end_date, now, include_trend=True):
+        """Single $facet pipeline over transactions for all dashboard widgets"""
+        trend_start = now - timedelta(days=DashboardEngine.TREND_DAYS)
+        window = {'$gte': start_date, '$lte': end_date}
+
+        facets = {
+            'summary': [
+                {'$match': {'date': window}},
+                {'$group': {'_id': '$type', 'total': {'$sum': '$amount'}}}
+            ],
+            'monthly_trend': [
+                {'$match': {'date': {'$gte': trend_start, '$lte': now}}},
+                {
+                    '$group': {
+                        '_id': {
+                            'year': {'$year': '$date'},
+                            'month': {'$month': '$date'},
+                            'type': '$type'
+                        },
+                        'total': {'$sum': '$amount'}
+                    }
+                },
+                {'$sort': {'_id.year': 1, '_id.month': 1}}
+            ],
+            'category_breakdown': [
+                {'$match': {'date': window, 'type': 'expense'}},
+                {'$group': {'_id': '$category_id', 'total': {'$sum': '$amount'}}},
+                {'$sort': {'total': -1}},
+                {'$limit': DashboardEngine.TOP_CATEGORIES},
+                # category_id is stored as a string, categories use ObjectId keys
+                {
+                    '$addFields': {
+                        'category_oid': {
+                            '$convert': {
+                                'input': '$_id',
+                                'to': 'objectId',
+                                'onError': None,
+                                'onNull': None
+                            }
+                        }
+                    }
+                },
+                {
+                    '$lookup': {
+                        'from': 'categories',
+                        'localField': 'category_oid',
+                        'foreignField': '_id',
+                        'as': 'category'
+                    }
+                },
+                {
+                    '$project': {
+                        'total': 1,
+                        'name': {'$arrayElemAt': ['$category.name', 0]}
+                    }
+                }
+            ],
+            'recent_transactions': [
+                {'$sort': {'date': -1}},
+                {'$limit': DashboardEngine.RECENT_LIMIT}
+            ]
+        }
+        if not include_trend:
+            del facets['monthly_trend']
+            trend_start = start_date
+
+        return [
+            # Index-backed prefilter; $facet sub-pipelines cannot use indexes
+            {'$match': {'date': {'$gte': min(start_date, trend_start)}}},
+            {'$facet': facets}
+        ]
+
+    @staticmethod
+    def get_budget_totals():
+        """Total budgeted and spent amounts over active budgets"""
+        result = list(mongo.db.budgets.aggregate([
+            {'$match': {'is_active': True}},
+            {
+                '$group': {
+                    '_id': None,
+                    'total_budget': {'$sum': '$amount'},
+                    'total_spent': {'$sum': '$spent'}
+                }
+            }
+        ]))
+        if not result:
+            return 0.0, 0.0
+        return float(result[0]['total_budget']), float(result[0]['total_spent'])
+
+    @staticmethod
+    def build(start_date, end_date):
+        """Compute summary, trend, category breakdown and recent transactions"""
+        now = get_current_utc_time()
+        use_rollups = DailyRollup.is_ready()
+
+        facets = list(mongo.db.transactions.aggregate(
+            DashboardEngine.build_pipeline(start_date, end_date, now, include_trend=not use_rollups)
+        ))
+        facets = facets[0] if facets else {}
+
+        if use_rollups:
+            # The 12-month trend reads ~365 rollup documents instead of a year of transactions
+            facets['monthly_trend'] = DailyRollup.summarize(
+                now - timedelta(days=DashboardEngine.TREND_DAYS), now,
+                {'year': {'$year': '$day'}, 'month': {'$month': '$day'}, 'type': '$type'}
+            )
+
+        totals = {item['_id']: float(item['total']) for item in facets.get('summary', [])}
+
+        breakdown = [
+            {
+                'category': item.get('name') or 'Unknown',
+                'amount': float(item['total'])
+            }
+            for item in facets.get('category_breakdown', [])
+        ]
+
+        recent = facets.get('recent_transactions')
+        if not recent:
+            # Nothing dated inside the prefilter window; fall back to the latest overall
+            recent = list(mongo.db.transactions.find().sort('date', -1).limit(DashboardEngine.RECENT_LIMIT))
+        recent = Transaction.to_list(recent)
+
+        accounts = Account.get_active()
+        total_budget, total_spent = DashboardEngine.get_budget_totals()
+
+        return {
+            'accounts': accounts,
+            'total_balance': sum(float(a.get('balance', 0)) for a in accounts),
+            'total_income': totals.get('income', 0.0),
+            'total_expense': totals.get('expense', 0.0),
+            'total_budget': total_budget,
+            'total_spent': total_spent,
+            'monthly_trend': facets.get('monthly_trend', []),
+            'category_breakdown': breakdown,
+            'recent_transactions': recent
+        }
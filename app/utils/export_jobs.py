@@ -0,0 +1,114 @@
+# app/utils/export_jobs.py
+"""
+Background export jobs
+Version: 1.0.0
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from app.models import ExportJob
+from app.utils.exporters import get_exporter
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Process-wide worker pool, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get('EXPORT_JOB_WORKERS', 2),
+                thread_name_prefix='export-job'
+            )
+        return _executor
+
+def get_export_dir():
+    """Directory export artifacts are written to"""
+    export_dir = current_app.config.get('EXPORT_DIR', os.path.join('backups', 'exports'))
+    os.makedirs(export_dir, exist_ok=True)
+    return export_dir
+
+def submit_export(format, data_type, query=None):
+    """Queue an export and return its job ID"""
+    # Validates format and data type before anything is queued
+    exporter = get_exporter(format, data_type, query=query)
+
+    cleanup_expired()
+    job_id = ExportJob.create({
+        'format': format,
+        'data_type': data_type,
+        'query': query or {},
+        'filename': exporter.get_filename()
+    })
+
+    app = current_app._get_current_object()
+    get_executor().submit(run_export, app, job_id)
+    return job_id
+
+def run_export(app, job_id):
+    """Write one export artifact, recording progress on the job document"""
+    with app.app_context():
+        job = ExportJob.get_by_id(job_id)
+        path = os.path.join(get_export_dir(), f"{job_id}_{job['filename']}")
+        interval = app.config.get('EXPORT_JOB_PROGRESS_INTERVAL', 1)
+        last_update = [0.0]
+
+        def report(rows_written):
+            # Throttled so large exports don't write the job document per batch
+            now = time.monotonic()
+            if now - last_update[0] >= interval:
+                last_update[0] = now
+                ExportJob.update(job_id, {'rows_written': rows_written})
+
+        try:
+            exporter = get_exporter(job['format'], job['data_type'], query=job['query'] or None, on_progress=report)
+            ExportJob.update(job_id, {
+                'status': 'running',
+                'started_at': datetime.now(),
+                'total_estimate': exporter.estimate_total()
+            })
+
+            with open(path, 'wb') as output:
+                exporter.write_to(output)
+
+            ExportJob.update(job_id, {
+                'status': 'completed',
+                'rows_written': exporter.rows_written,
+                'path': path,
+                'size': os.path.getsize(path),
+                'completed_at': datetime.now(),
+                'expires_at': datetime.now() + timedelta(seconds=app.config.get('EXPORT_JOB_TTL', 86400))
+            })
+        except Exception as e:
+            print(f"Export job {job_id} failed: {e}")
+            if os.path.exists(path):
+                os.remove(path)
+            ExportJob.update(job_id, {'status': 'failed', 'error': str(e)})
+
+def get_progress(job):
+    """Progress summary for a job document"""
+    total = job.get('total_estimate') or 0
+    rows = job.get('rows_written', 0)
+    if job.get('status') == 'completed':
+        percent = 100.0
+    else:
+        percent = round(min(rows / total * 100, 99.0), 1) if total else 0.0
+    return {'rows_written': rows, 'total_estimate': total, 'percent': percent}
+
+def cleanup_expired():
+    """Delete expired artifacts and mark their jobs expired"""
+    removed = 0
+    for job in ExportJob.get_expired():
+        path = job.get('path')
+        try:
+            if path and os.path.exists(path):
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            print(f"Could not remove export artifact {path}: {e}")
+        ExportJob.update(str(job['_id']), {'status': 'expired'})
+    return removed
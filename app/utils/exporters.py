@@ -6,115 +6,323 @@ Version: 1.0.0
 import csv
 import json
 import io
-from datetime import datetime
-import pandas as pd
-from flask import Response
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from flask import Response, stream_with_context
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from app import mongo
+from app.models import SearchIndex
+from app.utils.helpers import enrich_references
 
-class BaseExporter:
-    """Base exporter class"""
+# Fixed column schema per data type so CSV headers need no pre-pass over the data
+EXPORT_FIELDS = {
+    'transactions': [
+        '_id', 'date', 'type', 'amount', 'description',
+        'category_id', 'category_name',
+        'from_account_id', 'from_account_name',
+        'to_account_id', 'to_account_name',
+        'tags', 'notes', 'is_reconciled', 'created_at', 'updated_at'
+    ],
+    'accounts': [
+        '_id', 'name', 'type', 'balance', 'currency', 'description',
+        'credit_limit', 'due_date', 'is_active', 'created_at', 'updated_at'
+    ],
+    'budgets': [
+        '_id', 'category_id', 'category_name', 'amount', 'spent', 'period',
+        'start_date', 'end_date', 'is_active', 'created_at', 'updated_at'
+    ],
+    'categories': [
+        '_id', 'name', 'type', 'description', 'is_default', 'is_deleted',
+        'created_at', 'updated_at'
+    ]
+}
+
+# Column holding, as JSON, any document fields outside the fixed schema
+# (legacy or ad-hoc fields), so CSV and Excel exports don't drop them
+EXTRA_FIELD = 'extra_fields'
+
+# Documents fetched from the cursor (and enriched) per round trip
+EXPORT_BATCH_SIZE = 500
+
+def get_filter(data_type, query=None):
+    """Mongo filter for the documents exported for a data type"""
+    if data_type == 'transactions':
+        return query or {}
+    if data_type in ('accounts', 'budgets'):
+        return {'is_active': True}
+    if data_type == 'categories':
+        return {'is_deleted': False}
+    raise ValueError(f"Invalid data type: {data_type}")
+
+def get_cursor(data_type, query=None):
+    """Cursor over the documents exported for a data type"""
+    cursor = mongo.db[data_type].find(get_filter(data_type, query), SearchIndex.HIDDEN)
+    if data_type == 'transactions':
+        cursor = cursor.sort('date', -1)
+    return cursor
+
+def count_documents(data_type, query=None):
+    """Number of documents exported for a data type"""
+    return mongo.db[data_type].count_documents(get_filter(data_type, query))
+
+def get_data_types(data_type):
+    """Data types covered by an export request"""
+    if data_type == 'all':
+        return list(EXPORT_FIELDS.keys())
+    if data_type not in EXPORT_FIELDS:
+        raise ValueError(f"Invalid data type: {data_type}")
+    return [data_type]
+
+def has_data(data_type, query=None):
+    """True if the export would contain at least one document"""
+    return any(
+        next(iter(get_cursor(dt, query).limit(1)), None) is not None
+        for dt in get_data_types(data_type)
+    )
+
+def iter_batches(data_type, query=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield lists of export-ready documents without loading the whole result"""
+    cursor = get_cursor(data_type, query).batch_size(batch_size)
+    batch = []
+    for doc in cursor:
+        doc['_id'] = str(doc['_id'])
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield _enrich(data_type, batch)
+            batch = []
+    if batch:
+        yield _enrich(data_type, batch)
+
+def _enrich(data_type, batch):
+    """Resolve category/account names for one batch"""
+    if data_type in ('transactions', 'budgets'):
+        enrich_references(batch)
+    return batch
+
+def export_fields(data_type):
+    """Column schema for a data type: the fixed fields plus EXTRA_FIELD"""
+    return EXPORT_FIELDS[data_type] + [EXTRA_FIELD]
+
+def _extra_fields(data_type, item):
+    """JSON of the fields in a document that the fixed schema has no column for"""
+    known = EXPORT_FIELDS[data_type]
+    extra = {key: value for key, value in item.items() if key not in known and key != '_data_type'}
+    return json.dumps(extra, default=str) if extra else None
+
+def _csv_value(value):
+    """Flatten a document value into a CSV cell"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return ', '.join(str(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, default=str)
+    return value
+
+class BaseExporter(ABC):
+    """Base exporter class.
+
+    Exporters pull documents from the Mongo cursor in batches and yield the
+    output in chunks, so an export never holds the full result set.
+    """
     
-    def __init__(self, data, filename_prefix):
-        self.data = data
-        self.filename_prefix = filename_prefix
+    mimetype = 'application/octet-stream'
+    extension = 'dat'
+    
+    def __init__(self, data_type, filename_prefix=None, query=None, on_progress=None):
+        self.data_types = get_data_types(data_type)
+        self.data_type = data_type
+        self.query = query
+        self.filename_prefix = filename_prefix or data_type
         self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.rows_written = 0
+        self.on_progress = on_progress
     
-    def get_filename(self, extension):
-        return f"{self.filename_prefix}_{self.timestamp}.{extension}"
-
-class CSVExporter(BaseExporter):
-    """CSV exporter"""
+    def get_filename(self, extension=None):
+        return f"{self.filename_prefix}_{self.timestamp}.{extension or self.extension}"
+    
+    def estimate_total(self):
+        """Number of documents the export is expected to contain"""
+        return sum(count_documents(dt, self.query) for dt in self.data_types)
+    
+    def batches(self, data_type):
+        """iter_batches that keeps rows_written current and reports progress"""
+        for batch in iter_batches(data_type, self.query):
+            yield batch
+            self.rows_written += len(batch)
+            if self.on_progress:
+                self.on_progress(self.rows_written)
+    
+    @abstractmethod
+    def iter_chunks(self):
+        """Yield the export body piece by piece"""
+    
+    def write_to(self, output):
+        """Write the whole export into a binary file object"""
+        for chunk in self.iter_chunks():
+            output.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
     
     def export(self):
-        output = io.StringIO()
-        
-        if isinstance(self.data, list):
-            if self.data:
-                writer = csv.DictWriter(output, fieldnames=self.data[0].keys())
-                writer.writeheader()
-                writer.writerows(self.data)
-        elif isinstance(self.data, dict):
-            # Flatten nested dictionary
-            flattened = []
-            for key, items in self.data.items():
-                if isinstance(items, list):
-                    for item in items:
-                        item['_data_type'] = key
-                        flattened.append(item)
-            
-            if flattened:
-                writer = csv.DictWriter(output, fieldnames=flattened[0].keys())
-                writer.writeheader()
-                writer.writerows(flattened)
-        
-        output.seek(0)
-        
         return Response(
-            output.getvalue(),
-            mimetype='text/csv',
+            stream_with_context(self.iter_chunks()),
+            mimetype=self.mimetype,
             headers={
-                'Content-Disposition': f'attachment; filename={self.get_filename("csv")}'
+                'Content-Disposition': f'attachment; filename={self.get_filename()}'
             }
         )
 
+class CSVExporter(BaseExporter):
+    """CSV exporter"""
+    
+    mimetype = 'text/csv'
+    extension = 'csv'
+    
+    def get_fieldnames(self):
+        if self.data_type != 'all':
+            return export_fields(self.data_type)
+        fieldnames = ['_data_type']
+        for dt in self.data_types:
+            fieldnames.extend(f for f in export_fields(dt) if f not in fieldnames)
+        return fieldnames
+    
+    @staticmethod
+    def _drain(output):
+        text = output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+        return text
+    
+    def iter_chunks(self):
+        output = io.StringIO()
+        fieldnames = self.get_fieldnames()
+        writer = csv.DictWriter(output, fieldnames=fieldnames, extrasaction='ignore', restval='')
+        writer.writeheader()
+        yield self._drain(output)
+        
+        for dt in self.data_types:
+            for batch in self.batches(dt):
+                for item in batch:
+                    row = {key: _csv_value(value) for key, value in item.items() if value is not None}
+                    row[EXTRA_FIELD] = _extra_fields(dt, item)
+                    if self.data_type == 'all':
+                        row['_data_type'] = dt
+                    writer.writerow(row)
+                yield self._drain(output)
+
 class JSONExporter(BaseExporter):
-    """JSON exporter"""
+    """JSON exporter (an array, or an object of arrays for 'all')"""
+    
+    mimetype = 'application/json'
+    extension = 'json'
     
-    def export(self, pretty=True):
-        indent = 2 if pretty else None
+    def _iter_array(self, data_type):
+        yield '['
+        first = True
+        for batch in self.batches(data_type):
+            chunk = ',\n'.join(json.dumps(item, default=str) for item in batch)
+            yield chunk if first else ',\n' + chunk
+            first = False
+        yield ']'
+    
+    def iter_chunks(self):
+        if self.data_type != 'all':
+            yield from self._iter_array(self.data_type)
+            return
         
-        return Response(
-            json.dumps(self.data, default=str, indent=indent),
-            mimetype='application/json',
-            headers={
-                'Content-Disposition': f'attachment; filename={self.get_filename("json")}'
-            }
-        )
+        yield '{'
+        for dt in self.data_types:
+            yield f'{json.dumps(dt)}: '
+            yield from self._iter_array(dt)
+            yield ',\n'
+        yield f'"exported_at": {json.dumps(datetime.now().isoformat())}}}'
+
+class NDJSONExporter(BaseExporter):
+    """Newline-delimited JSON exporter, one document per line"""
+    
+    mimetype = 'application/x-ndjson'
+    extension = 'ndjson'
+    
+    def iter_chunks(self):
+        for dt in self.data_types:
+            for batch in self.batches(dt):
+                lines = []
+                for item in batch:
+                    if self.data_type == 'all':
+                        item['_data_type'] = dt
+                    lines.append(json.dumps(item, default=str) + '\n')
+                yield ''.join(lines)
 
 class ExcelExporter(BaseExporter):
-    """Excel exporter"""
+    """Excel exporter.
+
+    Rows go straight from the cursor into an openpyxl write-only workbook,
+    which is saved to a temp file that only spills to disk once it grows
+    past SPOOL_MAX_SIZE, then streamed back in chunks.
+    """
     
-    def export(self):
-        output = io.BytesIO()
+    mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    extension = 'xlsx'
+    
+    SPOOL_MAX_SIZE = 8 * 1024 * 1024
+    CHUNK_SIZE = 64 * 1024
+    
+    @staticmethod
+    def _cell_value(value):
+        """Convert a document value into something openpyxl can write"""
+        if isinstance(value, datetime):
+            # Excel has no timezone support; store UTC wall time
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value
+        if isinstance(value, (list, tuple)):
+            return ', '.join(str(v) for v in value)
+        if isinstance(value, dict):
+            return json.dumps(value, default=str)
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        return str(value)
+    
+    def build_workbook(self, output):
+        """Write one sheet per data type into a file object"""
+        workbook = Workbook(write_only=True)
         
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            if isinstance(self.data, list):
-                df = pd.DataFrame(self.data)
-                df.to_excel(writer, sheet_name='Data', index=False)
-            elif isinstance(self.data, dict):
-                for key, items in self.data.items():
-                    if isinstance(items, list):
-                        df = pd.DataFrame(items)
-                        df.to_excel(writer, sheet_name=key.capitalize(), index=False)
+        for dt in self.data_types:
+            fieldnames = export_fields(dt)
+            worksheet = workbook.create_sheet(title=dt.capitalize())
             
-            # Auto-adjust column widths
-            for worksheet in writer.sheets.values():
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        output.seek(0)
+            # Write-only sheets cannot be resized afterwards; size columns by header
+            for index, field in enumerate(fieldnames, start=1):
+                worksheet.column_dimensions[get_column_letter(index)].width = min(max(len(field) + 2, 12), 50)
+            
+            worksheet.append(fieldnames)
+            for batch in self.batches(dt):
+                for item in batch:
+                    item[EXTRA_FIELD] = _extra_fields(dt, item)
+                    worksheet.append([self._cell_value(item.get(field)) for field in fieldnames])
         
-        return Response(
-            output.getvalue(),
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            headers={
-                'Content-Disposition': f'attachment; filename={self.get_filename("xlsx")}'
-            }
-        )
+        workbook.save(output)
+    
+    def write_to(self, output):
+        self.build_workbook(output)
+    
+    def iter_chunks(self):
+        with tempfile.SpooledTemporaryFile(max_size=self.SPOOL_MAX_SIZE) as output:
+            self.build_workbook(output)
+            output.seek(0)
+            while True:
+                chunk = output.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
 
-def get_exporter(format, data, filename_prefix):
+def get_exporter(format, data_type, filename_prefix=None, query=None, on_progress=None):
     """Factory function to get appropriate exporter"""
     exporters = {
         'csv': CSVExporter,
         'json': JSONExporter,
+        'ndjson': NDJSONExporter,
         'excel': ExcelExporter,
         'xlsx': ExcelExporter
     }
@@ -123,4 +331,4 @@ def get_exporter(format, data, filename_prefix):
     if not exporter_class:
         raise ValueError(f"Unsupported export format: {format}")
     
-    return exporter_class(data, filename_prefix)
\ No newline at end of file
+    return exporter_class(data_type, filename_prefix, query, on_progress)
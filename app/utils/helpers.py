@@ -8,9 +8,10 @@ from datetime import datetime, timedelta
 import calendar
 import hashlib
 import json
-from app.models import Settings
+from collections import defaultdict
+from functools import lru_cache
+from app.models import Settings, Category, Account
 import pytz
-import pandas as pd
 
 def generate_id():
     """Generate unique ID"""
@@ -64,11 +65,51 @@ def format_timedelta(td):
     
     return ' '.join(parts) if parts else '0s'
 
+def clean_amount(value):
+    """Parse an amount that may carry commas, currency symbols or (negative) parentheses"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    
+    amount_str = str(value).replace(',', '').replace('$', '').replace('€', '').replace('£', '').strip()
+    if amount_str.startswith('(') and amount_str.endswith(')'):
+        amount_str = '-' + amount_str[1:-1].strip()
+    return float(amount_str)
+
 def chunk_list(lst, chunk_size):
     """Split list into chunks"""
     for i in range(0, len(lst), chunk_size):
         yield lst[i:i + chunk_size]
 
+# Reference fields resolved by enrich_references: (id field, name field, model)
+REFERENCE_FIELDS = (
+    ('category_id', 'category_name', Category),
+    ('from_account_id', 'from_account_name', Account),
+    ('to_account_id', 'to_account_name', Account),
+)
+
+def enrich_references(documents, fields=REFERENCE_FIELDS):
+    """Attach category/account names to a batch of documents.
+
+    Collects the distinct referenced IDs first and resolves them with one
+    $in query per collection instead of one lookup per row.
+    """
+    wanted = defaultdict(set)
+    for doc in documents:
+        for id_field, _, model in fields:
+            if doc.get(id_field):
+                wanted[model].add(str(doc[id_field]))
+
+    names = {}
+    for model, ids in wanted.items():
+        names[model] = {ref_id: ref.get('name') for ref_id, ref in model.get_many(ids).items()}
+
+    for doc in documents:
+        for id_field, name_field, model in fields:
+            if doc.get(id_field):
+                doc[name_field] = names[model].get(str(doc[id_field]), 'Unknown')
+
+    return documents
+
 def merge_dicts(dict1, dict2):
     """Merge two dictionaries recursively"""
     result = dict1.copy()
@@ -98,13 +139,18 @@ def calculate_percentage(part, whole):
     """Calculate percentage"""
     return safe_divide(part * 100, whole, 0)
 
+@lru_cache(maxsize=32)
+def load_timezone(timezone_str):
+    """Parsed pytz timezone, memoized per name"""
+    return pytz.timezone(timezone_str)
+
 def get_user_timezone():
     """Get user's preferred timezone from settings"""
     try:
         timezone_str = Settings.get('timezone', 'local')
         if timezone_str == 'local' or not timezone_str:
             return None
-        return pytz.timezone(timezone_str)
+        return load_timezone(timezone_str)
     except Exception as e:
         print(f"Error getting timezone: {e}")
         return None
@@ -0,0 +1,237 @@
+# app/utils/index_audit.py
+"""
+Index coverage audit: explain() the query shapes the app issues
+Version: 1.0.0
+"""
+from datetime import datetime
+from bson import ObjectId
+from app.models import Log
+
+SAMPLE_ID = '000000000000000000000000'
+SAMPLE_DATE = datetime(2024, 1, 1)
+SAMPLE_RANGE = {'$gte': datetime(2024, 1, 1), '$lte': datetime(2024, 1, 31)}
+EQUALITY_OPERATORS = ('$eq', '$all')
+
+# Every filter/sort the routes and models run against a collection, with
+# placeholder values (the plan depends on the shape, not the values)
+QUERY_SHAPES = [
+    # Transactions
+    {'name': 'transactions.recent', 'collection': 'transactions',
+     'filter': {}, 'sort': [('date', -1)]},
+    {'name': 'transactions.keyset_page', 'collection': 'transactions',
+     'filter': {'$or': [{'date': {'$lt': SAMPLE_DATE}}, {'date': SAMPLE_DATE, '_id': {'$lt': ObjectId(SAMPLE_ID)}}]},
+     'sort': [('date', -1), ('_id', -1)]},
+    {'name': 'transactions.by_type', 'collection': 'transactions',
+     'filter': {'type': 'expense'}, 'sort': [('date', -1)]},
+    {'name': 'transactions.by_category', 'collection': 'transactions',
+     'filter': {'category_id': SAMPLE_ID}, 'sort': [('date', -1)]},
+    {'name': 'transactions.by_account', 'collection': 'transactions',
+     'filter': {'$or': [{'from_account_id': SAMPLE_ID}, {'to_account_id': SAMPLE_ID}]},
+     'sort': [('date', -1)]},
+    {'name': 'transactions.date_range', 'collection': 'transactions',
+     'filter': {'date': SAMPLE_RANGE}, 'sort': [('date', -1)]},
+    {'name': 'transactions.search', 'collection': 'transactions',
+     'filter': {'search_prefixes': {'$all': ['co']}}, 'sort': [('date', -1)]},
+    {'name': 'transactions.budget_window', 'collection': 'transactions',
+     'filter': {'category_id': SAMPLE_ID, 'date': SAMPLE_RANGE,
+                'type': {'$in': ['expense', 'asset_purchase', 'credit_card_payment']}}},
+    {'name': 'transactions.period_report', 'collection': 'transactions',
+     'filter': {'date': SAMPLE_RANGE, 'type': {'$in': ['income', 'expense']}}},
+    {'name': 'transactions.import_dedup', 'collection': 'transactions',
+     'filter': {'import_hash': {'$in': ['sample']}}},
+
+    # Accounts, categories, budgets
+    {'name': 'accounts.active', 'collection': 'accounts',
+     'filter': {'is_active': True}, 'sort': [('name', 1)]},
+    {'name': 'accounts.by_name', 'collection': 'accounts',
+     'filter': {'name': 'sample', 'is_active': True}},
+    {'name': 'categories.active', 'collection': 'categories',
+     'filter': {'is_deleted': False}, 'sort': [('name', 1)]},
+    {'name': 'categories.by_type', 'collection': 'categories',
+     'filter': {'type': 'expense', 'is_deleted': False}, 'sort': [('name', 1)]},
+    {'name': 'budgets.active', 'collection': 'budgets',
+     'filter': {'is_active': True}},
+    {'name': 'budgets.by_category', 'collection': 'budgets',
+     'filter': {'category_id': {'$in': [SAMPLE_ID]}, 'is_active': True}},
+    {'name': 'budgets.spent_window', 'collection': 'budgets',
+     'filter': {'category_id': {'$in': [SAMPLE_ID]}, 'start_date': {'$lte': SAMPLE_DATE},
+                'end_date': {'$gte': SAMPLE_DATE}, 'is_active': True}},
+
+    # Logs
+    {'name': 'logs.recent', 'collection': 'logs',
+     'filter': {}, 'sort': [('timestamp', -1)]},
+    {'name': 'logs.by_level', 'collection': 'logs',
+     'filter': {'level': 'ERROR'}, 'sort': [('timestamp', -1)]},
+    {'name': 'logs.by_category', 'collection': 'logs',
+     'filter': {'category': 'API'}, 'sort': [('timestamp', -1)]},
+    {'name': 'logs.errors_by_category', 'collection': 'logs',
+     'filter': {'level': 'ERROR', 'category': 'API'}, 'sort': [('timestamp', -1)]},
+    {'name': 'logs.similar_errors', 'collection': 'logs',
+     'filter': {'_id': {'$ne': ObjectId(SAMPLE_ID)}, 'message': 'sample', 'level': 'ERROR'},
+     'sort': [('timestamp', -1)]},
+    {'name': 'logs.date_range', 'collection': 'logs',
+     'filter': {'timestamp': SAMPLE_RANGE}, 'sort': [('timestamp', -1)]},
+    {'name': 'logs.search', 'collection': 'logs',
+     'filter': {'search_prefixes': {'$all': ['co']}}, 'sort': [('timestamp', -1)]},
+
+    # Housekeeping
+    {'name': 'settings.by_keys', 'collection': 'settings',
+     'filter': {'key': {'$in': ['sample']}}},
+    {'name': 'export_jobs.expired', 'collection': 'export_jobs',
+     'filter': {'status': 'completed', 'expires_at': {'$lte': SAMPLE_DATE}}},
+    {'name': 'tombstones.since', 'collection': 'tombstones',
+     'filter': {'deleted_at': {'$gte': SAMPLE_DATE}}},
+]
+
+def plan_stages(plan):
+    """Flatten a winning plan tree into its stages"""
+    stages = []
+    pending = [plan]
+    while pending:
+        stage = pending.pop()
+        stages.append(stage)
+        if stage.get('inputStage'):
+            pending.append(stage['inputStage'])
+        pending.extend(stage.get('inputStages', []))
+    return stages
+
+def index_name(keys):
+    """Index name as MongoDB generates it"""
+    return '_'.join(f'{field}_{direction}' for field, direction in keys)
+
+def is_equality(value, sorted_query):
+    """Whether a filter value pins the field to one (or, unsorted, a few) values"""
+    if not isinstance(value, dict):
+        return True
+    operators = set(value)
+    if operators <= set(EQUALITY_OPERATORS):
+        return True
+    # $in still lets an index provide the order only when nothing is sorted
+    return operators == {'$in'} and not sorted_query
+
+def suggest_indexes(query, sort=None):
+    """Compound indexes for a query shape: equality fields, then sort, then range (ESR)"""
+    sort = list(sort or [])
+    if '$or' in query:
+        rest = {field: value for field, value in query.items() if field != '$or'}
+        suggestions = []
+        for branch in query['$or']:
+            for keys in suggest_indexes({**rest, **branch}, sort):
+                if keys not in suggestions:
+                    suggestions.append(keys)
+        return suggestions
+
+    sort_fields = [field for field, _ in sort]
+    equality, ranges = [], []
+    for field, value in query.items():
+        if field.startswith('$') or field == '_id' or field in sort_fields:
+            continue
+        (equality if is_equality(value, bool(sort)) else ranges).append(field)
+
+    keys = [(field, 1) for field in equality] + sort + [(field, 1) for field in ranges]
+    return [keys] if keys else []
+
+def covers(index_keys, keys):
+    """Whether an existing index has `keys` as a prefix (or its reverse)"""
+    if len(index_keys) < len(keys):
+        return False
+    prefix = index_keys[:len(keys)]
+    reverse = [(field, -direction if isinstance(direction, int) else direction) for field, direction in keys]
+    return prefix == keys or prefix == reverse
+
+def collection_indexes(collection):
+    """{name: (key list, index info)} for a collection"""
+    return {
+        name: ([(field, direction if isinstance(direction, str) else int(direction))
+                for field, direction in info['key']], info)
+        for name, info in collection.index_information().items()
+    }
+
+def redundant_indexes(indexes):
+    """Plain indexes that are a prefix of another index on the same collection"""
+    redundant = []
+    for name, (keys, info) in sorted(indexes.items()):
+        if name == '_id_' or info.get('unique') or 'expireAfterSeconds' in info \
+                or info.get('partialFilterExpression') or info.get('sparse'):
+            continue
+        for other, (other_keys, _) in indexes.items():
+            if other != name and len(other_keys) > len(keys) and covers(other_keys, keys):
+                redundant.append({'index': name, 'covered_by': other})
+                break
+    return redundant
+
+def explain_shape(db, shape):
+    """Winning plan summary and issues for one query shape"""
+    cursor = db[shape['collection']].find(shape['filter'])
+    if shape.get('sort'):
+        cursor = cursor.sort(shape['sort'])
+    planner = cursor.explain()['queryPlanner']
+    plan = planner['winningPlan']
+    plan = plan.get('queryPlan', plan)  # slot-based engine nests the classic plan
+
+    stages = plan_stages(plan)
+    names = {stage['stage'] for stage in stages}
+    issues = []
+    if 'COLLSCAN' in names:
+        issues.append('COLLSCAN')
+    if 'SORT' in names:
+        issues.append('IN_MEMORY_SORT')
+    return {
+        'indexes_used': sorted({stage['indexName'] for stage in stages if stage.get('indexName')}),
+        'issues': issues
+    }
+
+def audit_indexes(db, shapes=None):
+    """Explain every query shape; returns a report dict (stable ordering, diffable)"""
+    # Partitioned logs are audited on the newest partition
+    storage = {'logs': (Log.storage_names() or ['logs'])[-1]}
+
+    report = {'queries': [], 'suggestions': [], 'redundant': {}}
+    indexes = {}
+    for shape in sorted(shapes or QUERY_SHAPES, key=lambda s: s['name']):
+        name = storage.get(shape['collection'], shape['collection'])
+        shape = {**shape, 'collection': name}
+        if name not in indexes:
+            indexes[name] = collection_indexes(db[name])
+
+        result = explain_shape(db, shape)
+        entry = {'name': shape['name'], 'collection': name, **result, 'suggest': []}
+        if result['issues']:
+            for keys in suggest_indexes(shape['filter'], shape.get('sort')):
+                if any(covers(existing, keys) for existing, _ in indexes[name].values()):
+                    continue
+                entry['suggest'].append(index_name(keys))
+                suggestion = {'collection': name, 'name': index_name(keys), 'keys': keys}
+                if suggestion not in report['suggestions']:
+                    report['suggestions'].append(suggestion)
+        report['queries'].append(entry)
+
+    for name in sorted(indexes):
+        redundant = redundant_indexes(indexes[name])
+        if redundant:
+            report['redundant'][name] = redundant
+    return report
+
+def apply_suggestions(db, report):
+    """Create the suggested indexes; returns their names"""
+    created = []
+    for suggestion in report['suggestions']:
+        db[suggestion['collection']].create_index(suggestion['keys'])
+        created.append(f"{suggestion['collection']}.{suggestion['name']}")
+    return created
+
+def format_report(report):
+    """Plain-text report, one line per query shape"""
+    lines = []
+    for entry in report['queries']:
+        status = ','.join(entry['issues']) or 'OK'
+        used = ', '.join(entry['indexes_used']) or '-'
+        line = f"{status:<24} {entry['name']:<32} {entry['collection']:<14} index: {used}"
+        if entry['suggest']:
+            line += f"  suggest: {', '.join(entry['suggest'])}"
+        lines.append(line)
+
+    for name, redundant in report['redundant'].items():
+        for item in redundant:
+            lines.append(f"{'REDUNDANT':<24} {item['index']:<32} {name:<14} covered by: {item['covered_by']}")
+    return '\n'.join(lines)
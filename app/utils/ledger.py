@@ -0,0 +1,128 @@
+# app/utils/ledger.py
+"""
+Ledger service: transaction writes with atomic account balance updates
+Version: 1.0.0
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import current_app
+from app import mongo
+from app.models import Transaction, Account, Log
+from app.utils.helpers import chunk_list
+
+# Transaction fields that change which balances move, or by how much
+BALANCE_FIELDS = ('type', 'amount', 'from_account_id', 'to_account_id')
+
+def balance_deltas(transaction, sign=1):
+    """Balance change per account for one transaction, as {account_id: delta}"""
+    deltas = defaultdict(float)
+    try:
+        amount = float(transaction.get('amount', 0)) * sign
+    except (TypeError, ValueError):
+        return deltas
+
+    from_account = transaction.get('from_account_id')
+    to_account = transaction.get('to_account_id')
+
+    if transaction.get('type') == 'income' and to_account:
+        deltas[str(to_account)] += amount
+    elif transaction.get('type') == 'expense' and from_account:
+        deltas[str(from_account)] -= amount
+    elif transaction.get('type') == 'transfer' and from_account and to_account:
+        deltas[str(from_account)] -= amount
+        deltas[str(to_account)] += amount
+    return deltas
+
+def merge_deltas(*delta_maps):
+    """Sum several {account_id: delta} maps, dropping accounts that net to zero"""
+    merged = defaultdict(float)
+    for deltas in delta_maps:
+        for account_id, delta in deltas.items():
+            merged[account_id] += delta
+    return {account_id: delta for account_id, delta in merged.items() if delta}
+
+@contextmanager
+def write_session():
+    """Yield a session inside a multi-document transaction, or None.
+
+    Transactions need a replica set, so they are opt-in via
+    LEDGER_USE_TRANSACTIONS; without them every balance change is still a
+    single atomic $inc.
+    """
+    if not current_app.config.get('LEDGER_USE_TRANSACTIONS'):
+        yield None
+        return
+
+    with mongo.db.client.start_session() as session:
+        with session.start_transaction():
+            yield session
+
+def create_transaction(data, log=None):
+    """Insert a transaction, apply its balance changes and write its log entry"""
+    with write_session() as session:
+        transaction_id = Transaction.create(data, session=session)
+        Account.apply_balance_deltas(balance_deltas(data), session=session)
+        if log:
+            log.setdefault('details', {})['transaction_id'] = transaction_id
+            Log.create(log, session=session)
+    return transaction_id
+
+def update_transaction(transaction_id, data):
+    """Update a transaction, moving balances from its old values to its new ones"""
+    with write_session() as session:
+        old = Transaction.update(transaction_id, data, session=session)
+        if old and any(field in data for field in BALANCE_FIELDS):
+            Account.apply_balance_deltas(
+                merge_deltas(balance_deltas(old, sign=-1), balance_deltas({**old, **data})),
+                session=session
+            )
+    return old
+
+def delete_transaction(transaction_id):
+    """Delete a transaction and reverse its balance changes"""
+    with write_session() as session:
+        deleted = Transaction.delete(transaction_id, session=session)
+        if deleted:
+            Account.apply_balance_deltas(balance_deltas(deleted, sign=-1), session=session)
+    return deleted
+
+def delete_transactions(object_ids):
+    """Delete several transactions, reversing their balances in one bulk write"""
+    with write_session() as session:
+        deleted = Transaction.bulk_delete(object_ids, session=session)
+        Account.apply_balance_deltas(
+            merge_deltas(*(balance_deltas(t, sign=-1) for t in deleted)),
+            session=session
+        )
+    return deleted
+
+def create_transactions(documents, log=None, chunk_size=1000):
+    """Bulk insert transactions and apply their summed balance changes once.
+
+    Returns (inserted, errors) as lists of (position in `documents`, id or
+    error message). The optional log entry gets the counts added.
+    """
+    inserted = []
+    errors = []
+    deltas = []
+
+    with write_session() as session:
+        offset = 0
+        for chunk in chunk_list(documents, chunk_size):
+            created, chunk_errors = Transaction.create_many(chunk, session=session)
+            failed = set()
+            for position, message in chunk_errors:
+                errors.append((offset + position, message))
+                failed.add(position)
+            for position, data in enumerate(chunk):
+                if position not in failed:
+                    inserted.append((offset + position, str(data['_id'])))
+            deltas.extend(balance_deltas(data) for data in created)
+            offset += len(chunk)
+
+        Account.apply_balance_deltas(merge_deltas(*deltas), session=session)
+        if log:
+            log.setdefault('details', {}).update({'created': len(inserted), 'failed': len(errors)})
+            Log.create(log, session=session)
+
+    return inserted, errors
@@ -5,6 +5,8 @@ Version: 1.0.0
 """
 from datetime import datetime, timedelta
 from app import mongo
+from app.models import Category, DailyRollup
+from app.utils.helpers import get_user_timezone
 from collections import defaultdict
 
 class ReportGenerator:
@@ -13,33 +15,33 @@ class ReportGenerator:
     @staticmethod
     def generate_income_statement(start_date, end_date):
         """Generate income statement"""
-        # Get income transactions
-        income = list(mongo.db.transactions.find({
-            'date': {'$gte': start_date, '$lte': end_date},
-            'type': 'income'
-        }))
-        
-        # Get expense transactions
-        expenses = list(mongo.db.transactions.find({
-            'date': {'$gte': start_date, '$lte': end_date},
-            'type': 'expense'
-        }))
-        
-        # Group by category
         income_by_category = defaultdict(float)
-        for t in income:
-            income_by_category[t['category_id']] += t['amount']
-        
         expenses_by_category = defaultdict(float)
-        for t in expenses:
-            expenses_by_category[t['category_id']] += t['amount']
+        
+        if DailyRollup.covers(start_date, end_date):
+            # Whole days: read the materialized daily rollups
+            rows = DailyRollup.summarize(
+                start_date, end_date,
+                {'type': '$type', 'category_id': '$category_id'},
+                match={'type': {'$in': ['income', 'expense']}}
+            )
+        else:
+            rows = ReportGenerator._income_statement_totals(start_date, end_date)
+        
+        # One row per (type, category); the cursor is consumed as it streams
+        for row in rows:
+            if row['_id']['type'] == 'income':
+                income_by_category[row['_id'].get('category_id')] += row['total']
+            else:
+                expenses_by_category[row['_id'].get('category_id')] += row['total']
         
         # Get category names
-        categories = {}
-        for cat_id in set(list(income_by_category.keys()) + list(expenses_by_category.keys())):
-            category = mongo.db.categories.find_one({'_id': cat_id})
-            if category:
-                categories[cat_id] = category['name']
+        categories = {
+            cat_id: category['name']
+            for cat_id, category in Category.get_many(
+                list(income_by_category.keys()) + list(expenses_by_category.keys())
+            ).items()
+        }
         
         return {
             'period': {
@@ -120,26 +122,36 @@ class ReportGenerator:
     @staticmethod
     def generate_cash_flow(start_date, end_date):
         """Generate cash flow statement"""
-        # Get all transactions
-        transactions = list(mongo.db.transactions.find({
-            'date': {'$gte': start_date, '$lte': end_date}
-        }).sort('date', 1))
-        
         # Initialize daily balances
         daily_flow = defaultdict(lambda: {'inflow': 0, 'outflow': 0, 'net': 0})
         
-        for t in transactions:
-            date_str = t['date'].strftime('%Y-%m-%d')
-            
-            if t['type'] == 'income':
-                daily_flow[date_str]['inflow'] += t['amount']
-                daily_flow[date_str]['net'] += t['amount']
-            elif t['type'] == 'expense':
-                daily_flow[date_str]['outflow'] += t['amount']
-                daily_flow[date_str]['net'] -= t['amount']
-            elif t['type'] == 'transfer':
-                # Transfers don't affect net cash flow
-                pass
+        # Days are bucketed in the user's timezone; rollups are UTC days
+        timezone = get_user_timezone()
+        timezone_name = timezone.zone if timezone else None
+        
+        if timezone_name in (None, 'UTC') and DailyRollup.covers(start_date, end_date):
+            # Whole days: read the materialized daily rollups
+            rows = (
+                {'_id': {'day': row['_id']['day'].strftime('%Y-%m-%d'), 'type': row['_id']['type']},
+                 'total': row['total']}
+                for row in DailyRollup.summarize(
+                    start_date, end_date,
+                    {'day': '$day', 'type': '$type'},
+                    match={'type': {'$in': ['income', 'expense']}}
+                )
+            )
+        else:
+            rows = ReportGenerator._daily_flow_totals(start_date, end_date, timezone_name)
+        
+        # Transfers are excluded upstream; they don't affect net cash flow
+        for row in rows:
+            date_str = row['_id']['day']
+            if row['_id']['type'] == 'income':
+                daily_flow[date_str]['inflow'] += row['total']
+                daily_flow[date_str]['net'] += row['total']
+            else:
+                daily_flow[date_str]['outflow'] += row['total']
+                daily_flow[date_str]['net'] -= row['total']
         
         return {
             'period': {
@@ -165,39 +177,37 @@ class ReportGenerator:
     @staticmethod
     def generate_category_analysis(start_date, end_date):
         """Generate category spending analysis"""
-        pipeline = [
-            {
-                '$match': {
-                    'date': {'$gte': start_date, '$lte': end_date},
-                    'type': 'expense'
-                }
-            },
-            {
-                '$group': {
-                    '_id': '$category_id',
-                    'total': {'$sum': '$amount'},
-                    'count': {'$sum': 1},
-                    'avg_amount': {'$avg': '$amount'},
-                    'max_amount': {'$max': '$amount'},
-                    'min_amount': {'$min': '$amount'}
+        if DailyRollup.covers(start_date, end_date):
+            # Whole days: read the materialized daily rollups
+            rows = DailyRollup.summarize(start_date, end_date, '$category_id', match={'type': 'expense'})
+            results = [
+                {
+                    '_id': row['_id'],
+                    'total': row['total'],
+                    'count': row['count'],
+                    'avg_amount': row['total'] / row['count'] if row['count'] else 0,
+                    'max_amount': row['max'],
+                    'min_amount': row['min']
                 }
-            },
-            {
-                '$sort': {'total': -1}
-            }
-        ]
+                for row in sorted(rows, key=lambda r: r['total'], reverse=True)
+            ]
+        else:
+            results = ReportGenerator._category_totals(start_date, end_date)
         
-        results = list(mongo.db.transactions.aggregate(pipeline))
+        # Get category names and budgets (one query per collection)
+        category_docs = Category.get_many(r['_id'] for r in results)
+        budgets = {}
+        for budget in mongo.db.budgets.find({
+            'category_id': {'$in': list(category_docs.keys())},
+            'is_active': True
+        }):
+            budgets.setdefault(budget['category_id'], budget)
         
-        # Get category names and budgets
         categories = {}
         for r in results:
-            category = mongo.db.categories.find_one({'_id': r['_id']})
+            category = category_docs.get(str(r['_id']))
             if category:
-                budget = mongo.db.budgets.find_one({
-                    'category_id': r['_id'],
-                    'is_active': True
-                })
+                budget = budgets.get(str(r['_id']))
                 
                 categories[r['_id']] = {
                     'name': category['name'],
@@ -222,4 +232,75 @@ class ReportGenerator:
             'total_budget': sum(c['budget'] for c in categories.values() if c['budget']),
             'categories_with_budget': sum(1 for c in categories.values() if c['budget']),
             'categories_over_budget': sum(1 for c in categories.values() if c['progress'] and c['progress'] > 100)
-        }
\ No newline at end of file
+        }
+    
+    @staticmethod
+    def _income_statement_totals(start_date, end_date):
+        """Income/expense totals per category straight from transactions"""
+        pipeline = [
+            {
+                '$match': {
+                    'date': {'$gte': start_date, '$lte': end_date},
+                    'type': {'$in': ['income', 'expense']}
+                }
+            },
+            {
+                '$group': {
+                    '_id': {'type': '$type', 'category_id': '$category_id'},
+                    'total': {'$sum': '$amount'}
+                }
+            }
+        ]
+        
+        return mongo.db.transactions.aggregate(pipeline)
+    
+    @staticmethod
+    def _daily_flow_totals(start_date, end_date, timezone_name=None):
+        """Income/expense totals per calendar day straight from transactions"""
+        day = {'format': '%Y-%m-%d', 'date': '$date'}
+        if timezone_name:
+            day['timezone'] = timezone_name
+        
+        pipeline = [
+            {
+                '$match': {
+                    'date': {'$gte': start_date, '$lte': end_date},
+                    'type': {'$in': ['income', 'expense']}
+                }
+            },
+            {
+                '$group': {
+                    '_id': {'day': {'$dateToString': day}, 'type': '$type'},
+                    'total': {'$sum': '$amount'}
+                }
+            }
+        ]
+        
+        return mongo.db.transactions.aggregate(pipeline)
+    
+    @staticmethod
+    def _category_totals(start_date, end_date):
+        """Per-category expense totals straight from transactions"""
+        pipeline = [
+            {
+                '$match': {
+                    'date': {'$gte': start_date, '$lte': end_date},
+                    'type': 'expense'
+                }
+            },
+            {
+                '$group': {
+                    '_id': '$category_id',
+                    'total': {'$sum': '$amount'},
+                    'count': {'$sum': 1},
+                    'avg_amount': {'$avg': '$amount'},
+                    'max_amount': {'$max': '$amount'},
+                    'min_amount': {'$min': '$amount'}
+                }
+            },
+            {
+                '$sort': {'total': -1}
+            }
+        ]
+        
+        return list(mongo.db.transactions.aggregate(pipeline))
\ No newline at end of file
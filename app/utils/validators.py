@@ -46,6 +46,30 @@ def validate_transaction_type(transaction_type):
     valid_types = ['income', 'expense', 'transfer', 'asset_purchase', 'liability_payment', 'credit_card_payment']
     return transaction_type in valid_types
 
+def validate_transaction(data):
+    """Validate a transaction payload; returns a list of error messages"""
+    if not isinstance(data, dict):
+        return ['Transaction must be an object']
+    
+    errors = []
+    for field in ('type', 'amount', 'description'):
+        if data.get(field) in (None, ''):
+            errors.append(f'Missing field: {field}')
+    
+    if data.get('type') and not validate_transaction_type(data['type']):
+        errors.append(f"Invalid transaction type: {data['type']}")
+    if data.get('amount') not in (None, '') and not validate_amount(data['amount']):
+        errors.append('Amount must be a positive number')
+    if data.get('date') and not isinstance(data['date'], datetime) and not validate_date(str(data['date'])):
+        errors.append(f"Invalid date: {data['date']}")
+    for field in ('category_id', 'from_account_id', 'to_account_id'):
+        if data.get(field) and not ObjectId.is_valid(str(data[field])):
+            errors.append(f'Invalid {field}: {data[field]}')
+    if not validate_tags(data.get('tags')):
+        errors.append('Tags must be a list of strings or a comma-separated string')
+    
+    return errors
+
 def validate_budget_period(period):
     """Validate budget period"""
     valid_periods = ['weekly', 'monthly', 'yearly']
@@ -28,14 +28,52 @@ class Config:
     
     # Pagination
     ITEMS_PER_PAGE = 20
+    COUNT_CACHE_TTL = 60  # seconds a filtered total is reused in cursor mode
+    
+    # Ledger: wrap transaction writes in a multi-document transaction (needs a replica set)
+    LEDGER_USE_TRANSACTIONS = os.getenv('LEDGER_USE_TRANSACTIONS', 'false').lower() == 'true'
+    
+    # Bulk transaction ingest
+    BULK_INSERT_CHUNK_SIZE = 1000
+    BULK_MAX_ROWS = int(os.getenv('BULK_MAX_ROWS', 50000))
     
     # Export Settings
-    EXPORT_FORMATS = ['csv', 'json', 'excel']
+    EXPORT_FORMATS = ['csv', 'json', 'ndjson', 'excel']
+    EXPORT_DIR = os.getenv('EXPORT_DIR', os.path.join('backups', 'exports'))
+    EXPORT_JOB_WORKERS = int(os.getenv('EXPORT_JOB_WORKERS', 2))
+    EXPORT_JOB_TTL = int(os.getenv('EXPORT_JOB_TTL', 86400))  # seconds an artifact stays downloadable
+    EXPORT_JOB_PROGRESS_INTERVAL = 1  # seconds between progress writes
+    
+    # Incremental backups: delete records older than this can no longer be replayed
+    TOMBSTONE_TTL_DAYS = int(os.getenv('TOMBSTONE_TTL_DAYS', 90))
+    
+    # Log sink: Log.create queues entries and a background thread batch-inserts them
+    LOG_SINK_ENABLED = os.getenv('LOG_SINK_ENABLED', 'true').lower() == 'true'
+    LOG_SINK_QUEUE_SIZE = int(os.getenv('LOG_SINK_QUEUE_SIZE', 10000))
+    LOG_SINK_BATCH_SIZE = 200
+    LOG_SINK_FLUSH_INTERVAL = float(os.getenv('LOG_SINK_FLUSH_INTERVAL', 1.0))  # seconds
+    LOG_SINK_POLICY = os.getenv('LOG_SINK_POLICY', 'block')  # 'block' or 'drop' when the queue is full
+    LOG_SINK_BLOCK_TIMEOUT = 5.0  # seconds a request waits on a full queue before dropping
+    
+    # Log retention: 'none', 'ttl' (TTL index), 'capped' (capped collection) or 'partitioned' (logs_YYYYMM)
+    LOG_RETENTION_MODE = os.getenv('LOG_RETENTION_MODE', 'none')
+    LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', 90))
+    LOG_CAPPED_SIZE_MB = int(os.getenv('LOG_CAPPED_SIZE_MB', 256))
+    
+    # Search box: 'prefix' (search_prefixes index, ranked; matches word starts only) or
+    # 'regex' (unanchored $regex scan, finds substrings). Both search the same fields.
+    SEARCH_MODE = os.getenv('SEARCH_MODE', 'prefix')
     
     # Cache Settings
     CACHE_TYPE = 'simple'
     CACHE_DEFAULT_TIMEOUT = 300
     
+    # Reference data cache (categories/accounts, per worker process)
+    REFERENCE_CACHE_MAX_SIZE = int(os.getenv('REFERENCE_CACHE_MAX_SIZE', 1000))
+    REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', 300))
+    REFERENCE_CACHE_CHECK_INTERVAL = float(os.getenv('REFERENCE_CACHE_CHECK_INTERVAL', 2))
+    SETTINGS_CACHE_TTL = int(os.getenv('SETTINGS_CACHE_TTL', 30))  # seconds a setting is reused per worker
+    
     # Date Format
     DATE_FORMAT = '%Y-%m-%d'
     DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
@@ -58,6 +96,7 @@ class TestingConfig(Config):
     TESTING = True
     DEBUG = True
     MONGO_DB = 'expense_tracker_test'
+    LOG_SINK_ENABLED = False  # write logs inline so tests can read them back
 
 # Configuration dictionary
 config = {
@@ -0,0 +1,10 @@
+# gunicorn.conf.py
+"""
+Gunicorn server hooks (loaded automatically from the working directory)
+Version: 1.0.0
+"""
+
+def worker_exit(server, worker):
+    """Write queued log entries before the worker exits"""
+    from app.models import log_sink
+    log_sink.stop()
@@ -6,11 +6,12 @@ Version: 1.1.0
 import click
 from flask.cli import FlaskGroup
 from app import create_app, mongo
-from app.models import Category, Account, Transaction, Budget, Log
+from app.models import Category, Account, Transaction, Budget, Log, LogStats, DailyRollup, Tombstone, Settings
 from datetime import datetime, timedelta
 import json
 import random
 from bson import ObjectId
+import os
 import sys
 
 app = create_app()
@@ -66,11 +67,17 @@ def create_indexes():
     
     # Transactions indexes
     mongo.db.transactions.create_index('date')
-    mongo.db.transactions.create_index('category_id')
-    mongo.db.transactions.create_index('from_account_id')
-    mongo.db.transactions.create_index('to_account_id')
+    mongo.db.transactions.create_index([('category_id', 1), ('date', -1)])
+    mongo.db.transactions.create_index([('from_account_id', 1), ('date', -1)])
+    mongo.db.transactions.create_index([('to_account_id', 1), ('date', -1)])
     mongo.db.transactions.create_index('type')
     mongo.db.transactions.create_index([('date', -1)])
+    mongo.db.transactions.create_index([('date', -1), ('_id', -1)])
+    mongo.db.transactions.create_index(
+        'import_hash', unique=True,
+        partialFilterExpression={'import_hash': {'$exists': True}}
+    )
+    mongo.db.transactions.create_index('search_prefixes')
     
     # Accounts indexes
     mongo.db.accounts.create_index('name', unique=True)
@@ -88,16 +95,24 @@ def create_indexes():
     mongo.db.budgets.create_index('period')
     mongo.db.budgets.create_index('is_active')
     mongo.db.budgets.create_index([('start_date', 1), ('end_date', 1)])
+    mongo.db.budgets.create_index([('category_id', 1), ('start_date', 1), ('end_date', 1)])
     
     # Logs indexes
-    mongo.db.logs.create_index('timestamp')
-    mongo.db.logs.create_index('level')
-    mongo.db.logs.create_index('category')
-    mongo.db.logs.create_index([('timestamp', -1)])
+    Log.apply_retention()
+    LogStats.create_indexes()
+    
+    # Daily rollups indexes
+    DailyRollup.create_indexes()
     
     # Settings indexes
     mongo.db.settings.create_index('key', unique=True)
     
+    # Export jobs indexes
+    mongo.db.export_jobs.create_index([('status', 1), ('expires_at', 1)])
+    
+    # Tombstones indexes
+    Tombstone.create_indexes()
+    
     click.echo('  ✅ Indexes created')
 
 def create_default_categories():
@@ -201,6 +216,8 @@ def create_default_categories():
             count += 1
             click.echo(f'    ✅ Created: {cat_data["name"]}')
     
+    if count:
+        Category.invalidate_cache()
     click.echo(f'  ✅ Created {count} default categories')
 
 def create_system_settings():
@@ -252,6 +269,8 @@ def create_system_settings():
             count += 1
             click.echo(f'    ✅ Created setting: {setting["key"]}')
     
+    if count:
+        Settings.invalidate_cache()
     click.echo(f'  ✅ Created {count} system settings')
 
 @cli.command('reset-db')
@@ -260,44 +279,91 @@ def reset_db():
     """Reset the database (delete all collections)"""
     click.echo('🔥 Resetting database...')
     
-    collections = ['transactions', 'accounts', 'categories', 'budgets', 'logs', 'settings']
+    collections = ['transactions', 'accounts', 'categories', 'budgets', 'logs', 'log_stats', 'settings', 'daily_rollups']
     for collection in collections:
         result = mongo.db[collection].delete_many({})
         click.echo(f'  ✅ Cleared {collection}: {result.deleted_count} documents')
     
+    # Monthly log partitions (LOG_RETENTION_MODE=partitioned)
+    for name in Log.storage_names():
+        if name != 'logs':
+            mongo.db.drop_collection(name)
+            click.echo(f'  ✅ Dropped {name}')
+    
+    # Make running workers drop their cached categories/accounts
+    Category.invalidate_cache()
+    Category.invalidate_usage_stats()
+    Account.invalidate_cache()
+    Settings.invalidate_cache()
+    
     click.echo('✅ Database reset complete!')
 
+def report_progress(name, count, done=False):
+    """Progress callback for backup/restore"""
+    if done:
+        click.echo(f'  ✅ {name}: {count} documents')
+    else:
+        click.echo(f'  ⏳ {name}: {count} documents...')
+
+def after_restore(collections):
+    """Rebuild indexes, caches and derived data once collections were replaced"""
+    # Indexes are built once over the loaded data instead of per insert
+    from app import init_db_indexes
+    init_db_indexes()
+    click.echo('  ✅ Rebuilt indexes')
+    
+    Category.invalidate_cache()
+    Category.invalidate_usage_stats()
+    Account.invalidate_cache()
+    Settings.invalidate_cache()
+    
+    if 'transactions' in collections:
+        count = DailyRollup.rebuild()
+        click.echo(f'  ✅ Rebuilt {count} daily rollups')
+    
+    if any(name == 'logs' or Log.PARTITION_PATTERN.match(name) for name in collections):
+        LogStats.rebuild()
+        click.echo('  ✅ Rebuilt log counters')
+
 @cli.command('backup')
-def backup_db():
-    """Backup database to JSON file"""
-    click.echo('💾 Creating database backup...')
-    
-    backup_data = {}
-    collections = ['transactions', 'accounts', 'categories', 'budgets', 'logs', 'settings']
-    
-    for collection in collections:
-        cursor = mongo.db[collection].find({})
-        backup_data[collection] = list(cursor)
-        click.echo(f'  ✅ Backed up {collection}: {len(backup_data[collection])} documents')
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'backups/backup_{timestamp}.json'
-    
-    # Ensure backups directory exists
-    import os
-    os.makedirs('backups', exist_ok=True)
-    
-    with open(filename, 'w') as f:
-        json.dump(backup_data, f, default=str, indent=2)
-    
-    click.echo(f'✅ Backup saved to: {filename}')
+@click.option('--output-dir', default='backups', show_default=True, help='Directory backups are written to')
+@click.option('--jobs', default=1, show_default=True, help='Worker processes; large collections are split by _id range')
+@click.option('--since', default=None, help='Previous backup directory (or its manifest.json); exports only what changed since')
+def backup_db(output_dir, jobs, since):
+    """Backup database to gzip'd NDJSON files (Extended JSON)"""
+    from app.utils.backup import create_backup
+    click.echo('💾 Creating incremental backup...' if since else '💾 Creating database backup...')
+    
+    backup_dir, manifest = create_backup(
+        output_dir, progress=report_progress, jobs=jobs, mongo_uri=app.config['MONGO_URI'], since=since
+    )
+    
+    click.echo(f'✅ Backup saved to: {backup_dir}')
 
 @cli.command('restore')
 @click.argument('filename')
-def restore_db(filename):
-    """Restore database from backup file"""
+@click.option('--batch-size', default=1000, show_default=True, help='Documents per insert_many')
+@click.option('--jobs', default=1, show_default=True, help='Worker processes loading shards in parallel')
+def restore_db(filename, batch_size, jobs):
+    """Restore database from a backup directory (an incremental replays its whole chain) or a legacy .json backup"""
     click.echo(f'🔄 Restoring database from: {filename}')
     
+    if os.path.isdir(filename):
+        from app.utils.backup import restore_backup
+        try:
+            manifest = restore_backup(
+                filename, batch_size=batch_size, progress=report_progress,
+                jobs=jobs, mongo_uri=app.config['MONGO_URI']
+            )
+            after_restore(manifest['collections'])
+            click.echo('✅ Database restore complete!')
+        except FileNotFoundError as e:
+            click.echo(f'❌ Backup file not found: {e.filename}')
+        except Exception as e:
+            click.echo(f'❌ Restore failed: {e}')
+            click.echo('   Run the same command again to resume from the last checkpoint')
+        return
+    
     try:
         with open(filename, 'r') as f:
             backup_data = json.load(f)
@@ -318,12 +384,140 @@ def restore_db(filename):
                 result = mongo.db[collection_name].insert_many(documents)
                 click.echo(f'  ✅ Restored {len(result.inserted_ids)} documents to {collection_name}')
         
+        after_restore(backup_data)
+        
         click.echo('✅ Database restore complete!')
     except FileNotFoundError:
         click.echo(f'❌ Backup file not found: {filename}')
     except Exception as e:
         click.echo(f'❌ Restore failed: {e}')
 
+@cli.command('import-statement')
+@click.argument('filename')
+@click.option('--account', 'account_id', required=True, help='Account the statement belongs to')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ofx']), default=None,
+              help='Statement format (default: from the file extension)')
+@click.option('--map', 'mappings', multiple=True, help='Column mapping as field=column, e.g. date="Posted Date"')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per bulk insert')
+def import_statement_command(filename, account_id, file_format, mappings, batch_size):
+    """Import a CSV or OFX bank statement"""
+    from app.utils.importers import import_statement
+    
+    if not Account.get_by_id(account_id):
+        click.echo(f'❌ Account not found: {account_id}')
+        sys.exit(1)
+    
+    if not file_format:
+        file_format = 'ofx' if filename.lower().endswith(('.ofx', '.qfx')) else 'csv'
+    mapping = dict(m.split('=', 1) for m in mappings)
+    
+    click.echo(f'📥 Importing {filename} ({file_format})...')
+    with open(filename, 'r', encoding='utf-8-sig', newline='') as f:
+        stats = import_statement(f, account_id, format=file_format, mapping=mapping, batch_size=batch_size)
+    
+    for error in stats['errors']:
+        click.echo(f'  ⚠️ {error}')
+    click.echo(f"✅ {stats['imported']} imported, {stats['duplicates']} duplicates, "
+               f"{stats['error_count']} errors from {stats['rows']} rows "
+               f"in {stats['seconds']}s ({stats['rows_per_sec']} rows/sec)")
+
+@cli.command('rebuild-rollups')
+def rebuild_rollups():
+    """Recompute daily transaction rollups from scratch"""
+    click.echo('📊 Rebuilding daily rollups...')
+    count = DailyRollup.rebuild()
+    click.echo(f'✅ Rebuilt {count} daily rollups')
+
+@cli.command('rebuild-search-index')
+@click.option('--batch-size', default=1000, show_default=True, help='Documents updated per bulk write')
+@click.option('--missing-only', is_flag=True, help='Only index documents without search_prefixes')
+def rebuild_search_index(batch_size, missing_only):
+    """Recompute the search_prefixes index on transactions and logs"""
+    from app.models import SearchIndex
+    click.echo('🔎 Rebuilding search index...')
+    
+    for name, updated in SearchIndex.backfill(batch_size, missing_only=missing_only).items():
+        click.echo(f'  ✅ {name}: {updated} documents re-indexed')
+    
+    click.echo('✅ Search index rebuilt')
+
+@cli.command('check-budgets')
+@click.option('--fix', is_flag=True, help='Write the recomputed spent amounts back')
+@click.option('--all', 'include_inactive', is_flag=True, help='Include inactive budgets')
+def check_budgets(fix, include_inactive):
+    """Report budgets whose stored spent amount drifted from their transactions"""
+    click.echo('🔍 Checking budget spent amounts...')
+    drifted = Budget.find_drift({} if include_inactive else None)
+    
+    if not drifted:
+        click.echo('✅ All budgets match their transactions')
+        return
+    
+    for row in drifted:
+        click.echo(
+            f"  ⚠️ {row['_id']}: stored {float(row['spent']):.2f}, "
+            f"actual {float(row['actual']):.2f} (drift {float(row['spent']) - float(row['actual']):+.2f})"
+        )
+    
+    if fix:
+        Budget.fix_spent(drifted)
+        click.echo(f'✅ Fixed {len(drifted)} budgets')
+    else:
+        click.echo(f'⚠️ {len(drifted)} budgets drifted; run with --fix to repair')
+
+@cli.command('prune-logs')
+def prune_logs():
+    """Apply the configured log retention (TTL index, capped collection or partition drops)"""
+    click.echo(f'🧹 Applying log retention ({Log.retention_mode})...')
+    dropped = Log.apply_retention()
+    if dropped:
+        click.echo(f'  ✅ Dropped {dropped} expired log partitions')
+        LogStats.rebuild()
+    click.echo('✅ Log retention applied')
+
+@cli.command('rebuild-log-stats')
+def rebuild_log_stats():
+    """Recompute the log summary counters from the stored logs"""
+    click.echo('📊 Rebuilding log counters...')
+    total = LogStats.rebuild()
+    click.echo(f'✅ Counted {total} log entries')
+
+@cli.command('index-audit')
+@click.option('--apply', 'apply_indexes', is_flag=True, help='Create the suggested indexes')
+@click.option('--format', 'output_format', type=click.Choice(['text', 'json']), default='text', show_default=True)
+@click.option('--output', default=None, help='Write the report to a file (diff it across releases)')
+def index_audit(apply_indexes, output_format, output):
+    """Explain every known query shape; flag COLLSCANs, in-memory sorts and redundant indexes"""
+    from app.utils.index_audit import audit_indexes, apply_suggestions, format_report
+    report = audit_indexes(mongo.db)
+    
+    if output_format == 'json':
+        text = json.dumps(report, indent=2, sort_keys=True)
+    else:
+        text = format_report(report)
+    
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+        click.echo(f'📝 Report written to {output}')
+    else:
+        click.echo(text)
+    
+    flagged = sum(1 for entry in report['queries'] if entry['issues'])
+    click.echo(f'🔍 {len(report["queries"])} query shapes, {flagged} flagged, '
+               f'{len(report["suggestions"])} suggested indexes')
+    
+    if apply_indexes and report['suggestions']:
+        for name in apply_suggestions(mongo.db, report):
+            click.echo(f'  ✅ Created {name}')
+
+@cli.command('cleanup-exports')
+def cleanup_exports():
+    """Delete expired background export artifacts"""
+    from app.utils.export_jobs import cleanup_expired
+    removed = cleanup_expired()
+    click.echo(f'🧹 Removed {removed} expired export files')
+
 @cli.command('export-categories')
 def export_categories():
     """Export categories to CSV"""
@@ -357,7 +551,7 @@ def show_stats():
         'Categories': mongo.db.categories.count_documents({'is_deleted': False}),
         'Transactions': mongo.db.transactions.count_documents({}),
         'Budgets': mongo.db.budgets.count_documents({'is_active': True}),
-        'Logs': mongo.db.logs.count_documents({})
+        'Logs': Log.count({})
     }
     
     for name, count in stats.items():
@@ -399,6 +593,8 @@ def update_settings():
         else:
             click.echo(f'  ⏭️  Skipped: {setting["key"]} already exists')
     
+    if count:
+        Settings.invalidate_cache()
     click.echo(f'✅ Added {count} new settings')
 
 if __name__ == '__main__':
@@ -8,7 +8,7 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app import create_app, mongo
-from app.models import Account, Category, Transaction, Budget
+from app.models import Account, Category, Transaction, Budget, DailyRollup
 from datetime import datetime, timedelta
 import random
 from bson import ObjectId
@@ -27,6 +27,7 @@ def create_test_data():
         mongo.db.accounts.delete_many({})
         mongo.db.transactions.delete_many({})
         mongo.db.budgets.delete_many({})
+        mongo.db.daily_rollups.delete_many({})
         
         # 1. CREATE ACCOUNTS
         print("\n🏦 Creating test accounts...")
@@ -39,6 +40,7 @@ def create_test_data():
         # 3. CREATE TRANSACTIONS
         print("\n💳 Creating test transactions...")
         transactions = create_transactions(account_objects, categories)
+        print(f"  ✅ Rebuilt {DailyRollup.rebuild()} daily rollups")
         
         # 4. CREATE BUDGETS
         print("\n🎯 Creating test budgets...")
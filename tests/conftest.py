@@ -1,5 +1,8 @@
 # tests/conftest.py
+import os
+import uuid
 import pytest
+import pymongo
 from app import create_app
 from app import mongo
 import mongomock
@@ -15,6 +18,22 @@ def app():
             mongo.db = mongomock.MongoClient().db
             yield app
 
+@pytest.fixture
+def mongod_app():
+    """Application on a real, throwaway MongoDB database (for pipelines mongomock can't run)"""
+    uri = os.getenv('TEST_MONGO_URI')
+    if not uri:
+        pytest.skip('needs a real mongod: set TEST_MONGO_URI')
+    
+    app = create_app('testing')
+    client = pymongo.MongoClient(uri)
+    name = f'expense_tracker_test_{uuid.uuid4().hex[:8]}'
+    with app.app_context():
+        mongo.db = client[name]
+        yield app
+    client.drop_database(name)
+    client.close()
+
 @pytest.fixture
 def client(app):
     """Create test client"""
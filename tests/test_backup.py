@@ -0,0 +1,118 @@
+# tests/test_backup.py
+import os
+from datetime import datetime
+from bson import ObjectId
+
+def test_backup_round_trip_keeps_types_and_resumes(app, tmp_path):
+    """Test NDJSON backups keep ObjectId/datetime types and restore resumes from a checkpoint"""
+    from app import mongo
+    from app.utils.backup import create_backup, restore_backup, write_json, file_checksum, CHECKPOINT_NAME
+    account_id = ObjectId()
+    mongo.db.transactions.insert_many([
+        {'type': 'expense', 'amount': 1.5 * i, 'date': datetime(2024, 1, 1 + i), 'account': account_id}
+        for i in range(5)
+    ])
+    originals = list(mongo.db.transactions.find().sort('_id', 1))
+
+    backup_dir, manifest = create_backup(str(tmp_path), collections=['transactions'])
+    assert manifest['collections']['transactions']['count'] == 5
+    shard = manifest['collections']['transactions']['shards'][0]
+    assert shard['sha256'] == file_checksum(os.path.join(backup_dir, shard['file']))
+
+    # Simulate a crash after the first two documents were restored
+    mongo.db.transactions.delete_many({'_id': {'$nin': [d['_id'] for d in originals[:2]]}})
+    write_json(os.path.join(backup_dir, CHECKPOINT_NAME), {'prepared': ['transactions'], 'done': []})
+    write_json(os.path.join(backup_dir, f".restore_{shard['file']}.json"), {'lines': 2})
+
+    restore_backup(backup_dir, batch_size=2)
+
+    assert list(mongo.db.transactions.find().sort('_id', 1)) == originals
+    assert isinstance(originals[0]['account'], ObjectId)
+    assert not os.path.exists(os.path.join(backup_dir, CHECKPOINT_NAME))
+
+def test_incremental_backup_exports_changes_and_tombstones(app, tmp_path):
+    """Test an incremental backup holds only documents written since its base, plus deletes"""
+    import gzip
+    import json
+    import time
+    from app import mongo
+    from app.models import Transaction
+    from app.utils.backup import create_backup, resolve_chain, MANIFEST_NAME
+    deleted_id = Transaction.create({'type': 'expense', 'amount': 5.0, 'date': datetime(2024, 1, 1)})
+    Transaction.create({'type': 'expense', 'amount': 6.0, 'date': datetime(2024, 1, 2)})
+    mongo.db.transactions.update_many({}, {'$set': {'created_at': datetime(2000, 1, 1), 'updated_at': datetime(2000, 1, 1)}})
+
+    base_dir, _ = create_backup(str(tmp_path), collections=['transactions'])
+    # Pin the base watermark between the old writes and the ones below
+    manifest_path = os.path.join(base_dir, MANIFEST_NAME)
+    with open(manifest_path) as f:
+        base_manifest = json.load(f)
+    base_manifest['started_at'] = datetime(2020, 1, 1).isoformat()
+    with open(manifest_path, 'w') as f:
+        json.dump(base_manifest, f)
+
+    Transaction.delete(deleted_id)
+    Transaction.create({'type': 'income', 'amount': 9.0, 'date': datetime(2024, 1, 3)})
+    time.sleep(1)  # backup directories are named by the second
+
+    inc_dir, manifest = create_backup(str(tmp_path), collections=['transactions'], since=base_dir)
+
+    assert manifest['type'] == 'incremental'
+    assert manifest['base'] == os.path.basename(base_dir)
+    assert manifest['collections']['transactions']['count'] == 1
+    assert manifest['collections']['tombstones']['count'] == 1
+    with gzip.open(os.path.join(inc_dir, manifest['collections']['tombstones']['shards'][0]['file']), 'rt') as f:
+        assert deleted_id in f.read()
+    assert resolve_chain(inc_dir) == [base_dir, inc_dir]
+
+def test_full_restore_drops_log_partitions_missing_from_backup(app, tmp_path):
+    """Test restoring a backup with logs drops every log partition, including ones created after it"""
+    from app import mongo
+    from app.models import Log
+    from app.utils.backup import create_backup, restore_backup
+    Log.configure_retention('partitioned')
+    try:
+        Log.write_batch([
+            {'level': 'INFO', 'message': 'january', 'timestamp': datetime(2024, 1, 10)},
+            {'level': 'INFO', 'message': 'february', 'timestamp': datetime(2024, 2, 10)},
+        ])
+        backup_dir, _ = create_backup(str(tmp_path), collections=['logs'])
+
+        Log.write_batch([{'level': 'INFO', 'message': 'march', 'timestamp': datetime(2024, 3, 10)}])
+        assert Log.storage_names() == ['logs_202401', 'logs_202402', 'logs_202403']
+
+        restore_backup(backup_dir)
+
+        assert Log.storage_names() == ['logs_202401', 'logs_202402']
+        assert sorted(log['message'] for name in Log.storage_names() for log in mongo.db[name].find()) == ['february', 'january']
+    finally:
+        Log.configure_retention('none')
+
+def test_incremental_restore_replays_log_clears(app, tmp_path):
+    """Test logs cleared after a full backup stay cleared when the backup chain is restored"""
+    import time
+    from app import mongo
+    from app.models import Log, Tombstone
+    from app.utils.backup import create_backup, restore_backup
+    Log.configure_retention('partitioned')
+    try:
+        Log.write_batch([
+            {'level': 'INFO', 'message': 'january', 'timestamp': datetime(2024, 1, 10)},
+            {'level': 'INFO', 'message': 'early february', 'timestamp': datetime(2024, 2, 5)},
+            {'level': 'INFO', 'message': 'late february', 'timestamp': datetime(2024, 2, 25)},
+        ])
+        base_dir, _ = create_backup(str(tmp_path), collections=['logs'])
+
+        # One range tombstone for the whole clear, not one per entry
+        assert Log.delete_before(datetime(2024, 2, 15)) == 2
+        assert Tombstone.collection.count_documents({'collection': 'logs', 'before': datetime(2024, 2, 15)}) == 1
+        time.sleep(1)  # backup directories are named by the second
+        inc_dir, manifest = create_backup(str(tmp_path), collections=['logs'], since=base_dir)
+        assert manifest['collections']['tombstones']['count'] == 1
+
+        restore_backup(inc_dir)
+
+        assert Log.storage_names() == ['logs_202402']
+        assert [log['message'] for log in mongo.db.logs_202402.find()] == ['late february']
+    finally:
+        Log.configure_retention('none')
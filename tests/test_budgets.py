@@ -0,0 +1,81 @@
+# tests/test_budgets.py
+import pytest
+from datetime import datetime
+from bson import ObjectId
+
+def test_budget_spent_follows_transaction_writes(mongod_app):
+    """Test create, update and delete keep `spent` equal to compute_spent, for datetime and ISO-string budgets"""
+    from app.models import Budget, Transaction
+    category_id = str(ObjectId())
+    budget_id = ObjectId(Budget.create({
+        'category_id': category_id, 'amount': 500.0, 'period': 'monthly',
+        'start_date': '2024-03-01T00:00:00', 'end_date': '2024-03-31T23:59:59'
+    }))
+    # Saved before budget dates were parsed on write
+    legacy_id = Budget.collection.insert_one({
+        'category_id': category_id, 'amount': 500.0, 'period': 'monthly', 'spent': 0, 'is_active': True,
+        'start_date': '2024-03-01T00:00:00', 'end_date': '2024-03-31T23:59:59'
+    }).inserted_id
+    assert isinstance(Budget.get_by_id(budget_id)['start_date'], datetime)
+
+    def assert_spent(expected):
+        rows = {row['_id']: row for row in Budget.compute_spent()}
+        for _id in (budget_id, legacy_id):
+            assert rows[_id]['spent'] == pytest.approx(rows[_id]['actual'])
+            assert rows[_id]['actual'] == pytest.approx(expected)
+
+    transaction_id = Transaction.create({
+        'type': 'expense', 'amount': 40.0, 'category_id': category_id, 'date': datetime(2024, 3, 5, 12)
+    })
+    assert_spent(40.0)
+
+    Transaction.update(transaction_id, {'amount': 65.0})
+    assert_spent(65.0)
+
+    Transaction.update(transaction_id, {'date': datetime(2024, 4, 2)})
+    assert_spent(0.0)
+
+    Transaction.update(transaction_id, {'date': datetime(2024, 3, 9), 'type': 'credit_card_payment'})
+    assert_spent(65.0)
+
+    Transaction.delete(transaction_id)
+    assert_spent(0.0)
+
+def test_budget_routes_join_category_and_transaction_window(mongod_app):
+    """Test budget_pipeline resolves categories and counts/lists only transactions inside each window"""
+    from app import mongo
+    client = mongod_app.test_client()
+    food = str(mongo.db.categories.insert_one({'name': 'Food', 'type': 'expense'}).inserted_id)
+    other = str(mongo.db.categories.insert_one({'name': 'Travel', 'type': 'expense'}).inserted_id)
+    window = {'start_date': datetime(2024, 3, 1), 'end_date': datetime(2024, 3, 31, 23, 59, 59)}
+    budget_id = mongo.db.budgets.insert_one({
+        'category_id': food, 'amount': 200.0, 'spent': 50.0, 'period': 'monthly', 'is_active': True, **window
+    }).inserted_id
+    mongo.db.budgets.insert_one({
+        'category_id': 'not-an-object-id', 'amount': 100.0, 'spent': 0.0, 'period': 'weekly', 'is_active': True,
+        'start_date': '2024-03-01T00:00:00', 'end_date': '2024-03-31T23:59:59'
+    })
+    mongo.db.transactions.insert_many([
+        {'type': 'expense', 'amount': 20.0, 'category_id': food, 'date': datetime(2024, 3, 2),
+         'description': 'Lunch', 'search_prefixes': ['lu', 'lun', 'lunc', 'lunch', 'lunch$']},
+        {'type': 'expense', 'amount': 30.0, 'category_id': food, 'date': datetime(2024, 3, 20)},
+        {'type': 'expense', 'amount': 99.0, 'category_id': food, 'date': datetime(2024, 4, 1)},
+        {'type': 'expense', 'amount': 15.0, 'category_id': other, 'date': datetime(2024, 3, 5)},
+        {'type': 'expense', 'amount': 5.0, 'category_id': 'not-an-object-id', 'date': datetime(2024, 3, 6)}
+    ])
+
+    response = client.get('/api/v1/budgets/data')
+    assert response.status_code == 200
+    rows = {row['period']: row for row in response.json['data']}
+    assert rows['monthly']['category_name'] == 'Food'
+    assert rows['monthly']['transaction_count'] == 2
+    assert rows['monthly']['progress'] == pytest.approx(25.0)
+    assert rows['weekly']['category_name'] == 'Unknown'
+    assert rows['weekly']['transaction_count'] == 1
+
+    response = client.get(f'/api/v1/budgets/{budget_id}')
+    assert response.status_code == 200
+    budget = response.json['data']
+    assert budget['category_name'] == 'Food'
+    assert [t['amount'] for t in budget['transactions']] == [30.0, 20.0]
+    assert all(t['id'] and '_id' not in t and 'search_prefixes' not in t for t in budget['transactions'])
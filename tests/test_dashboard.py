@@ -0,0 +1,81 @@
+# tests/test_dashboard.py
+import pytest
+from datetime import timedelta
+from bson import ObjectId
+
+def legacy_dashboard(db, start_date, end_date, now):
+    """Previous per-widget queries, kept to check the $facet pipeline against"""
+    totals = {'income': 0.0, 'expense': 0.0}
+    for t in db.transactions.find({'date': {'$gte': start_date, '$lte': end_date}}):
+        if t.get('type') in totals:
+            totals[t['type']] += float(t.get('amount', 0))
+
+    trend = list(db.transactions.aggregate([
+        {'$match': {'date': {'$gte': now - timedelta(days=365), '$lte': now}}},
+        {'$group': {
+            '_id': {'year': {'$year': '$date'}, 'month': {'$month': '$date'}, 'type': '$type'},
+            'total': {'$sum': '$amount'}
+        }}
+    ]))
+
+    breakdown = []
+    for item in db.transactions.aggregate([
+        {'$match': {'date': {'$gte': start_date, '$lte': end_date}, 'type': 'expense'}},
+        {'$group': {'_id': '$category_id', 'total': {'$sum': '$amount'}}},
+        {'$sort': {'total': -1}},
+        {'$limit': 10}
+    ]):
+        category = db.categories.find_one({'_id': ObjectId(item['_id'])}) if ObjectId.is_valid(item['_id'] or '') else None
+        breakdown.append({'category': category['name'] if category else 'Unknown', 'amount': float(item['total'])})
+
+    recent = [t['description'] for t in db.transactions.find().sort('date', -1).limit(5)]
+    budgets = list(db.budgets.find({'is_active': True}))
+    return {
+        'total_income': totals['income'],
+        'total_expense': totals['expense'],
+        'total_balance': sum(float(a.get('balance', 0)) for a in db.accounts.find({'is_active': True})),
+        'total_budget': sum(float(b.get('amount', 0)) for b in budgets),
+        'total_spent': sum(float(b.get('spent', 0)) for b in budgets),
+        'trend': trend,
+        'category_breakdown': breakdown,
+        'recent': recent
+    }
+
+def test_dashboard_facet_matches_per_widget_queries(mongod_app):
+    """Test DashboardEngine.build agrees with the per-widget queries it replaced"""
+    from app import mongo
+    from app.utils.dashboard import DashboardEngine
+    from app.utils.helpers import get_current_utc_time
+    db = mongo.db
+    now = get_current_utc_time()
+    food = str(db.categories.insert_one({'name': 'Food', 'type': 'expense'}).inserted_id)
+    rent = str(db.categories.insert_one({'name': 'Rent', 'type': 'expense'}).inserted_id)
+    db.accounts.insert_many([
+        {'name': 'Wallet', 'balance': 120.0, 'is_active': True},
+        {'name': 'Bank', 'balance': 900.0, 'is_active': True},
+        {'name': 'Closed', 'balance': 50.0, 'is_active': False}
+    ])
+    db.budgets.insert_many([
+        {'category_id': food, 'amount': 300.0, 'spent': 75.0, 'is_active': True},
+        {'category_id': rent, 'amount': 1000.0, 'spent': 1000.0, 'is_active': False}
+    ])
+    rows = []
+    for i in range(40):
+        rows.append({'type': 'expense', 'amount': 5.0 + i, 'description': f'Expense {i}',
+                     'category_id': [food, rent, 'legacy-id'][i % 3], 'date': now - timedelta(days=9 * i, hours=1)})
+    for i in range(12):
+        rows.append({'type': 'income', 'amount': 2000.0, 'description': f'Salary {i}',
+                     'date': now - timedelta(days=30 * i, hours=2)})
+    rows.append({'type': 'transfer', 'amount': 50.0, 'description': 'Transfer', 'date': now - timedelta(days=3)})
+    db.transactions.insert_many(rows)
+
+    start_date, end_date = now - timedelta(days=30), now
+    expected = legacy_dashboard(db, start_date, end_date, now)
+    dashboard = DashboardEngine.build(start_date, end_date)
+
+    for field in ('total_income', 'total_expense', 'total_balance', 'total_budget', 'total_spent'):
+        assert dashboard[field] == pytest.approx(expected[field]), field
+    assert sorted((t['_id']['year'], t['_id']['month'], t['_id']['type'], t['total']) for t in dashboard['monthly_trend']) \
+        == sorted((t['_id']['year'], t['_id']['month'], t['_id']['type'], t['total']) for t in expected['trend'])
+    assert dashboard['category_breakdown'] == expected['category_breakdown']
+    assert [t['description'] for t in dashboard['recent_transactions']] == expected['recent']
@@ -0,0 +1,81 @@
+# tests/test_export.py
+import json
+from datetime import datetime
+
+def test_export_streams_fixed_schema(app, client):
+    """Test CSV and NDJSON exports stream every row with a stable schema"""
+    from app import mongo
+    from app.utils.exporters import export_fields
+    category_id = str(mongo.db.categories.insert_one({'name': 'Food', 'type': 'expense'}).inserted_id)
+    mongo.db.transactions.insert_many([
+        {'type': 'expense', 'amount': 5.0 + i, 'description': f'Row {i}',
+         'category_id': category_id, 'tags': ['a', 'b'], 'date': datetime(2024, 1, 1 + i),
+         'search_prefixes': ['ro', 'row']}
+        for i in range(3)
+    ])
+    # A field from before the fixed schema lands in the extra column
+    mongo.db.transactions.update_one({'description': 'Row 2'}, {'$set': {'reference': 'INV-7'}})
+
+    response = client.get('/api/v1/export/csv?type=transactions')
+    assert response.status_code == 200
+    assert response.is_streamed
+    lines = response.get_data(as_text=True).strip().splitlines()
+    assert lines[0].split(',') == export_fields('transactions')
+    assert len(lines) == 4
+    assert 'Food' in lines[1]
+    assert 'INV-7' in lines[1] and 'INV-7' not in lines[2]
+    assert 'search_prefixes' not in response.get_data(as_text=True)
+
+    response = client.get('/api/v1/export/ndjson?type=transactions')
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['description'] for row in rows] == ['Row 2', 'Row 1', 'Row 0']
+
+def test_excel_export_is_streamed_from_write_only_workbook(app, client):
+    """Test the Excel export has one header row plus one row per document"""
+    import io
+    from openpyxl import load_workbook
+    from app import mongo
+    from app.utils.exporters import export_fields
+    mongo.db.transactions.insert_many([
+        {'type': 'income', 'amount': 100.0 * (i + 1), 'description': f'Pay {i}', 'date': datetime(2024, 2, 1 + i)}
+        for i in range(4)
+    ])
+    mongo.db.transactions.update_one({'description': 'Pay 3'}, {'$set': {'memo': 'bonus'}})
+
+    response = client.get('/api/v1/export/excel?type=transactions')
+    assert response.status_code == 200
+    assert response.is_streamed
+
+    worksheet = load_workbook(io.BytesIO(response.get_data()), read_only=True)['Transactions']
+    rows = list(worksheet.iter_rows(values_only=True))
+    assert list(rows[0]) == export_fields('transactions')
+    assert len(rows) == 5
+    assert rows[1][export_fields('transactions').index('amount')] == 400.0
+    assert json.loads(rows[1][export_fields('transactions').index('extra_fields')]) == {'memo': 'bonus'}
+
+def test_export_job_runs_in_background(app, client, tmp_path):
+    """Test an export job reports progress and serves its artifact"""
+    import time
+    from app import mongo
+    app.config['EXPORT_DIR'] = str(tmp_path)
+    mongo.db.transactions.insert_many([
+        {'type': 'expense', 'amount': 1.0 + i, 'description': f'Job {i}', 'date': datetime(2024, 3, 1)}
+        for i in range(5)
+    ])
+
+    response = client.post('/api/v1/export/jobs', json={'format': 'csv', 'type': 'transactions'})
+    assert response.status_code == 202
+    status_url = response.json['status_url']
+
+    for _ in range(50):
+        job = client.get(status_url).json['data']
+        if job['status'] in ('completed', 'failed'):
+            break
+        time.sleep(0.1)
+    assert job['status'] == 'completed'
+    assert job['progress'] == {'rows_written': 5, 'total_estimate': 5, 'percent': 100.0}
+
+    download = client.get(response.json['download_url'])
+    assert download.status_code == 200
+    assert len(download.get_data(as_text=True).strip().splitlines()) == 6
+    download.close()
@@ -0,0 +1,30 @@
+# tests/test_index_audit.py
+import mongomock
+
+def test_index_suggestions_plan_stages_and_redundant_indexes():
+    """Test ESR index suggestions, plan flattening and redundant index detection"""
+    from app.utils.index_audit import suggest_indexes, plan_stages, collection_indexes, redundant_indexes
+
+    # Equality, then sort, then range; $or gets one index per branch
+    assert suggest_indexes({'level': 'ERROR', 'timestamp': {'$gte': 1}}, [('timestamp', -1)]) == [
+        [('level', 1), ('timestamp', -1)]
+    ]
+    assert suggest_indexes({'category_id': 'c', 'date': {'$gte': 1}, 'type': {'$in': ['expense']}}) == [
+        [('category_id', 1), ('type', 1), ('date', 1)]
+    ]
+    assert suggest_indexes({'$or': [{'from_account_id': 'a'}, {'to_account_id': 'a'}]}, [('date', -1)]) == [
+        [('from_account_id', 1), ('date', -1)], [('to_account_id', 1), ('date', -1)]
+    ]
+
+    plan = {'stage': 'SORT', 'inputStage': {'stage': 'FETCH', 'inputStage': {
+        'stage': 'OR', 'inputStages': [{'stage': 'IXSCAN', 'indexName': 'a_1'}, {'stage': 'COLLSCAN'}]
+    }}}
+    assert sorted(stage['stage'] for stage in plan_stages(plan)) == ['COLLSCAN', 'FETCH', 'IXSCAN', 'OR', 'SORT']
+
+    collection = mongomock.MongoClient().db.transactions
+    collection.create_index([('date', -1), ('_id', -1)])
+    collection.create_index([('date', -1)])
+    collection.create_index('name', unique=True)
+    assert redundant_indexes(collection_indexes(collection)) == [
+        {'index': 'date_-1', 'covered_by': 'date_-1__id_-1'}
+    ]
@@ -0,0 +1,127 @@
+# tests/test_logs.py
+import threading
+
+def test_log_sink_batches_and_drops_when_full():
+    """Test the log sink writes in batches and the drop policy sheds load on a full queue"""
+    from app.models import LogSink
+    batches = []
+    release = threading.Event()
+
+    def write(batch):
+        release.wait(5)
+        batches.append(list(batch))
+
+    sink = LogSink(write)
+    sink.configure(max_size=3, batch_size=2, flush_interval=0.05, policy='drop')
+    assert sink.ensure_started()
+
+    results = [sink.emit({'n': i}) for i in range(10)]
+    release.set()
+    sink.stop()
+
+    written = [doc['n'] for batch in batches for doc in batch]
+    assert all(len(batch) <= 2 for batch in batches)
+    assert results.count(False) == sink.dropped > 0
+    assert len(written) + sink.dropped == 10
+    assert written == sorted(written)
+
+def test_partitioned_logs_route_by_month_and_clear_by_dropping(app):
+    """Test monthly log partitions: writes land per month, reads span them, clearing drops old months"""
+    from datetime import datetime
+    from app import mongo
+    from app.models import Log
+    Log.configure_retention('partitioned')
+    try:
+        Log.write_batch([
+            {'level': 'ERROR', 'message': 'a', 'timestamp': datetime(2024, 1, 10)},
+            {'level': 'INFO', 'message': 'b', 'timestamp': datetime(2024, 1, 20)},
+            {'level': 'ERROR', 'message': 'c', 'timestamp': datetime(2024, 3, 5)},
+        ])
+
+        assert Log.storage_names() == ['logs_202401', 'logs_202403']
+        assert Log.count({'level': 'ERROR'}) == 2
+        assert Log.names_for({'timestamp': {'$gte': datetime(2024, 2, 1)}}) == ['logs_202403']
+        assert Log.find_one({'message': 'c'})['level'] == 'ERROR'
+
+        assert Log.delete_before(datetime(2024, 3, 1)) == 2
+        assert 'logs_202401' not in mongo.db.list_collection_names()
+        assert Log.count() == 1
+    finally:
+        Log.configure_retention('none')
+
+def test_log_stats_counters_and_frequent_errors(client, monkeypatch):
+    """Test summary endpoints are served from write-path counters and the space-saving sketch"""
+    from datetime import datetime
+    from app.models import Log, LogStats
+    LogStats.rebuild()  # counters built; from here on only the write path updates them
+    for message in ['Timeout'] * 3 + ['Bad input'] * 2:
+        Log.create({'level': 'ERROR', 'category': 'API', 'message': message})
+    Log.create({'level': 'INFO', 'category': 'ACCOUNT', 'message': 'Account created'})
+
+    data = client.get('/api/v1/logs/summary').get_json()['data']
+    assert data['today'] == 6
+    assert data['by_level'] == {'ERROR': 5, 'INFO': 1}
+    assert data['by_category'] == {'API': 5, 'ACCOUNT': 1}
+
+    errors = client.get('/api/v1/errors/summary').get_json()['data']
+    assert errors['total_errors'] == errors['errors_today'] == 5
+    assert errors['by_category'] == [{'_id': 'API', 'count': 5}]
+    assert [(e['_id'], e['count']) for e in errors['frequent_errors']] == [('Timeout', 3), ('Bad input', 2)]
+
+    # A full sketch evicts its smallest counter; the newcomer inherits it as error
+    now = datetime.now()
+    items = LogStats.space_saving([], {'a': (5, now), 'b': (1, now)})
+    monkeypatch.setattr(LogStats, 'FREQUENT_CAPACITY', 2)
+    items = LogStats.space_saving(items, {'c': (1, now)})
+    assert [(i['message'], i['count'], i['error']) for i in items] == [('a', 5, 0), ('c', 2, 1)]
+
+    assert LogStats.rebuild() == 6
+    assert LogStats.summary()['error_categories'] == {'API': 5}
+
+def test_log_stats_follow_retention_when_logs_expire(client):
+    """Test totals and frequent errors only count stored logs when retention removes entries silently"""
+    from datetime import datetime, timedelta
+    from app.models import Log, LogStats
+    Log.configure_retention('ttl', 30)
+    try:
+        LogStats.rebuild()
+        now = datetime.now()
+        old = now - timedelta(days=5)
+        Log.write_batch([
+            {'level': 'ERROR', 'category': 'API', 'message': 'Expired', 'timestamp': old},
+            {'level': 'INFO', 'category': 'API', 'message': 'Expired too', 'timestamp': old},
+            {'level': 'ERROR', 'category': 'DB', 'message': 'Current', 'timestamp': now},
+        ])
+        # What the TTL monitor does: entries vanish without going through the app
+        Log.collection.delete_many({'timestamp': old})
+
+        stats = LogStats.summary()
+        assert stats['total'] == 1
+        assert stats['levels'] == {'ERROR': 1}
+        assert stats['error_categories'] == {'DB': 1}
+        assert [item['message'] for item in stats['frequent_errors']] == ['Current']
+
+        data = client.get('/api/v1/logs/summary').get_json()['data']
+        assert data['total'] == data['this_month'] == 1
+
+        assert LogStats.rebuild() == 1
+        assert LogStats.summary()['levels'] == {'ERROR': 1}
+    finally:
+        Log.configure_retention('none')
+
+def test_log_stats_count_logs_stored_before_they_were_built(client):
+    """Test an upgraded deployment's existing logs are counted without a manual rebuild"""
+    from datetime import datetime
+    from app import mongo
+    from app.models import LogStats
+    mongo.db.logs.insert_many([
+        {'level': 'ERROR', 'category': 'API', 'message': 'Old failure', 'timestamp': datetime.now()},
+        {'level': 'INFO', 'category': 'API', 'message': 'Old entry', 'timestamp': datetime.now()}
+    ])
+    assert not LogStats.is_built()
+
+    data = client.get('/api/v1/logs/summary').get_json()['data']
+    assert data['total'] == data['today'] == 2
+    assert data['by_level'] == {'ERROR': 1, 'INFO': 1}
+    assert LogStats.is_built()
+    assert LogStats.ensure_built() is False
@@ -0,0 +1,121 @@
+# tests/test_reports.py
+import pytest
+import mongomock
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+def legacy_income_statement(db, start_date, end_date):
+    """Previous in-memory implementation, kept to check the aggregation against"""
+    income_by_category = defaultdict(float)
+    expenses_by_category = defaultdict(float)
+    for t in db.transactions.find({'date': {'$gte': start_date, '$lte': end_date}, 'type': 'income'}):
+        income_by_category[t['category_id']] += t['amount']
+    for t in db.transactions.find({'date': {'$gte': start_date, '$lte': end_date}, 'type': 'expense'}):
+        expenses_by_category[t['category_id']] += t['amount']
+    return income_by_category, expenses_by_category
+
+def legacy_cash_flow(db, start_date, end_date):
+    """Previous in-memory implementation, kept to check the aggregation against"""
+    daily_flow = defaultdict(lambda: {'inflow': 0, 'outflow': 0, 'net': 0})
+    for t in db.transactions.find({'date': {'$gte': start_date, '$lte': end_date}}).sort('date', 1):
+        date_str = t['date'].strftime('%Y-%m-%d')
+        if t['type'] == 'income':
+            daily_flow[date_str]['inflow'] += t['amount']
+            daily_flow[date_str]['net'] += t['amount']
+        elif t['type'] == 'expense':
+            daily_flow[date_str]['outflow'] += t['amount']
+            daily_flow[date_str]['net'] -= t['amount']
+    return [{'date': date, **data} for date, data in sorted(daily_flow.items())]
+
+@pytest.fixture
+def report_data(app):
+    """A few days of mixed transactions, including transfers"""
+    from app import mongo
+    food = str(mongo.db.categories.insert_one({'name': 'Food', 'type': 'expense'}).inserted_id)
+    salary = str(mongo.db.categories.insert_one({'name': 'Salary', 'type': 'income'}).inserted_id)
+    base = datetime(2024, 3, 1, 9, 30)
+    rows = []
+    for i in range(12):
+        rows.append({'type': 'expense', 'amount': 10.0 + i, 'category_id': food, 'date': base + timedelta(hours=7 * i)})
+        rows.append({'type': 'transfer', 'amount': 99.0, 'date': base + timedelta(hours=5 * i)})
+    rows.append({'type': 'income', 'amount': 2500.0, 'category_id': salary, 'date': base + timedelta(days=1)})
+    rows.append({'type': 'income', 'amount': 120.0, 'category_id': salary, 'date': base + timedelta(days=2)})
+    mongo.db.transactions.insert_many(rows)
+    return mongo.db, base - timedelta(hours=1), base + timedelta(days=5)
+
+def test_income_statement_matches_legacy(report_data):
+    """Test the aggregated income statement agrees with the in-memory version"""
+    from app.utils.reports import ReportGenerator
+    db, start_date, end_date = report_data
+    income, expenses = legacy_income_statement(db, start_date, end_date)
+
+    report = ReportGenerator.generate_income_statement(start_date, end_date)
+
+    assert report['income']['total'] == pytest.approx(sum(income.values()))
+    assert report['expenses']['total'] == pytest.approx(sum(expenses.values()))
+    assert report['net_income'] == pytest.approx(sum(income.values()) - sum(expenses.values()))
+    assert {c['category']: c['amount'] for c in report['income']['by_category']} == {'Salary': 2620.0}
+    assert {c['category']: c['amount'] for c in report['expenses']['by_category']} == {'Food': pytest.approx(sum(expenses.values()))}
+
+def test_cash_flow_matches_legacy(report_data):
+    """Test the aggregated cash flow agrees with the in-memory version"""
+    from app.utils.reports import ReportGenerator
+    db, start_date, end_date = report_data
+    expected = legacy_cash_flow(db, start_date, end_date)
+
+    report = ReportGenerator.generate_cash_flow(start_date, end_date)
+
+    assert report['daily'] == expected
+    assert report['summary']['net_cash_flow'] == pytest.approx(sum(d['net'] for d in expected))
+
+def test_rollup_bounds_recomputed_when_transactions_removed(app, monkeypatch):
+    """Test removing a bucket's largest amount tightens max, and a failed update marks rollups stale"""
+    from app import mongo
+    from app.models import DailyRollup, Settings
+    day = datetime(2024, 3, 1)
+    rows = [{'type': 'expense', 'amount': amount, 'category_id': 'food', 'from_account_id': 'cash',
+             'date': day + timedelta(hours=i)} for i, amount in enumerate([5.0, 20.0, 80.0])]
+    mongo.db.transactions.insert_many(rows)
+    key = DailyRollup.key_of(rows[0])
+    mongo.db.daily_rollups.insert_one({**key, 'sum': 105.0, 'count': 3, 'min': 5.0, 'max': 80.0})
+
+    mongo.db.transactions.delete_one({'_id': rows[2]['_id']})
+    DailyRollup.refresh_bounds([key])
+
+    rollup = mongo.db.daily_rollups.find_one(key)
+    assert (rollup['min'], rollup['max']) == (5.0, 20.0)
+
+    # An emptied bucket drops its bounds instead of keeping stale ones
+    mongo.db.transactions.delete_many({})
+    DailyRollup.refresh_bounds([key])
+    rollup = mongo.db.daily_rollups.find_one(key)
+    assert 'min' not in rollup and 'max' not in rollup
+
+    class WriteFailed(Exception):
+        pass
+
+    def fail(*args, **kwargs):
+        raise WriteFailed()
+    # mongomock supports neither sessions nor UpdateOne in bulk_write
+    monkeypatch.setattr(mongomock.collection.Collection, 'bulk_write', lambda self, *args, **kwargs: None)
+    monkeypatch.setattr(DailyRollup, 'refresh_bounds', fail)
+    Settings.set('rollups_built_at', datetime.now())
+    assert DailyRollup.covers(day, day + timedelta(days=1, microseconds=-1))
+
+    with pytest.raises(WriteFailed):
+        DailyRollup.apply([rows[1]], -1, session=object())
+    assert DailyRollup.is_ready()
+    DailyRollup.apply([rows[1]], -1)
+    assert not DailyRollup.covers(day, day + timedelta(days=1, microseconds=-1))
+
+def test_rollup_bucket_emptied_then_refilled_reports_new_bounds(mongod_app):
+    """Test deleting a bucket's only transaction, then adding a new one, leaves min/max from the new amount only"""
+    from app.models import DailyRollup, Transaction
+    category_id = 'c' * 24
+    date = datetime(2024, 3, 1, 12)
+    transaction_id = Transaction.create({'type': 'expense', 'amount': 90.0, 'category_id': category_id, 'date': date})
+    Transaction.delete(transaction_id)
+    Transaction.create({'type': 'expense', 'amount': 30.0, 'category_id': category_id, 'date': date})
+
+    rollup = DailyRollup.collection.find_one({'day': datetime(2024, 3, 1), 'category_id': category_id})
+    assert (rollup['count'], rollup['sum'], rollup['min'], rollup['max']) == (1, 30.0, 30.0, 30.0)
@@ -0,0 +1,17 @@
+# tests/test_settings.py
+
+def test_settings_get_many_is_cached_and_invalidated_on_set(app):
+    """Test Settings.get_many fills defaults, serves the cache and sees Settings.set"""
+    from app import mongo
+    from app.models import Settings
+    Settings.set('currency', 'EUR')
+
+    values = Settings.get_many({'currency': 'USD', 'theme': 'light'})
+    assert values == {'currency': 'EUR', 'theme': 'light'}
+
+    # Served from the cache: a write that bypasses Settings.set isn't seen yet
+    mongo.db.settings.update_one({'key': 'currency'}, {'$set': {'value': 'GBP'}})
+    assert Settings.get('currency') == 'EUR'
+
+    Settings.set('currency', 'INR')
+    assert Settings.get_many({'currency': 'USD'}) == {'currency': 'INR'}
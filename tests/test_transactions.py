@@ -25,4 +25,213 @@ def test_invalid_transaction(client):
         'amount': -50.00
     })
     assert response.status_code == 400
-    assert response.json['success'] == False
\ No newline at end of file
+    assert response.json['success'] == False
+def test_transactions_data_resolves_reference_names(app, client):
+    """Test category and account names are attached to listed transactions"""
+    from app import mongo
+    category_id = str(mongo.db.categories.insert_one({'name': 'Food', 'type': 'expense'}).inserted_id)
+    account_id = str(mongo.db.accounts.insert_one({'name': 'Wallet', 'balance': 0}).inserted_id)
+    mongo.db.transactions.insert_many([
+        {'type': 'expense', 'amount': 10.0, 'description': 'Lunch', 'date': datetime.now(),
+         'category_id': category_id, 'from_account_id': account_id},
+        {'type': 'expense', 'amount': 5.0, 'description': 'Orphan', 'date': datetime.now(),
+         'category_id': 'missing'}
+    ])
+
+    response = client.get('/api/v1/transactions/data')
+    assert response.status_code == 200
+    rows = {row['description']: row for row in response.json['data']}
+    assert rows['Lunch']['category_name'] == 'Food'
+    assert rows['Lunch']['from_account_name'] == 'Wallet'
+    assert rows['Orphan']['category_name'] == 'Unknown'
+
+def test_transactions_cursor_pagination(app, client):
+    """Test keyset pagination walks every transaction exactly once"""
+    from app import mongo
+    same_time = datetime(2026, 1, 15, 12, 0)
+    mongo.db.transactions.insert_many([
+        {'type': 'expense', 'amount': float(i + 1), 'description': f'Item {i}', 'date': same_time if i % 2 else datetime(2026, 1, i + 1)}
+        for i in range(5)
+    ])
+    # Rows without a date sort last and must still be reached
+    mongo.db.transactions.insert_many([
+        {'type': 'expense', 'amount': 6.0, 'description': 'Item 5', 'date': None},
+        {'type': 'expense', 'amount': 7.0, 'description': 'Item 6'},
+        {'type': 'expense', 'amount': 8.0, 'description': 'Item 7'}
+    ])
+
+    seen = []
+    after = ''
+    while after is not None:
+        response = client.get(f'/api/v1/transactions?per_page=2&after={after}')
+        assert response.status_code == 200
+        seen.extend(row['description'] for row in response.json['data'])
+        after = response.json['pagination']['next_cursor']
+
+    assert sorted(seen) == [f'Item {i}' for i in range(8)]
+    assert len(seen) == 8
+    assert response.json['pagination']['total'] == 8
+
+    response = client.get('/api/v1/transactions?after=not-a-cursor')
+    assert response.status_code == 400
+
+def test_ledger_balance_deltas_reverse_on_update():
+    """Test balance deltas for a transaction edit net out the old values"""
+    from app.utils.ledger import balance_deltas, merge_deltas
+    old = {'type': 'transfer', 'amount': 40.0, 'from_account_id': 'a', 'to_account_id': 'b'}
+    new = {**old, 'type': 'expense', 'amount': 25.0}
+
+    assert balance_deltas(old) == {'a': -40.0, 'b': 40.0}
+    assert merge_deltas(balance_deltas(old, sign=-1), balance_deltas(new)) == {'a': 15.0, 'b': -40.0}
+
+def test_bulk_create_transactions_reports_row_errors(app, client):
+    """Test bulk ingest inserts valid rows and reports invalid ones by index"""
+    from app import mongo
+    body = '\n'.join([
+        '{"type": "expense", "amount": 12.5, "description": "Coffee", "date": "2024-01-15"}',
+        '{"type": "expense", "amount": -3, "description": "Negative"}',
+        'not json',
+        '{"type": "income", "amount": "2500", "description": "Salary"}'
+    ])
+
+    response = client.post('/api/v1/transactions/bulk', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 207
+    assert response.json['created'] == 2
+    assert [e['index'] for e in response.json['errors']] == [1, 2]
+    assert mongo.db.transactions.count_documents({}) == 2
+    assert mongo.db.logs.count_documents({'details.created': 2}) == 1
+
+    body = '[{"type": "expense", "amount": 4, "description": "Tea"}, 42, null, ["expense"]]'
+    response = client.post('/api/v1/transactions/bulk', data=body, content_type='application/json')
+    assert response.status_code == 207
+    assert [e['index'] for e in response.json['errors']] == [1, 2, 3]
+    assert response.json['errors'][0]['errors'] == ['Transaction must be an object']
+
+    response = client.post('/api/v1/transactions/bulk', data='[{"type": ', content_type='application/json')
+    assert response.status_code == 400
+    assert response.json['error'].startswith('Invalid JSON body')
+
+def test_statement_rows_parse_and_hash_stably(app):
+    """Test OFX/CSV statement rows map to transactions with matching dedup hashes"""
+    import io
+    from app.utils.importers import iter_csv_rows, iter_ofx_rows, build_transaction
+    ofx = io.StringIO(
+        "<OFX><BANKTRANLIST>\n<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20240115120000\n"
+        "<TRNAMT>-12.50\n<FITID>F1\n<NAME>Coffee Shop\n</STMTTRN>\n</BANKTRANLIST></OFX>\n"
+    )
+    csv_rows = io.StringIO('Posted,Details,Amount\n2024-01-15,Coffee  shop,"($12.50)"\n2024-01-15,coffee shop,-12.50\n')
+    account_id = '64a1b2c3d4e5f67890123456'
+
+    [ofx_row] = list(iter_ofx_rows(ofx))
+    ofx_txn = build_transaction(ofx_row, account_id)
+    assert (ofx_txn['type'], ofx_txn['amount'], ofx_txn['from_account_id']) == ('expense', 12.5, account_id)
+
+    first, second = [
+        build_transaction(row, account_id)
+        for row in iter_csv_rows(csv_rows, {'date': 'Posted', 'description': 'Details', 'amount': 'Amount'})
+    ]
+    assert first['import_hash'] == second['import_hash']
+    assert first['import_hash'] != ofx_txn['import_hash']
+
+def test_statement_import_keeps_identical_same_day_rows(app, monkeypatch):
+    """Test two identical same-day charges are both imported, and re-importing the statement adds nothing"""
+    import io
+    import mongomock
+    from app import mongo
+    from types import SimpleNamespace
+    # Balance/rollup bulk updates aren't under test (mongomock can't run UpdateOne in bulk_write)
+    monkeypatch.setattr(mongomock.collection.Collection, 'bulk_write',
+                        lambda self, operations, **kwargs: SimpleNamespace(modified_count=len(operations)))
+    from app.utils.importers import import_statement
+    account_id = '64a1b2c3d4e5f67890123456'
+    statement = 'date,description,amount\n2024-01-15,Coffee,-4.50\n2024-01-15,Coffee,-4.50\n2024-01-16,Coffee,-4.50\n'
+
+    stats = import_statement(io.StringIO(statement), account_id)
+    assert (stats['imported'], stats['duplicates']) == (3, 0)
+
+    stats = import_statement(io.StringIO(statement), account_id)
+    assert (stats['imported'], stats['duplicates']) == (0, 3)
+    assert mongo.db.transactions.count_documents({'description': 'Coffee'}) == 3
+
+def test_category_usage_stats_are_cached_until_a_write(app):
+    """Test category usage stats come from one grouped pass and refresh after a transaction write"""
+    from datetime import datetime
+    from app.models import Category, Transaction
+    Transaction.create({'type': 'expense', 'amount': 10.0, 'category_id': 'cat-a', 'date': datetime(2024, 1, 1)})
+    Transaction.create({'type': 'expense', 'amount': 5.0, 'category_id': 'cat-a', 'date': datetime(2024, 1, 2)})
+
+    stats = Category.get_usage_stats()
+    assert stats['cat-a']['transaction_count'] == 2
+    assert stats['cat-a']['total_amount'] == 15.0
+
+    Transaction.create({'type': 'expense', 'amount': 1.0, 'category_id': 'cat-a', 'date': datetime(2024, 1, 3)})
+    assert Category.get_usage_stats()['cat-a']['transaction_count'] == 3
+
+def test_prefix_search_ranks_whole_words_and_falls_back_to_regex(app, client):
+    """Test description search uses the prefix index, ranks whole words first, and keeps regex patterns"""
+    from app.models import Transaction, SearchIndex
+    SearchIndex._ready.clear()
+    for day, description in enumerate(['Coffee shop', 'Coffeemaker repair', 'Grocery store']):
+        Transaction.create({'type': 'expense', 'amount': 5.0, 'description': description,
+                            'date': datetime(2024, 1, day + 1)})
+    Transaction.update(Transaction.collection.find_one({'description': 'Grocery store'})['_id'],
+                       {'description': 'Coffee beans'})
+
+    response = client.get('/api/v1/transactions/data?search=coff')
+    assert [t['description'] for t in response.json['data']] == [
+        'Coffee beans', 'Coffeemaker repair', 'Coffee shop'
+    ]
+    assert 'search_prefixes' not in response.json['data'][0]
+
+    ranked = client.get('/api/v1/transactions/data?search=coffee sh').json['data']
+    assert [t['description'] for t in ranked] == ['Coffee shop']
+    ranked = client.get('/api/v1/transactions/data?search=coffee').json['data']
+    assert ranked[-1]['description'] == 'Coffeemaker repair'
+
+    regex = client.get('/api/v1/transactions/data?search=^Coffee (shop|beans)$').json['data']
+    assert sorted(t['description'] for t in regex) == ['Coffee beans', 'Coffee shop']
+
+    # Documents written before the index existed: $regex (same fields) until backfilled
+    from app import mongo
+    mongo.db.transactions.insert_one({'type': 'expense', 'amount': 1.0, 'description': 'Old coffee',
+                                      'tags': ['legacy'], 'date': datetime(2023, 1, 1)})
+    SearchIndex._ready.clear()
+    legacy = client.get('/api/v1/transactions/data?search=coff').json['data']
+    assert [t['description'] for t in legacy][-1] == 'Old coffee'
+    tagged = client.get('/api/v1/transactions/data?search=legacy&search_mode=regex').json['data']
+    assert [t['description'] for t in tagged] == ['Old coffee']
+
+def test_active_accounts_cache_metadata_but_read_balances_live(app):
+    """Test cached account listings never serve a stale balance"""
+    from app.models import Account
+    account_id = Account.create({'name': 'Wallet', 'type': 'cash', 'balance': 10.0})
+    assert [a['balance'] for a in Account.get_active()] == [10.0]
+
+    # A ledger write changes the balance without invalidating the reference cache
+    Account.collection.update_one({'name': 'Wallet'}, {'$inc': {'balance': 5.0}})
+    accounts = Account.get_active()
+    assert [(a['name'], a['balance']) for a in accounts] == [('Wallet', 15.0)]
+    assert 'balance' not in Account.get_many([account_id])[account_id]
+
+def test_account_activity_stats_count_both_legs_and_self_transfers_once(mongod_app):
+    """Test get_activity_stats inflow, outflow, count and last date, with a transfer to the same account"""
+    from app import mongo
+    from app.models import Account
+    wallet, bank, idle = 'wallet-id', 'bank-id', 'idle-id'
+    mongo.db.transactions.insert_many([
+        {'type': 'expense', 'amount': 10.0, 'from_account_id': wallet, 'date': datetime(2024, 3, 1)},
+        {'type': 'income', 'amount': 100.0, 'to_account_id': wallet, 'date': datetime(2024, 3, 2)},
+        {'type': 'transfer', 'amount': 40.0, 'from_account_id': wallet, 'to_account_id': bank, 'date': datetime(2024, 3, 3)},
+        {'type': 'transfer', 'amount': 7.0, 'from_account_id': wallet, 'to_account_id': wallet, 'date': datetime(2024, 3, 4)}
+    ])
+
+    stats = Account.get_activity_stats([wallet, bank, idle])
+
+    assert stats[wallet]['count'] == 4
+    assert stats[wallet]['outflow'] == pytest.approx(57.0)
+    assert stats[wallet]['inflow'] == pytest.approx(107.0)
+    assert stats[wallet]['average'] == pytest.approx(157.0 / 4)
+    assert stats[wallet]['last_date'] == datetime(2024, 3, 4)
+    assert (stats[bank]['count'], stats[bank]['inflow'], stats[bank]['outflow']) == (1, 40.0, 0)
+    assert idle not in stats
+    assert Account.get_activity_stats([]) == {}